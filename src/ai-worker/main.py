@@ -37,7 +37,10 @@ async def main():
     logger.info("=" * 60)
     logger.info("🚀 Khởi động Trợ Lý KOC AI Worker")
     logger.info(f"📡 RabbitMQ: {settings.rabbitmq_host}")
-    logger.info(f"💾 MinIO: {settings.minio_endpoint}")
+    if settings.storage_backend == "filesystem":
+        logger.info(f"💾 Storage: filesystem ({settings.storage_root})")
+    else:
+        logger.info(f"💾 MinIO: {settings.minio_endpoint}")
     logger.info("=" * 60)
     
     consumer = MessageConsumer(settings)
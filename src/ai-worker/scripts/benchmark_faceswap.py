@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+FaceSwap Batch Benchmark
+Measures FaceSwap inference throughput for each FACESWAP_BATCH_SIZE.
+
+Usage:
+    python scripts/benchmark_faceswap.py --video clip.mp4 --face face.jpg
+                                         [--swapper inswapper_128.onnx] [--batch-sizes 1,2,4,8]
+                                         [--frames 120] [--all-faces] [--cpu]
+
+The first --frames frames of the clip are decoded once and kept in memory, so
+only face detection, swapping and paste-back are timed (no decode / encode).
+Batch size 1 is the per-frame insightface path (FaceAnalysis.get +
+INSwapper.get); larger sizes go through worker/batched_faces.py. For each
+setting the script reports:
+
+    fps      frames per second, after one warm-up batch
+    PSNR     mean PSNR (dB) of the output frames against batch size 1
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+# worker.* lives in this script's parent directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import cv2
+import numpy as np
+
+from worker.batched_faces import BatchedFaceSwapper
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(message)s')
+logger = logging.getLogger(__name__)
+
+FACE_ANALYZER_NAME = "buffalo_l"
+FACE_DET_SIZE = (640, 640)
+
+
+def load_frames(path: str, frame_count: int) -> List[np.ndarray]:
+    """First frames of a video (BGR)."""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < frame_count:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise SystemExit(f"Không đọc được frame nào từ {path}")
+    return frames
+
+
+def largest(faces: list, all_faces: bool) -> list:
+    if all_faces or not faces:
+        return faces
+    return [max(faces, key=lambda x: x.bbox[2] * x.bbox[3])]
+
+
+def run_baseline(analyzer, swapper, frames: List[np.ndarray], target_face, all_faces: bool) -> List[np.ndarray]:
+    outputs = []
+    for frame in frames:
+        for face in largest(analyzer.get(frame), all_faces):
+            frame = swapper.get(frame, face, target_face, paste_back=True)
+        outputs.append(frame)
+    return outputs
+
+
+def run_batched(
+    batcher: BatchedFaceSwapper,
+    frames: List[np.ndarray],
+    target_face,
+    batch_size: int,
+    all_faces: bool
+) -> List[np.ndarray]:
+    outputs = []
+    for start in range(0, len(frames), batch_size):
+        batch = [frame.copy() for frame in frames[start:start + batch_size]]
+        faces = [largest(found, all_faces) for found in batcher.detect(batch)]
+        outputs.extend(batcher.swap(batch, faces, target_face))
+    return outputs
+
+
+def psnr(a: np.ndarray, b: np.ndarray) -> float:
+    mse = np.mean((a.astype(np.float32) - b.astype(np.float32)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FaceSwap batch sizes")
+    parser.add_argument("--video", required=True, help="Clip to swap")
+    parser.add_argument("--face", required=True, help="Image of the face swapped in")
+    parser.add_argument(
+        "--swapper",
+        default=os.path.expanduser("~/.insightface/models/inswapper_128.onnx"),
+        help="inswapper_128.onnx (default: ~/.insightface/models/)"
+    )
+    parser.add_argument("--batch-sizes", default="1,2,4,8", help="Batch sizes to run (comma-separated)")
+    parser.add_argument("--frames", type=int, default=120, help="Frames of the clip to swap (default: 120)")
+    parser.add_argument("--all-faces", action="store_true", help="Swap every face (swapAllFaces)")
+    parser.add_argument("--cpu", action="store_true", help="CPU execution provider only")
+
+    args = parser.parse_args()
+
+    import insightface
+    from insightface.app import FaceAnalysis
+
+    providers = ['CPUExecutionProvider'] if args.cpu else ['CUDAExecutionProvider', 'CPUExecutionProvider']
+    analyzer = FaceAnalysis(name=FACE_ANALYZER_NAME, providers=providers)
+    analyzer.prepare(ctx_id=-1 if args.cpu else 0, det_size=FACE_DET_SIZE)
+    swapper = insightface.model_zoo.get_model(args.swapper, providers=providers)
+
+    target_faces = analyzer.get(cv2.imread(args.face))
+    if not target_faces:
+        raise SystemExit(f"Không tìm thấy khuôn mặt trong {args.face}")
+    target_face = target_faces[0]
+
+    frames = load_frames(args.video, args.frames)
+    height, width = frames[0].shape[:2]
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",") if size.strip()]
+
+    logger.info("=" * 60)
+    logger.info(f"🚀 FaceSwap {len(frames)} frames ({width}x{height}), batch sizes {batch_sizes}")
+    logger.info("=" * 60)
+
+    batcher = BatchedFaceSwapper(analyzer, swapper) if any(size > 1 for size in batch_sizes) else None
+    reference = None
+    rows = []
+    for batch_size in batch_sizes:
+        if batch_size > 1:
+            run = lambda batch: run_batched(batcher, batch, target_face, batch_size, args.all_faces)
+        else:
+            run = lambda batch: run_baseline(analyzer, swapper, batch, target_face, args.all_faces)
+
+        run(frames[:max(batch_size, 1)])
+        started = time.monotonic()
+        outputs = run(frames)
+        fps = len(frames) / max(time.monotonic() - started, 1e-6)
+
+        if reference is None and batch_size <= 1:
+            reference = outputs
+        quality = float(np.mean([psnr(a, b) for a, b in zip(outputs, reference)])) if reference else float("nan")
+        rows.append((batch_size, fps, quality))
+        logger.info(f"✅ batch {batch_size}: {fps:.1f} fps, PSNR {quality:.2f} dB")
+
+    logger.info("")
+    logger.info(f"{'batch':<8}{'fps':>10}{'speedup':>10}{'PSNR (dB)':>12}")
+    base_fps = rows[0][1]
+    for batch_size, fps, quality in rows:
+        logger.info(f"{batch_size:<8}{fps:>10.1f}{fps / base_fps:>9.2f}x{quality:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
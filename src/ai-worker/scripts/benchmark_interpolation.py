@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Interpolation Benchmark
+Compares the frame-interpolation engines of worker/interpolation.py.
+
+Usage:
+    python scripts/benchmark_interpolation.py [--video clip.mp4] [--src-fps 6] [--dst-fps 24]
+                                              [--frames 97] [--width 1024] [--workers N]
+
+A 24fps reference clip (a synthetic moving scene unless --video is given) is
+decimated to --src-fps, interpolated back to --dst-fps by every engine and
+compared with the frames that were dropped. For each engine the script reports:
+
+    interp   seconds to produce the frames (minterpolate: ffmpeg raw in/out)
+    encode   seconds of the real job path, interpolation + libx264 encode
+    PSNR     mean PSNR (dB) of the interpolated frames against the reference
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+# worker.* lives in this script's parent directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from worker.interpolation import ENGINES, FRAME_ENGINES, interpolate_frames
+from worker.postprocess import MINTERPOLATE, PostProcessPlan
+from worker.video_writer import VideoWriter
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def synthetic_clip(frame_count: int, width: int, height: int) -> List[np.ndarray]:
+    """Textured background with a disc and a square moving at different speeds."""
+    import cv2
+
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    frames = []
+    for i in range(frame_count):
+        frame = background.copy()
+        t = i / max(frame_count - 1, 1)
+        cv2.circle(frame, (int(width * (0.1 + 0.8 * t)), height // 3), height // 8, (230, 60, 40), -1)
+        x = int(width * (0.8 - 0.5 * t))
+        y = int(height * (0.5 + 0.3 * np.sin(4 * t)))
+        cv2.rectangle(frame, (x, y), (x + height // 6, y + height // 6), (40, 200, 90), -1)
+        frames.append(frame)
+    return frames
+
+
+def load_clip(path: str, frame_count: int, width: int) -> List[np.ndarray]:
+    """First frames of a video as RGB arrays, resized to width."""
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < frame_count:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        height = int(round(frame.shape[0] * width / frame.shape[1] / 2)) * 2
+        frames.append(cv2.cvtColor(cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB))
+    cap.release()
+    if len(frames) < 2:
+        raise SystemExit(f"Không đọc được frame nào từ {path}")
+    return frames
+
+
+def minterpolate_frames(frames: List[np.ndarray], src_fps: float, dst_fps: float) -> List[np.ndarray]:
+    """Run the minterpolate filter alone, raw frames in and out."""
+    height, width = frames[0].shape[:2]
+    cmd = [
+        "ffmpeg", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(src_fps), "-i", "pipe:0",
+        "-vf", MINTERPOLATE.format(fps=dst_fps),
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1",
+    ]
+    result = subprocess.run(cmd, input=b"".join(frame.tobytes() for frame in frames), capture_output=True, check=True)
+    output = np.frombuffer(result.stdout, dtype=np.uint8)
+    return list(output.reshape(-1, height, width, 3))
+
+
+def psnr(a: np.ndarray, b: np.ndarray) -> float:
+    mse = np.mean((a.astype(np.float32) - b.astype(np.float32)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark frame-interpolation engines")
+    parser.add_argument("--video", help="24fps reference clip (default: synthetic scene)")
+    parser.add_argument("--src-fps", type=float, default=6, help="Generated frame rate (default: 6)")
+    parser.add_argument("--dst-fps", type=float, default=24, help="Output frame rate (default: 24)")
+    parser.add_argument("--frames", type=int, default=97, help="Reference frames at dst-fps (default: 97)")
+    parser.add_argument("--width", type=int, default=1024, help="Frame width (default: 1024)")
+    parser.add_argument("--workers", type=int, default=0, help="Threads of the flow engine (0 = one per core)")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="Engines to run (comma-separated)")
+
+    args = parser.parse_args()
+
+    step = args.dst_fps / args.src_fps
+    if step != int(step):
+        raise SystemExit("--dst-fps phải là bội số nguyên của --src-fps")
+    step = int(step)
+
+    if args.video:
+        reference = load_clip(args.video, args.frames, args.width)
+    else:
+        reference = synthetic_clip(args.frames, args.width, args.width * 9 // 16 // 2 * 2)
+    # Whole steps only, so every output frame has a reference
+    reference = reference[:(len(reference) - 1) // step * step + 1]
+    source = reference[::step]
+    height, width = reference[0].shape[:2]
+
+    logger.info("=" * 60)
+    logger.info(f"🚀 Nội suy {len(source)} frames @ {args.src_fps:g}fps -> {len(reference)} frames @ {args.dst_fps:g}fps ({width}x{height})")
+    logger.info("=" * 60)
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="trolikoc_interp_") as tmp:
+        for engine in [e.strip() for e in args.engines.split(",") if e.strip()]:
+            started = time.monotonic()
+            if engine in FRAME_ENGINES:
+                output = list(interpolate_frames(source, args.src_fps, args.dst_fps, engine, workers=args.workers))
+            else:
+                output = minterpolate_frames(source, args.src_fps, args.dst_fps)
+            interp_seconds = time.monotonic() - started
+
+            # Same path as ImageToVideoProcessor._encode_frames
+            started = time.monotonic()
+            plan = PostProcessPlan().encode(preset="veryfast")
+            if engine in FRAME_ENGINES:
+                frames, fps = interpolate_frames(source, args.src_fps, args.dst_fps, engine, workers=args.workers), args.dst_fps
+            else:
+                frames, fps = source, args.src_fps
+                plan.interpolate(int(args.dst_fps))
+            with VideoWriter([os.path.join(tmp, f"{engine}.mp4")], fps, plan=plan) as writer:
+                for frame in frames:
+                    writer.write(frame)
+            encode_seconds = time.monotonic() - started
+
+            held_out = [i for i in range(min(len(output), len(reference))) if i % step]
+            quality = float(np.mean([psnr(output[i], reference[i]) for i in held_out])) if held_out else float("nan")
+            rows.append((engine, interp_seconds, encode_seconds, quality))
+            logger.info(f"✅ {engine}: interp {interp_seconds:.2f}s, encode {encode_seconds:.2f}s, PSNR {quality:.2f} dB")
+
+    logger.info("")
+    logger.info(f"{'engine':<14}{'interp (s)':>12}{'encode (s)':>12}{'PSNR (dB)':>12}")
+    for engine, interp_seconds, encode_seconds, quality in rows:
+        logger.info(f"{engine:<14}{interp_seconds:>12.2f}{encode_seconds:>12.2f}{quality:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,50 @@ Model Download Script
 Downloads and caches all required AI models for Trợ Lý KOC AI Worker.
 
 Usage:
-    python scripts/download_models.py [--all|--svd|--face|--pose]
+    python scripts/download_models.py [--all|--svd|--face|--pose|--motion|--inpaint]
+                                      [--verify] [--mirror DIR] [--jobs N] [--pin] [--snapshot]
+
+Models are listed in scripts/models.json. Entries are fetched in parallel:
+plain files resume from their .part file (HTTP Range) and are checked against
+their SHA-256; HuggingFace repos go through snapshot_download (which resumes
+itself) and their cached blobs are checked against the LFS SHA-256 / git SHA-1
+they are named by.
+
+--verify    check what is already cached, download nothing (exit 1 if incomplete,
+            corrupt or not pinned in models.json)
+--mirror    copy from a local directory laid out like the caches first:
+            <mirror>/<root>/<file> (insightface, torch_hub),
+            <mirror>/huggingface/hub/models--<org>--<name>
+--pin       write the resolved HF revisions and file digests back into models.json
+
+An entry is pinned when models.json fixes exactly what is fetched: a SHA-256
+for plain files, a commit hash as revision for HuggingFace repos. Unpinned
+entries still download (that is how --pin resolves them) but never verify.
+--snapshot  also write memory-mappable snapshots of the SVD, inpainting and
+            face models (see worker/model_snapshots.py), which the worker loads
+            instead of the HuggingFace cache / insightface model zoo.
 """
 
 import os
 import sys
 import argparse
+import hashlib
+import json
 import logging
+import re
+import shutil
+import time
+import urllib.error
+import urllib.request
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# worker.* lives in this script's parent directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from worker.hashing import file_sha256
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(message)s')
 logger = logging.getLogger(__name__)
@@ -19,139 +55,401 @@ logger = logging.getLogger(__name__)
 # Default model cache directory
 MODEL_DIR = os.environ.get("MODEL_CACHE_DIR", Path.home() / ".trolikoc_models")
 
+MANIFEST_PATH = Path(__file__).resolve().parent / "models.json"
 
-def download_svd_xt():
-    """Download Stable Video Diffusion XT model."""
-    logger.info("📥 Downloading SVD-XT (Stable Video Diffusion)...")
-    
-    from diffusers import StableVideoDiffusionPipeline
-    import torch
-    
-    pipe = StableVideoDiffusionPipeline.from_pretrained(
-        "stabilityai/stable-video-diffusion-img2vid-xt",
-        torch_dtype=torch.float16,
-        variant="fp16"
-    )
-    
-    logger.info("✅ SVD-XT downloaded and cached")
-    del pipe
+# Destination of each "root" used by file entries
+ROOTS = {
+    "insightface": Path.home() / ".insightface" / "models",
+    # Where torch.hub.load_state_dict_from_url caches checkpoints; controlnet_aux's
+    # DWposeDetector loads its detector and pose model through it (via mmengine)
+    "torch_hub": Path(
+        os.environ.get("TORCH_HOME")
+        or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "torch"
+    ) / "hub" / "checkpoints",
+}
 
+GROUPS = ["svd", "face", "pose", "motion", "inpaint"]
 
-def download_insightface():
-    """Download InsightFace models for face analysis."""
-    logger.info("📥 Downloading InsightFace models...")
-    
-    from insightface.app import FaceAnalysis
-    
-    app = FaceAnalysis(name='buffalo_l')
-    app.prepare(ctx_id=-1)  # CPU mode for download
-    
-    logger.info("✅ InsightFace buffalo_l downloaded")
+DOWNLOAD_ATTEMPTS = 3
+CHUNK_SIZE = 1024 * 1024
 
 
-def download_inswapper():
-    """Download inswapper model for face swapping."""
-    logger.info("📥 Downloading inswapper model...")
-    
-    import urllib.request
-    
-    model_dir = Path.home() / ".insightface" / "models"
-    model_dir.mkdir(parents=True, exist_ok=True)
+class ProvisionError(Exception):
+    """A model could not be provisioned or failed verification."""
+
+
+def snapshot_dir() -> str:
+    """Snapshot root the worker reads (MODEL_SNAPSHOT_DIR or <MODEL_CACHE_DIR>/snapshots)."""
+    from worker.model_snapshots import default_root
     
-    model_path = model_dir / "inswapper_128.onnx"
+    return os.environ.get("MODEL_SNAPSHOT_DIR") or default_root(str(MODEL_DIR))
+
+
+def load_manifest() -> Dict[str, Any]:
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def repo_id(entry: Dict[str, Any]) -> str:
+    """HF repo of an entry, overridable through its repo_id_env variable (same as the worker)."""
+    return os.environ.get(entry.get("repo_id_env") or "", "") or entry["repo_id"]
+
+
+# ===========================================
+# Plain files (resumable, SHA-256 checked)
+# ===========================================
+
+def file_path(entry: Dict[str, Any]) -> Path:
+    return ROOTS[entry["root"]] / entry["path"]
+
+
+def is_pinned(entry: Dict[str, Any]) -> bool:
+    """Whether the manifest fixes the exact bytes of an entry."""
+    if entry["kind"] == "hf":
+        return bool(re.fullmatch(r"[0-9a-f]{40}", entry.get("revision") or ""))
+    return bool(entry.get("sha256"))
+
+
+def expected_sha256(entry: Dict[str, Any], path: Path) -> Optional[str]:
+    """Pinned digest from the manifest, else the one recorded when the file was fetched."""
+    if entry.get("sha256"):
+        return entry["sha256"]
+    recorded = Path(f"{path}.sha256")
+    return recorded.read_text().strip() if recorded.exists() else None
+
+
+def provision_file(entry: Dict[str, Any], mirror: Optional[Path]) -> Dict[str, Any]:
+    path = file_path(entry)
+    if path.exists():
+        return {**verify_file(entry), "status": "cached"}
     
-    if model_path.exists():
-        logger.info("✅ inswapper_128.onnx already exists")
-        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part = Path(f"{path}.part")
+    source = mirror / entry["root"] / entry["path"] if mirror else None
     
-    # Download from HuggingFace
-    url = "https://huggingface.co/deepinsight/inswapper/resolve/main/inswapper_128.onnx"
+    if source is not None and source.exists():
+        logger.info(f"📂 {entry['name']}: copy từ mirror {source}")
+        _link_or_copy(str(source), str(part))
+    else:
+        _download(entry["url"], part)
     
-    logger.info(f"   Downloading from {url}...")
-    urllib.request.urlretrieve(url, model_path)
+    digest = file_sha256(str(part))
+    if entry.get("sha256") and digest != entry["sha256"]:
+        part.unlink()
+        raise ProvisionError(f"{entry['name']}: SHA-256 mismatch ({digest} != {entry['sha256']})")
     
-    logger.info(f"✅ inswapper_128.onnx saved to {model_path}")
+    os.replace(part, path)
+    Path(f"{path}.sha256").write_text(digest)
+    if entry.get("unpack_to"):
+        _unpack(path, path.parent / entry["unpack_to"])
+    return {"status": "downloaded", "sha256": digest}
 
 
-def download_controlnet_pose():
-    """Download ControlNet pose detection models."""
-    logger.info("📥 Downloading ControlNet pose models...")
-    
-    from controlnet_aux import DWposeDetector
+def verify_file(entry: Dict[str, Any]) -> Dict[str, Any]:
+    path = file_path(entry)
+    if not path.exists():
+        raise ProvisionError(f"{entry['name']}: missing {path}")
+    digest = file_sha256(str(path))
+    expected = expected_sha256(entry, path)
+    if expected and digest != expected:
+        raise ProvisionError(f"{entry['name']}: SHA-256 mismatch ({digest} != {expected})")
+    if entry.get("unpack_to") and not (path.parent / entry["unpack_to"]).is_dir():
+        raise ProvisionError(f"{entry['name']}: {entry['unpack_to']}/ not unpacked")
+    # The digest recorded at download time only detects corruption, it pins nothing
+    return {"status": "verified" if is_pinned(entry) else "unpinned", "sha256": digest}
+
+
+def _download(url: str, part: Path):
+    """Download url into part, resuming from what part already holds."""
+    for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+        start = part.stat().st_size if part.exists() else 0
+        request = urllib.request.Request(url, headers={"Range": f"bytes={start}-"} if start else {})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                # A server ignoring Range answers 200: start over
+                resume = start > 0 and response.status == 206
+                logger.info(f"📥 {url}" + (f" (tiếp tục từ {start} bytes)" if resume else ""))
+                with open(part, "ab" if resume else "wb") as f:
+                    shutil.copyfileobj(response, f, CHUNK_SIZE)
+            return
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and start > 0:
+                # Range past the end: the partial file is already complete
+                return
+            error = e
+        except (urllib.error.URLError, OSError) as e:
+            error = e
+        logger.warning(f"⚠️ Lần {attempt}/{DOWNLOAD_ATTEMPTS} tải {url} thất bại: {error}")
+        time.sleep(2 * attempt)
+    raise ProvisionError(f"Download failed: {url}")
+
+
+def _unpack(archive: Path, target: Path):
+    staging = Path(f"{target}.part")
+    shutil.rmtree(staging, ignore_errors=True)
+    with zipfile.ZipFile(archive) as zf:
+        zf.extractall(staging)
+    # Archives may or may not wrap their content in a top-level directory
+    entries = list(staging.iterdir())
+    content = entries[0] if len(entries) == 1 and entries[0].is_dir() else staging
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(content, target)
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+def _link_or_copy(source: str, target: str):
+    """Hard link when source and target share a filesystem, copy otherwise."""
+    try:
+        if os.path.exists(target):
+            os.remove(target)
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+# ===========================================
+# HuggingFace repos
+# ===========================================
+
+def provision_hf(entry: Dict[str, Any], mirror: Optional[Path]) -> Dict[str, Any]:
+    from huggingface_hub import snapshot_download
+    from huggingface_hub.constants import HF_HUB_CACHE
     
-    detector = DWposeDetector()
+    repo = repo_id(entry)
+    if mirror is not None:
+        source = mirror / "huggingface" / "hub" / _repo_folder(repo)
+        if source.is_dir():
+            logger.info(f"📂 {entry['name']}: copy từ mirror {source}")
+            shutil.copytree(source, Path(HF_HUB_CACHE) / _repo_folder(repo), symlinks=True,
+                            copy_function=_link_or_copy, dirs_exist_ok=True)
     
-    logger.info("✅ DWpose detector downloaded")
+    path = snapshot_download(
+        repo,
+        revision=entry.get("revision") or "main",
+        allow_patterns=entry.get("allow_patterns"),
+        ignore_patterns=entry.get("ignore_patterns"),
+        max_workers=8
+    )
+    result = _verify_hf_snapshot(entry, Path(path))
+    result["status"] = "downloaded"
+    return result
 
 
-def download_animatediff():
-    """Download AnimateDiff motion adapter."""
-    logger.info("📥 Downloading AnimateDiff motion adapter...")
-    
-    from diffusers import MotionAdapter
+def verify_hf(entry: Dict[str, Any]) -> Dict[str, Any]:
+    from huggingface_hub import snapshot_download
     
-    adapter = MotionAdapter.from_pretrained("guoyww/animatediff-motion-adapter-v1-5-2")
+    try:
+        path = snapshot_download(
+            repo_id(entry),
+            revision=entry.get("revision") or "main",
+            allow_patterns=entry.get("allow_patterns"),
+            ignore_patterns=entry.get("ignore_patterns"),
+            local_files_only=True
+        )
+    except Exception as e:
+        raise ProvisionError(f"{entry['name']}: not cached ({e})")
+    result = _verify_hf_snapshot(entry, Path(path))
+    if not is_pinned(entry):
+        result["status"] = "unpinned"
+    return result
+
+
+def _verify_hf_snapshot(entry: Dict[str, Any], snapshot: Path) -> Dict[str, Any]:
+    """Check every file of a cached snapshot against the digest its blob is named by."""
+    checked = 0
+    for file in snapshot.rglob("*"):
+        if file.is_dir():
+            continue
+        blob = Path(os.path.realpath(file))
+        if not re.fullmatch(r"[0-9a-f]{40}|[0-9a-f]{64}", blob.name):
+            # Cache without symlinks (e.g. Windows without developer mode): nothing to check against
+            continue
+        digest = file_sha256(str(blob)) if len(blob.name) == 64 else _git_blob_sha1(blob)
+        if digest != blob.name:
+            raise ProvisionError(f"{entry['name']}: {file.relative_to(snapshot)} is corrupt, delete {blob} and re-run")
+        checked += 1
+    return {"status": "verified", "revision": snapshot.name, "files": checked}
+
+
+def _git_blob_sha1(path: Path) -> str:
+    """Git object id of a file (how the HF cache names non-LFS blobs)."""
+    digest = hashlib.sha1(f"blob {path.stat().st_size}\0".encode())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _repo_folder(repo: str) -> str:
+    return "models--" + repo.replace("/", "--")
+
+
+# ===========================================
+# Provisioning
+# ===========================================
+
+def provision(entries: List[Dict[str, Any]], verify_only: bool, mirror: Optional[Path], jobs: int) -> List[Dict[str, Any]]:
+    """Provision (or only verify) entries in parallel; returns one result per entry."""
+    def run(entry: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.time()
+        try:
+            if entry["kind"] == "hf":
+                result = verify_hf(entry) if verify_only else provision_hf(entry, mirror)
+            elif verify_only:
+                result = verify_file(entry)
+            else:
+                result = provision_file(entry, mirror)
+        except Exception as e:
+            result = {"status": "failed", "error": str(e)}
+        result["seconds"] = time.time() - start
+        return result
     
-    logger.info("✅ AnimateDiff motion adapter downloaded")
-    del adapter
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        return list(pool.map(run, entries))
+
 
+def pin(manifest: Dict[str, Any], entries: List[Dict[str, Any]], results: List[Dict[str, Any]]):
+    """Record resolved revisions and digests in models.json."""
+    for entry, result in zip(entries, results):
+        if result["status"] == "failed":
+            continue
+        if entry["kind"] == "hf" and result.get("revision"):
+            entry["revision"] = result["revision"]
+        elif entry["kind"] == "file" and result.get("sha256"):
+            entry["sha256"] = result["sha256"]
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    logger.info(f"📌 Đã ghi revision/SHA-256 vào {MANIFEST_PATH}")
 
-def download_sd_inpainting():
-    """Download SD Inpainting for VirtualTryOn fallback."""
-    logger.info("📥 Downloading SD Inpainting...")
+
+# ===========================================
+# Snapshots
+# ===========================================
+
+def snapshot_svd(entry: Dict[str, Any]):
+    """Write the mmap-able snapshot of the (cached) SVD pipeline."""
+    from diffusers import StableVideoDiffusionPipeline
+    from worker.model_snapshots import write_pretrained
+    import torch
     
+    model_id = repo_id(entry)
+    pipe = StableVideoDiffusionPipeline.from_pretrained(
+        model_id,
+        torch_dtype=torch.float16,
+        variant="fp16",
+        revision=entry.get("revision") or "main"
+    )
+    write_pretrained(snapshot_dir(), model_id, pipe)
+    del pipe
+
+
+def snapshot_inpainting(entry: Dict[str, Any]):
+    """Write the mmap-able snapshot of the (cached) SD Inpainting pipeline."""
     from diffusers import StableDiffusionInpaintPipeline
+    from worker.model_snapshots import write_pretrained
     import torch
     
+    model_id = repo_id(entry)
     pipe = StableDiffusionInpaintPipeline.from_pretrained(
-        "runwayml/stable-diffusion-inpainting",
-        torch_dtype=torch.float16
+        model_id,
+        torch_dtype=torch.float16,
+        revision=entry.get("revision") or "main"
     )
-    
-    logger.info("✅ SD Inpainting downloaded")
+    write_pretrained(snapshot_dir(), model_id, pipe)
     del pipe
 
 
+def snapshot_face(entry: Dict[str, Any]):
+    """Write mmap-able snapshots of the face analysis pack / swapper."""
+    from worker.model_snapshots import write_onnx_model, write_onnx_pack
+    
+    path = file_path(entry)
+    if entry.get("unpack_to"):
+        write_onnx_pack(snapshot_dir(), entry["unpack_to"], str(path.parent / entry["unpack_to"]))
+    else:
+        write_onnx_model(snapshot_dir(), entry["name"], str(path))
+
+
+SNAPSHOT_WRITERS = {
+    "svd": snapshot_svd,
+    "inpaint": snapshot_inpainting,
+    "face": snapshot_face,
+}
+
+
 def main():
     parser = argparse.ArgumentParser(description="Download AI models for Trợ Lý KOC")
     parser.add_argument("--all", action="store_true", help="Download all models")
     parser.add_argument("--svd", action="store_true", help="Download SVD-XT (Image to Video)")
     parser.add_argument("--face", action="store_true", help="Download face models (InsightFace, inswapper)")
-    parser.add_argument("--pose", action="store_true", help="Download pose models (ControlNet)")
+    parser.add_argument("--pose", action="store_true", help="Download pose models (DWPose)")
     parser.add_argument("--motion", action="store_true", help="Download motion models (AnimateDiff)")
     parser.add_argument("--inpaint", action="store_true", help="Download SD Inpainting (Try-On)")
+    parser.add_argument("--verify", action="store_true", help="Only verify the existing cache, download nothing")
+    parser.add_argument("--mirror", type=Path, help="Local mirror directory to copy models from before downloading")
+    parser.add_argument("--jobs", type=int, default=4, help="Models fetched in parallel (default: 4)")
+    parser.add_argument("--pin", action="store_true", help="Write resolved revisions and SHA-256 into models.json")
+    parser.add_argument("--snapshot", action="store_true", help="Also write mmap-able snapshots the worker loads faster")
     
     args = parser.parse_args()
     
     # Default to all if no specific model selected
-    if not any([args.all, args.svd, args.face, args.pose, args.motion, args.inpaint]):
-        args.all = True
+    selected = [group for group in GROUPS if args.all or getattr(args, group)]
+    if not selected:
+        selected = list(GROUPS)
     
     logger.info("=" * 60)
-    logger.info("🚀 Trợ Lý KOC - Model Downloader")
+    logger.info("🚀 Trợ Lý KOC - Model Downloader" + (" (verify)" if args.verify else ""))
     logger.info("=" * 60)
     
+    manifest = load_manifest()
+    groups = manifest["groups"]
+    entries = [entry for group in selected for entry in groups.get(group, [])]
+    results = provision(entries, args.verify, args.mirror, args.jobs)
+    
+    failed = False
+    for entry, result in zip(entries, results):
+        if result["status"] == "failed":
+            failed = True
+            logger.error(f"❌ {entry['name']}: {result['error']}")
+        elif result["status"] == "unpinned":
+            logger.warning(f"⚠️ {entry['name']}: {result['status']} ({result['seconds']:.1f}s)")
+        else:
+            logger.info(f"✅ {entry['name']}: {result['status']} ({result['seconds']:.1f}s)")
+    
+    if failed:
+        sys.exit(1)
+    
+    unpinned = [entry["name"] for entry in entries if not is_pinned(entry)]
+    if args.verify:
+        unlisted = [group for group in selected if not groups.get(group)]
+        if unlisted:
+            # Nothing to check means nothing verified
+            logger.error(f"❌ Không có model nào trong {MANIFEST_PATH.name} cho: {', '.join(unlisted)}")
+            sys.exit(1)
+        if unpinned:
+            logger.error(f"❌ Chưa pin trong {MANIFEST_PATH.name}: {', '.join(unpinned)} (chạy lại với --pin)")
+            sys.exit(1)
+        logger.info("🎉 All selected models verified")
+        return
+    if unpinned and not args.pin:
+        logger.warning(f"⚠️ Chưa pin, bản tải về có thể khác giữa các lần build: {', '.join(unpinned)} (dùng --pin)")
+    
+    if args.pin:
+        pin(manifest, entries, results)
+    
     try:
-        if args.all or args.svd:
-            download_svd_xt()
-        
-        if args.all or args.face:
-            download_insightface()
-            download_inswapper()
-        
-        if args.all or args.pose:
-            download_controlnet_pose()
-        
-        if args.all or args.motion:
-            download_animatediff()
-        
-        if args.all or args.inpaint:
-            download_sd_inpainting()
+        if args.snapshot:
+            for group in selected:
+                writer = SNAPSHOT_WRITERS.get(group)
+                for entry in groups.get(group, []) if writer else []:
+                    writer(entry)
         
         logger.info("=" * 60)
         logger.info("🎉 All models downloaded successfully!")
         logger.info("=" * 60)
-        
+    
     except Exception as e:
         logger.error(f"❌ Error: {e}")
         sys.exit(1)
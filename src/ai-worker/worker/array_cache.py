@@ -0,0 +1,198 @@
+"""
+Array Cache
+Local cache of small NumPy intermediates (face embeddings, detections, latents...).
+
+Three tiers, checked in order:
+    1. in-memory LRU of this process
+    2. .npz files under cache_dir/<kind>/<kk>/<key>.npz on local disk
+    3. the shared artifact cache (other workers' results), if given
+
+The disk tier of a kind is bounded by a byte budget: when a write takes it
+over, the least recently used files (by access/modification time; disk hits
+touch their file) are deleted until it is back under EVICT_TO of the budget.
+
+Entries are dicts of named arrays. Keys must already be content-addressed
+(see worker.hashing); an entry is never updated in place.
+"""
+
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterator, Optional, Tuple
+
+from worker.artifact_cache import ArtifactCache
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Arrays = Dict[str, "np.ndarray"]
+
+# Fraction of the disk budget an eviction pass shrinks the tier to
+EVICT_TO = 0.9
+
+
+class ArrayCache:
+    """Memory + disk (+ shared) cache of named NumPy arrays."""
+
+    def __init__(
+        self,
+        kind: str,
+        cache_dir: str,
+        max_items: int = 256,
+        artifacts: Optional[ArtifactCache] = None,
+        compress: bool = True,
+        max_disk_bytes: int = 0
+    ):
+        """
+        Args:
+            max_items: entries kept in memory
+            max_disk_bytes: disk budget of this kind's directory (0 = unlimited)
+        """
+        self.kind = kind
+        self.root = os.path.join(cache_dir, kind)
+        self.max_items = max_items
+        self.artifacts = artifacts
+        self.compress = compress
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, Arrays]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bytes under root; unknown until the first write scans the directory
+        self._disk_bytes: Optional[int] = None
+        self._disk_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Arrays]:
+        """Return the arrays stored under key, or None."""
+        with self._lock:
+            arrays = self._memory.get(key)
+            if arrays is not None:
+                self._memory.move_to_end(key)
+                return arrays
+
+        path = self._path(key)
+        arrays = self._load(path)
+        if arrays is None and self.artifacts is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            staging = f"{path}.{uuid.uuid4().hex[:8]}.part"
+            if self.artifacts.fetch(self.kind, key, staging):
+                os.replace(staging, path)
+                arrays = self._load(path)
+                self._account(path)
+            elif os.path.exists(staging):
+                os.remove(staging)
+        if arrays is None:
+            return None
+
+        self._remember(key, arrays)
+        return arrays
+
+    def put(self, key: str, arrays: Arrays, share: bool = True):
+        """
+        Store arrays under key in every tier.
+
+        Errors are logged and swallowed: the cache must never fail a job.
+        """
+        import numpy as np
+
+        self._remember(key, arrays)
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # np.savez appends .npz to names without it
+            staging = f"{path}.{uuid.uuid4().hex[:8]}.part.npz"
+            save = np.savez_compressed if self.compress else np.savez
+            save(staging, **arrays)
+            os.replace(staging, path)
+        except Exception as e:
+            logger.warning(f"⚠️ Không ghi được cache {self.kind}/{key[:12]}: {e}")
+            return
+
+        if share and self.artifacts is not None:
+            self.artifacts.publish(self.kind, key, path)
+        self._account(path)
+
+    def _remember(self, key: str, arrays: Arrays):
+        with self._lock:
+            self._memory[key] = arrays
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _account(self, path: str):
+        """Count a file just written to disk and evict LRU files if over budget."""
+        if not self.max_disk_bytes:
+            return
+        with self._disk_lock:
+            try:
+                if self._disk_bytes is None:
+                    self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+                else:
+                    self._disk_bytes += os.path.getsize(path)
+                if self._disk_bytes > self.max_disk_bytes:
+                    self._evict()
+            except OSError as e:
+                logger.warning(f"⚠️ Không dọn được cache {self.kind}: {e}")
+
+    def _evict(self):
+        files = sorted(self._disk_files(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        target = self.max_disk_bytes * EVICT_TO
+        removed = 0
+        for path, size, _ in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        self._disk_bytes = total
+        logger.info(f"🧹 Cache {self.kind}: xoá {removed} file ít dùng nhất, còn {total / 1e6:.0f} MB")
+
+    def _disk_files(self) -> Iterator[Tuple[str, int, float]]:
+        """(path, size, last use) of the finished cache files on disk."""
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if ".part" in name:
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, max(stat.st_atime, stat.st_mtime)
+
+    def _load(self, path: str) -> Optional[Arrays]:
+        if not os.path.exists(path):
+            return None
+        import numpy as np
+
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            # Evicted since the exists() check
+            return None
+        except Exception as e:
+            # Truncated/corrupt file: drop it and treat as a miss
+            logger.warning(f"⚠️ Cache file hỏng, xoá: {path} ({e})")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        if self.max_disk_bytes:
+            # Mark as recently used for eviction (atime is often not updated)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return arrays
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.npz")
@@ -0,0 +1,203 @@
+"""
+Artifact Cache
+Content-addressed cache of expensive intermediates, shared by every worker node
+through the storage backend (a "cache/" namespace in the MinIO bucket).
+
+Layout:
+    cache/manifest/<kind>/<kk>/<key>.json   manifest (the index entry)
+    cache/blobs/<kind>/<kk>/<key>/<ts>-<id><ext>   payload
+
+Publishing uploads the blob first and the manifest last. A single object PUT is
+atomic, so readers only ever see complete artifacts: no manifest, no artifact.
+Every publish writes a fresh blob name, so a reader fetching an older blob is
+never affected by a concurrent writer. Expired manifests and unreferenced blobs
+are removed by purge_expired().
+"""
+
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional
+
+from worker.backends import StorageBackend
+from worker.config import Settings
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "cache"
+MANIFEST_PREFIX = f"{CACHE_PREFIX}/manifest"
+BLOB_PREFIX = f"{CACHE_PREFIX}/blobs"
+
+# Blobs not referenced by any manifest are kept this long before purge, so an
+# in-flight publish (blob uploaded, manifest not yet) is never collected
+ORPHAN_GRACE_SECONDS = 3600
+
+
+@dataclass
+class ArtifactEntry:
+    """Manifest of one cached artifact."""
+
+    kind: str
+    key: str
+    created_at: float
+    expires_at: float
+    producer: str
+    blob: Optional[str] = None          # object name of the payload (None for metadata-only entries)
+    size: int = 0
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def expired(self) -> bool:
+        return bool(self.expires_at) and time.time() > self.expires_at
+
+
+class ArtifactCache:
+    """Cluster-wide content-addressed artifact cache on top of a storage backend."""
+
+    def __init__(self, backend: StorageBackend, settings: Settings):
+        self.backend = backend
+        self.enabled = settings.artifact_cache_enabled
+        self.ttl_seconds = settings.artifact_cache_ttl_hours * 3600
+        self.producer = f"{socket.gethostname()}:{os.getpid()}"
+
+    def lookup(self, kind: str, key: str) -> Optional[ArtifactEntry]:
+        """Return the live manifest of an artifact, or None."""
+        if not self.enabled:
+            return None
+        try:
+            data = self.backend.get_bytes(self._manifest_name(kind, key))
+        except Exception as e:
+            logger.warning(f"⚠️ Artifact cache lookup failed ({kind}/{key[:12]}): {e}")
+            return None
+        if data is None:
+            return None
+
+        try:
+            entry = ArtifactEntry(**json.loads(data))
+        except (ValueError, TypeError) as e:
+            # Truncated manifest or another schema version: a miss, never a failed job
+            logger.warning(f"⚠️ Artifact manifest không đọc được ({kind}/{key[:12]}): {e}")
+            return None
+        if entry.expired:
+            return None
+        return entry
+
+    def fetch(self, kind: str, key: str, local_path: str) -> Optional[ArtifactEntry]:
+        """Download an artifact's payload to local_path. Returns None on a miss."""
+        entry = self.lookup(kind, key)
+        if entry is None or entry.blob is None:
+            return None
+        try:
+            if not self.backend.get_file(entry.blob, local_path):
+                return None
+        except Exception as e:
+            logger.warning(f"⚠️ Artifact fetch failed ({kind}/{key[:12]}): {e}")
+            return None
+        logger.info(f"♻️ Artifact cache hit: {kind}/{key[:12]} (từ {entry.producer})")
+        return entry
+
+    def publish(
+        self,
+        kind: str,
+        key: str,
+        local_path: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        ttl_seconds: Optional[float] = None
+    ) -> Optional[ArtifactEntry]:
+        """
+        Publish an artifact (payload file and/or metadata).
+
+        Failures are logged and swallowed: the cache is an optimisation and must
+        never fail a job.
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        entry = ArtifactEntry(
+            kind=kind,
+            key=key,
+            created_at=now,
+            expires_at=now + ttl if ttl else 0,
+            producer=self.producer,
+            metadata=metadata or {},
+        )
+
+        try:
+            if local_path is not None:
+                ext = os.path.splitext(local_path)[1]
+                entry.blob = f"{self._blob_dir(kind, key)}/{int(now)}-{uuid.uuid4().hex[:12]}{ext}"
+                entry.size = os.path.getsize(local_path)
+                self.backend.put_file(entry.blob, local_path, content_type="application/octet-stream")
+
+            # Manifest last: this PUT is the atomic publish
+            self.backend.put_bytes(
+                self._manifest_name(kind, key),
+                json.dumps(asdict(entry)).encode("utf-8"),
+                content_type="application/json"
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Artifact publish failed ({kind}/{key[:12]}): {e}")
+            return None
+
+        logger.info(f"📦 Artifact published: {kind}/{key[:12]} ({entry.size} bytes)")
+        return entry
+
+    def invalidate(self, kind: str, key: str):
+        """Drop an artifact's manifest (its blob is collected by the next purge)."""
+        self.backend.delete(self._manifest_name(kind, key))
+
+    def purge_expired(self) -> int:
+        """
+        Delete expired manifests and blobs no live manifest references.
+
+        Safe to run concurrently on several nodes. Returns the number of objects removed.
+        """
+        removed = 0
+        live_blobs = set()
+
+        for name in list(self.backend.list_objects(f"{MANIFEST_PREFIX}/")):
+            try:
+                data = self.backend.get_bytes(name)
+                entry = ArtifactEntry(**json.loads(data)) if data else None
+            except Exception:
+                entry = None
+            if entry is None or entry.expired:
+                self.backend.delete(name)
+                removed += 1
+            elif entry.blob:
+                live_blobs.add(entry.blob)
+
+        now = time.time()
+        for name in list(self.backend.list_objects(f"{BLOB_PREFIX}/")):
+            if name in live_blobs:
+                continue
+            created = _blob_timestamp(name)
+            if created is None or now - created > ORPHAN_GRACE_SECONDS:
+                self.backend.delete(name)
+                removed += 1
+
+        if removed:
+            logger.info(f"🧹 Artifact cache: đã xoá {removed} object hết hạn")
+        return removed
+
+    @staticmethod
+    def _manifest_name(kind: str, key: str) -> str:
+        return f"{MANIFEST_PREFIX}/{kind}/{key[:2]}/{key}.json"
+
+    @staticmethod
+    def _blob_dir(kind: str, key: str) -> str:
+        return f"{BLOB_PREFIX}/{kind}/{key[:2]}/{key}"
+
+
+def _blob_timestamp(name: str) -> Optional[float]:
+    """Publish time encoded in a blob name (<ts>-<id><ext>)."""
+    try:
+        return float(os.path.basename(name).split("-", 1)[0])
+    except ValueError:
+        return None
@@ -0,0 +1,22 @@
+# Storage backends package
+from worker.backends.base import StorageBackend
+from worker.backends.minio_backend import MinioBackend
+from worker.backends.filesystem import FilesystemBackend
+from worker.config import Settings
+
+__all__ = [
+    "StorageBackend",
+    "MinioBackend",
+    "FilesystemBackend",
+    "create_backend",
+]
+
+
+def create_backend(settings: Settings) -> StorageBackend:
+    """Create the storage backend selected by STORAGE_BACKEND."""
+    backend = settings.storage_backend.lower()
+    if backend == "minio":
+        return MinioBackend(settings)
+    elif backend == "filesystem":
+        return FilesystemBackend(settings)
+    raise ValueError(f"Unknown storage backend: {settings.storage_backend}")
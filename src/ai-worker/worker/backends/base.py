@@ -0,0 +1,76 @@
+"""
+Base Storage Backend
+Abstract interface for the object store the worker reads inputs from and writes outputs to.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional
+
+
+class StorageBackend(ABC):
+    """Abstract base class for storage backends."""
+    
+    name = "base"
+    
+    @abstractmethod
+    def ensure_ready(self):
+        """Prepare the backend (create bucket / root directory). Safe to call repeatedly."""
+        pass
+    
+    @abstractmethod
+    def put_file(self, object_name: str, local_path: str, content_type: str, move: bool = False):
+        """
+        Store a local file under the given object name.
+        
+        Args:
+            object_name: Key relative to the backend root/bucket
+            local_path: File to store
+            content_type: MIME type of the file
+            move: The caller no longer needs local_path, so the backend may take it over
+        """
+        pass
+    
+    @abstractmethod
+    def get_file(self, object_name: str, local_path: str) -> bool:
+        """Fetch an object into local_path. Returns False if it does not exist."""
+        pass
+    
+    @abstractmethod
+    def put_bytes(self, object_name: str, data: bytes, content_type: str = "application/octet-stream"):
+        """Store a small in-memory object."""
+        pass
+    
+    @abstractmethod
+    def get_bytes(self, object_name: str) -> Optional[bytes]:
+        """Read a small object, or None if it does not exist."""
+        pass
+    
+    @abstractmethod
+    def exists(self, object_name: str) -> bool:
+        """Check whether an object exists."""
+        pass
+    
+    @abstractmethod
+    def delete(self, object_name: str):
+        """Delete an object. Missing objects are ignored."""
+        pass
+    
+    @abstractmethod
+    def list_objects(self, prefix: str) -> Iterator[str]:
+        """Iterate object names under a prefix (recursively)."""
+        pass
+    
+    @abstractmethod
+    def url_for(self, object_name: str) -> str:
+        """URL the backend publishes to the API for an object."""
+        pass
+    
+    @abstractmethod
+    def download_url(self, url: str, local_path: str) -> bool:
+        """
+        Fetch a URL that points into this backend without going through HTTP.
+        
+        Returns False if the URL does not belong to this backend, so the caller can
+        fall back to a plain HTTP download.
+        """
+        pass
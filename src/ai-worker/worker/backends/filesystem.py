@@ -0,0 +1,142 @@
+"""
+Filesystem Storage Backend
+Stores objects in a local directory or a volume shared with the API.
+
+"Uploads" are hard links (or renames when the worker hands the file over), so a
+single-node deployment moves no bytes at all. Copies are only made when the
+source and the storage root live on different filesystems.
+"""
+
+import errno
+import logging
+import os
+import shutil
+import uuid
+from typing import Iterator, Optional
+from urllib.parse import urlparse, unquote
+
+from worker.backends.base import StorageBackend
+from worker.config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class FilesystemBackend(StorageBackend):
+    """Storage backend for a local or shared-volume directory."""
+    
+    name = "filesystem"
+    
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.root = os.path.abspath(settings.storage_root)
+        # Base URL the API serves the directory under; file:// when nothing serves it
+        self.public_url = (settings.storage_public_url or f"file://{self.root}").rstrip("/")
+    
+    def ensure_ready(self):
+        os.makedirs(self.root, exist_ok=True)
+    
+    def _path(self, object_name: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, object_name))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            raise ValueError(f"Object name escapes storage root: {object_name}")
+        return path
+    
+    def put_file(self, object_name: str, local_path: str, content_type: str, move: bool = False):
+        dest = self._path(object_name)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        
+        # Stage next to the destination, then rename: readers never see a partial file
+        staging = f"{dest}.{uuid.uuid4().hex}.tmp"
+        try:
+            if move:
+                self._move(local_path, staging)
+            else:
+                self._link_or_copy(local_path, staging)
+            os.replace(staging, dest)
+        finally:
+            if os.path.exists(staging):
+                os.remove(staging)
+    
+    def get_file(self, object_name: str, local_path: str) -> bool:
+        src = self._path(object_name)
+        if not os.path.exists(src):
+            return False
+        if os.path.exists(local_path):
+            os.remove(local_path)
+        self._link_or_copy(src, local_path)
+        return True
+    
+    def put_bytes(self, object_name: str, data: bytes, content_type: str = "application/octet-stream"):
+        dest = self._path(object_name)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        staging = f"{dest}.{uuid.uuid4().hex}.tmp"
+        with open(staging, "wb") as f:
+            f.write(data)
+        os.replace(staging, dest)
+    
+    def get_bytes(self, object_name: str) -> Optional[bytes]:
+        try:
+            with open(self._path(object_name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    
+    def exists(self, object_name: str) -> bool:
+        return os.path.exists(self._path(object_name))
+    
+    def delete(self, object_name: str):
+        try:
+            os.remove(self._path(object_name))
+        except FileNotFoundError:
+            pass
+    
+    def list_objects(self, prefix: str) -> Iterator[str]:
+        # Walk from the deepest directory fully covered by the prefix
+        base_dir = self._path(os.path.dirname(prefix)) if os.path.dirname(prefix) else self.root
+        for dirpath, _, filenames in os.walk(base_dir):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                name = os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, "/")
+                if name.startswith(prefix):
+                    yield name
+    
+    def url_for(self, object_name: str) -> str:
+        return f"{self.public_url}/{object_name}"
+    
+    def download_url(self, url: str, local_path: str) -> bool:
+        if url.startswith(self.public_url + "/"):
+            object_name = unquote(url[len(self.public_url) + 1:])
+        elif url.startswith("file://"):
+            path = unquote(urlparse(url).path)
+            if not path.startswith(self.root + os.sep):
+                return False
+            object_name = os.path.relpath(path, self.root)
+        else:
+            return False
+        
+        if not self.get_file(object_name, local_path):
+            raise FileNotFoundError(f"Object not found in storage root: {object_name}")
+        logger.info(f"🔗 Đã liên kết từ storage: {object_name}")
+        return True
+    
+    @staticmethod
+    def _link_or_copy(src: str, dest: str):
+        """Hard link when possible (zero copy), copy across filesystems."""
+        try:
+            os.link(src, dest)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+            shutil.copyfile(src, dest)
+    
+    @staticmethod
+    def _move(src: str, dest: str):
+        """Rename when possible, copy and delete across filesystems."""
+        try:
+            os.replace(src, dest)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            shutil.copyfile(src, dest)
+            os.remove(src)
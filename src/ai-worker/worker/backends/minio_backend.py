@@ -0,0 +1,131 @@
+"""
+MinIO Storage Backend
+Stores objects in a MinIO (S3-compatible) bucket.
+"""
+
+import io
+import logging
+import threading
+from typing import Iterator, Optional
+from urllib.parse import urlparse, unquote
+
+from worker.backends.base import StorageBackend
+from worker.config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class MinioBackend(StorageBackend):
+    """Storage backend for MinIO object storage."""
+    
+    name = "minio"
+    
+    def __init__(self, settings: Settings):
+        from minio import Minio
+        
+        self.settings = settings
+        self.client = Minio(
+            settings.minio_endpoint,
+            access_key=settings.minio_access_key,
+            secret_key=settings.minio_secret_key,
+            secure=settings.minio_secure
+        )
+        self.bucket = settings.minio_bucket
+        
+        # The bucket check is a network round trip, so it runs on first write
+        # instead of blocking construction
+        self._bucket_ready = False
+        self._bucket_lock = threading.Lock()
+    
+    def ensure_ready(self):
+        """Create the bucket if it doesn't exist."""
+        from minio.error import S3Error
+        
+        if self._bucket_ready:
+            return
+        with self._bucket_lock:
+            if self._bucket_ready:
+                return
+            try:
+                if not self.client.bucket_exists(self.bucket):
+                    self.client.make_bucket(self.bucket)
+                    logger.info(f"📦 Đã tạo bucket: {self.bucket}")
+                self._bucket_ready = True
+            except S3Error as e:
+                logger.error(f"Lỗi tạo bucket: {e}")
+    
+    def put_file(self, object_name: str, local_path: str, content_type: str, move: bool = False):
+        self.ensure_ready()
+        self.client.fput_object(self.bucket, object_name, local_path, content_type=content_type)
+    
+    def get_file(self, object_name: str, local_path: str) -> bool:
+        from minio.error import S3Error
+        
+        try:
+            self.client.fget_object(self.bucket, object_name, local_path)
+            return True
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return False
+            raise
+    
+    def put_bytes(self, object_name: str, data: bytes, content_type: str = "application/octet-stream"):
+        self.ensure_ready()
+        self.client.put_object(
+            self.bucket,
+            object_name,
+            io.BytesIO(data),
+            length=len(data),
+            content_type=content_type
+        )
+    
+    def get_bytes(self, object_name: str) -> Optional[bytes]:
+        from minio.error import S3Error
+        
+        try:
+            response = self.client.get_object(self.bucket, object_name)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+    
+    def exists(self, object_name: str) -> bool:
+        from minio.error import S3Error
+        
+        try:
+            self.client.stat_object(self.bucket, object_name)
+            return True
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return False
+            raise
+    
+    def delete(self, object_name: str):
+        self.client.remove_object(self.bucket, object_name)
+    
+    def list_objects(self, prefix: str) -> Iterator[str]:
+        for obj in self.client.list_objects(self.bucket, prefix=prefix, recursive=True):
+            yield obj.object_name
+    
+    def url_for(self, object_name: str) -> str:
+        return f"http://{self.settings.minio_endpoint}/{self.bucket}/{object_name}"
+    
+    def download_url(self, url: str, local_path: str) -> bool:
+        # Internal MinIO URLs require authentication: http://minio:9000/<bucket>/<object>
+        parsed = urlparse(url)
+        if self.settings.minio_endpoint not in parsed.netloc:
+            return False
+        
+        path_parts = parsed.path.strip("/").split("/", 1)
+        if len(path_parts) != 2:
+            return False
+        
+        bucket, object_name = path_parts[0], unquote(path_parts[1])
+        logger.info(f"🔍 Detected internal MinIO URL: bucket={bucket}, object={object_name}")
+        self.client.fget_object(bucket, object_name, local_path)
+        return True
@@ -0,0 +1,241 @@
+"""
+Batched Faces
+Face detection and swapping of several frames per ONNX Runtime call.
+
+insightface runs its detector once per frame and inswapper once per face, so
+ONNX Runtime only ever sees batch 1. BatchedFaceSwapper takes K frames:
+
+- detection: the frames, letterboxed to the detector input size, go through
+  SCRFD in one run and are decoded per frame with SCRFD.detect's own
+  post-processing (anchors, score threshold, NMS). Only the detector runs:
+  the swapper aligns on bbox + kps, so the landmark, attribute and recognition
+  models of FaceAnalysis.get are skipped.
+- swap: the aligned 128x128 crops of every face of those frames go through
+  inswapper in one run.
+- paste-back: the blend of INSwapper.get(paste_back=True), computed on the
+  face's region of the frame instead of three full-frame warps.
+
+Crops are all taken from the decoded frames, so overlapping faces blend into
+one another slightly differently than with insightface's sequential swaps.
+
+Whether each model accepts a batch larger than 1 is probed once. Models
+exported with a fixed batch of 1 run item by item on the same code path.
+"""
+
+import logging
+from typing import Any, Dict, List
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def batcher_for(analyzer, swapper) -> "BatchedFaceSwapper":
+    """The batcher of an analyzer/swapper pair, built (and probed) once."""
+    batcher = getattr(analyzer, "_trolikoc_batcher", None)
+    if batcher is None or batcher.swapper is not swapper:
+        batcher = BatchedFaceSwapper(analyzer, swapper)
+        analyzer._trolikoc_batcher = batcher
+    return batcher
+
+
+class BatchedFaceSwapper:
+    """Batched SCRFD detection and inswapper swapping."""
+
+    def __init__(self, analyzer, swapper):
+        self.detector = analyzer.det_model
+        self.swapper = swapper
+        self._anchors: Dict[tuple, np.ndarray] = {}
+
+        det_w, det_h = self.detector.input_size
+        self.detect_batched = _probe_batching(
+            self.detector.session,
+            {self.detector.input_name: np.zeros((1, 3, det_h, det_w), dtype=np.float32)}
+        ) and self.detector.batched
+        size = swapper.input_size[0]
+        self.swap_batched = _probe_batching(swapper.session, {
+            swapper.input_names[0]: np.zeros((1, 3, size, size), dtype=np.float32),
+            swapper.input_names[1]: np.zeros((1, swapper.emap.shape[0]), dtype=np.float32),
+        })
+        logger.info(
+            f"📦 ONNX batch: detector {'có' if self.detect_batched else 'không (từng frame)'}, "
+            f"swapper {'có' if self.swap_batched else 'không (từng khuôn mặt)'}"
+        )
+
+    # --- Detection ---
+
+    def detect(self, frames: List[np.ndarray]) -> List[list]:
+        """insightface Face objects (bbox, kps, det_score) of each BGR frame."""
+        det = self.detector
+        det_w, det_h = det.input_size
+        images, scales = [], []
+        for frame in frames:
+            # Letterbox exactly like SCRFD.detect
+            if frame.shape[0] / frame.shape[1] > det_h / det_w:
+                new_h, new_w = det_h, int(det_h / (frame.shape[0] / frame.shape[1]))
+            else:
+                new_w, new_h = det_w, int(det_w * frame.shape[0] / frame.shape[1])
+            image = np.zeros((det_h, det_w, 3), dtype=np.uint8)
+            image[:new_h, :new_w] = cv2.resize(frame, (new_w, new_h))
+            images.append(image)
+            scales.append(new_h / frame.shape[0])
+
+        mean = det.input_mean
+        blob = cv2.dnn.blobFromImages(images, 1.0 / det.input_std, (det_w, det_h), (mean, mean, mean), swapRB=True)
+        outputs = _run(det.session, det.output_names, {det.input_name: blob}, self.detect_batched, det.batched)
+        return [self._decode(outputs, i, scale, det_h, det_w) for i, scale in enumerate(scales)]
+
+    def _decode(self, outputs: List[np.ndarray], item: int, scale: float, height: int, width: int) -> list:
+        """SCRFD.forward + detect post-processing of one batch item."""
+        from insightface.app.common import Face
+        from insightface.model_zoo.scrfd import distance2bbox, distance2kps
+
+        det = self.detector
+        fmc = det.fmc
+        scores_list, bboxes_list, kpss_list = [], [], []
+        for idx, stride in enumerate(det._feat_stride_fpn):
+            scores = outputs[idx][item]
+            bbox_preds = outputs[idx + fmc][item] * stride
+            anchors = self._anchor_centers(height // stride, width // stride, stride)
+            keep = np.where(scores >= det.det_thresh)[0]
+            scores_list.append(scores[keep])
+            bboxes_list.append(distance2bbox(anchors, bbox_preds)[keep])
+            if det.use_kps:
+                kps_preds = outputs[idx + fmc * 2][item] * stride
+                kpss = distance2kps(anchors, kps_preds)
+                kpss_list.append(kpss.reshape((kpss.shape[0], -1, 2))[keep])
+
+        scores = np.vstack(scores_list)
+        if not len(scores):
+            return []
+        order = scores.ravel().argsort()[::-1]
+        pre_det = np.hstack((np.vstack(bboxes_list) / scale, scores)).astype(np.float32, copy=False)[order]
+        keep = det.nms(pre_det)
+        dets = pre_det[keep]
+        if det.use_kps:
+            kpss = (np.vstack(kpss_list) / scale)[order][keep]
+        else:
+            kpss = [None] * len(dets)
+        return [Face(bbox=d[:4], kps=k, det_score=d[4]) for d, k in zip(dets, kpss)]
+
+    def _anchor_centers(self, height: int, width: int, stride: int) -> np.ndarray:
+        key = (height, width, stride)
+        centers = self._anchors.get(key)
+        if centers is None:
+            centers = np.stack(np.mgrid[:height, :width][::-1], axis=-1).astype(np.float32)
+            centers = (centers * stride).reshape((-1, 2))
+            if self.detector._num_anchors > 1:
+                centers = np.stack([centers] * self.detector._num_anchors, axis=1).reshape((-1, 2))
+            self._anchors[key] = centers
+        return centers
+
+    # --- Swap ---
+
+    def swap(self, frames: List[np.ndarray], faces: List[list], target_face) -> List[np.ndarray]:
+        """
+        Swap target_face onto the given faces of each BGR frame (in place).
+
+        Args:
+            faces: per frame, the detected faces to replace
+            target_face: the face swapped in (needs an embedding)
+        """
+        from insightface.utils import face_align
+
+        sw = self.swapper
+        size = sw.input_size[0]
+        crops, jobs = [], []
+        for index, (frame, frame_faces) in enumerate(zip(frames, faces)):
+            for face in frame_faces:
+                crop, matrix = face_align.norm_crop2(frame, face.kps, size)
+                crops.append(crop)
+                jobs.append((index, matrix))
+        if not crops:
+            return frames
+
+        mean = sw.input_mean
+        blob = cv2.dnn.blobFromImages(crops, 1.0 / sw.input_std, sw.input_size, (mean, mean, mean), swapRB=True)
+        latent = np.dot(target_face.normed_embedding.reshape((1, -1)), sw.emap)
+        latent /= np.linalg.norm(latent)
+        latents = np.repeat(latent.astype(np.float32), len(crops), axis=0)
+        pred = _run(
+            sw.session, sw.output_names,
+            {sw.input_names[0]: blob, sw.input_names[1]: latents},
+            self.swap_batched, True
+        )[0]
+        fakes = np.clip(255 * pred.transpose((0, 2, 3, 1)), 0, 255).astype(np.uint8)[..., ::-1]
+
+        for (index, matrix), fake in zip(jobs, fakes):
+            paste_back(frames[index], fake, matrix)
+        return frames
+
+
+def paste_back(frame: np.ndarray, fake: np.ndarray, matrix: np.ndarray):
+    """
+    Blend a swapped crop into frame (in place), as INSwapper.get(paste_back=True).
+
+    Warps, erosion and blur only cover the face's region, padded by the erosion
+    and blur reach so the result matches the full-frame computation.
+    """
+    size = fake.shape[0]
+    inverse = cv2.invertAffineTransform(matrix)
+    corners = np.array([[0, 0], [size, 0], [size, size], [0, size]], dtype=np.float32)
+    points = corners @ inverse[:, :2].T + inverse[:, 2]
+    side = size * np.sqrt(abs(np.linalg.det(inverse[:, :2])))
+    margin = int(side * 0.2) + 16
+    height, width = frame.shape[:2]
+    x0 = max(int(np.floor(points[:, 0].min())) - margin, 0)
+    y0 = max(int(np.floor(points[:, 1].min())) - margin, 0)
+    x1 = min(int(np.ceil(points[:, 0].max())) + margin, width)
+    y1 = min(int(np.ceil(points[:, 1].max())) + margin, height)
+    if x1 <= x0 or y1 <= y0:
+        return
+
+    inverse[0, 2] -= x0
+    inverse[1, 2] -= y0
+    region = (x1 - x0, y1 - y0)
+    warped = cv2.warpAffine(fake, inverse, region, borderValue=0.0)
+    mask = cv2.warpAffine(np.full((size, size), 255, dtype=np.float32), inverse, region, borderValue=0.0)
+    mask[mask > 20] = 255
+
+    rows, cols = np.where(mask == 255)
+    if not len(rows):
+        return
+    mask_size = int(np.sqrt((rows.max() - rows.min()) * (cols.max() - cols.min())))
+    k = max(mask_size // 10, 10)
+    mask = cv2.erode(mask, np.ones((k, k), np.uint8), iterations=1)
+    k = max(mask_size // 20, 5)
+    mask = cv2.GaussianBlur(mask, (2 * k + 1, 2 * k + 1), 0)
+    mask = (mask / 255)[..., None]
+
+    target = frame[y0:y1, x0:x1].astype(np.float32)
+    frame[y0:y1, x0:x1] = (mask * warped + (1 - mask) * target).astype(np.uint8)
+
+
+def _probe_batching(session, feeds: Dict[str, np.ndarray]) -> bool:
+    """Whether a session runs a batch of 2 (dynamic batch dimension)."""
+    if any(isinstance(inp.shape[0], int) and inp.shape[0] == 1 for inp in session.get_inputs()):
+        return False
+    try:
+        session.run(None, {name: np.concatenate([value, value]) for name, value in feeds.items()})
+        return True
+    except Exception:
+        return False
+
+
+def _run(session, output_names: List[str], feeds: Dict[str, Any], batched: bool, batch_axis: bool) -> List[np.ndarray]:
+    """
+    Outputs of a batch, with the batch as the first axis.
+
+    Args:
+        batched: the session takes the whole batch in one run
+        batch_axis: the model's outputs have a batch axis (SCRFD exports may fold it away)
+    """
+    if batched:
+        return session.run(output_names, feeds)
+    count = len(next(iter(feeds.values())))
+    runs = []
+    for i in range(count):
+        outputs = session.run(output_names, {name: value[i:i + 1] for name, value in feeds.items()})
+        runs.append(outputs if batch_axis else [output[None] for output in outputs])
+    return [np.concatenate([outputs[j] for outputs in runs]) for j in range(len(runs[0]))]
@@ -0,0 +1,221 @@
+"""
+Request Coalescing
+Runs one computation for identical jobs that are in flight at the same time.
+
+Identical means same job type, same input URLs and same parameters (job/user IDs
+excluded). On this worker, later arrivals await the first job's future. Across
+workers, the first job takes a lease in shared storage (cache/locks/<key>.json).
+Other workers see the lease and poll it until the owner writes the outcome.
+Every waiter still publishes its own completion event; they just share the output.
+
+Only requests that overlap in time are joined: the outcome stays in the lock for
+a few poll intervals, for waiters that were already polling, and is ignored by
+anyone who arrives after the leader finished. Outputs the result cache would not
+reuse (failures, placeholders, job types with RESULT_VARIANT None) are never
+shared, locally or across workers; their waiters compute on their own. Reuse of
+finished outputs is the result cache's job, keyed on input content rather than URLs.
+
+A worker only holds prefetch_count messages at a time, so with the default of 1
+duplicates never coalesce on the same worker, only across workers.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from worker.config import Settings
+from worker.hashing import stable_hash
+from worker.result_cache import normalize_params
+from worker.storage import StorageService
+
+logger = logging.getLogger(__name__)
+
+LOCK_PREFIX = "cache/locks"
+
+# Poll intervals a finished outcome stays readable for remote waiters already polling
+OUTCOME_POLLS = 3
+
+# compute() returns the result and whether identical requests may share it
+Compute = Callable[[], Awaitable[Tuple[Dict[str, Any], bool]]]
+
+
+class RequestCoalescer:
+    """Attaches duplicate in-flight jobs to a single computation."""
+
+    def __init__(self, storage: StorageService, settings: Settings):
+        self.backend = storage.backend
+        self.enabled = settings.coalesce_enabled
+        self.lease_seconds = settings.coalesce_lease_seconds
+        self.poll_seconds = settings.coalesce_poll_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def request_key(job_type: str, payload: Dict[str, Any]) -> str:
+        """Identity of a request before anything is downloaded: URLs and parameters."""
+        return stable_hash(job_type, normalize_params(payload, url_fields=set()))
+
+    async def run(self, key: Optional[str], compute: Compute) -> Dict[str, Any]:
+        """
+        Return compute()'s result, sharing it with identical concurrent requests.
+
+        key None runs compute() alone (job types whose results are never reused).
+        """
+        if not self.enabled or key is None:
+            return (await compute())[0]
+
+        # Same worker: attach to the running computation
+        leader = self._inflight.get(key)
+        if leader is not None:
+            logger.info(f"🔗 Gộp job trùng lặp vào job đang chạy ({key[:12]})")
+            result, shareable = await asyncio.shield(leader)
+            if shareable:
+                return dict(result)
+            logger.info("🔁 Kết quả job trùng lặp không dùng lại được, tự xử lý job")
+            return await self.run(key, compute)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            # Other workers: wait for the lease holder's outcome
+            result, shareable = await self._wait_for_remote(key), True
+            if result is None:
+                result, shareable = await self._compute_with_lease(key, compute)
+            future.set_result((result, shareable))
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody may be awaiting; don't warn about a never-retrieved exception
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _compute_with_lease(self, key: str, compute: Compute) -> Tuple[Dict[str, Any], bool]:
+        lease = _Lease(self, key)
+        await asyncio.to_thread(lease.acquire)
+        result, shareable = None, False
+        try:
+            result, shareable = await compute()
+            return result, shareable
+        finally:
+            await asyncio.to_thread(lease.release, result if shareable else None)
+
+    async def _wait_for_remote(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Wait while another worker holds a live lease for this request.
+
+        Returns its outcome, or None when there is no live lease (or the holder
+        died / failed / had nothing shareable), in which case this worker computes.
+        An outcome found without having seen the job run belongs to an earlier
+        request and is ignored.
+        """
+        announced = False
+        while True:
+            lock = await asyncio.to_thread(self._read_lock, key)
+            if lock is None or lock.get("owner") == self.owner:
+                return None
+
+            outcome = lock.get("outcome")
+            if outcome is not None:
+                if announced and outcome.get("status") == "COMPLETED" and time.time() < lock.get("expires_at", 0):
+                    logger.info(f"🔗 Dùng kết quả job trùng lặp từ worker {lock.get('owner')}")
+                    return dict(outcome)
+                return None
+
+            if time.time() > lock.get("expires_at", 0):
+                logger.info(f"⌛ Lease của {lock.get('owner')} đã hết hạn, tự xử lý job")
+                return None
+
+            if not announced:
+                logger.info(f"🔗 Job trùng lặp đang chạy trên worker {lock.get('owner')}, chờ kết quả...")
+                announced = True
+            await asyncio.sleep(self.poll_seconds)
+
+    def purge_expired(self) -> int:
+        """Delete leases and outcomes nobody renewed (crashed owners, finished jobs)."""
+        removed = 0
+        for object_name in self.backend.list_objects(f"{LOCK_PREFIX}/"):
+            try:
+                data = self.backend.get_bytes(object_name)
+                lock = json.loads(data) if data else {}
+                if time.time() > lock.get("expires_at", 0):
+                    self.backend.delete(object_name)
+                    removed += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Không dọn được lock {object_name}: {e}")
+        return removed
+
+    def _lock_name(self, key: str) -> str:
+        return f"{LOCK_PREFIX}/{key}.json"
+
+    def _read_lock(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            data = self.backend.get_bytes(self._lock_name(key))
+            return json.loads(data) if data else None
+        except Exception as e:
+            logger.warning(f"⚠️ Không đọc được lock: {e}")
+            return None
+
+    def _write_lock(self, key: str, lock: Dict[str, Any]):
+        self.backend.put_bytes(self._lock_name(key), json.dumps(lock).encode("utf-8"), "application/json")
+
+
+class _Lease:
+    """Storage lease renewed from a thread, so it survives blocking model code on the event loop."""
+
+    def __init__(self, coalescer: RequestCoalescer, key: str):
+        self.coalescer = coalescer
+        self.key = key
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def acquire(self):
+        # Best effort: object stores have no compare-and-swap here, so two workers
+        # racing within one round trip may both compute. That costs a duplicate
+        # job, never a wrong result.
+        try:
+            self._renew()
+        except Exception as e:
+            logger.warning(f"⚠️ Không tạo được lock job: {e}")
+            return
+        self._thread = threading.Thread(target=self._run, name=f"lease-{self.key[:8]}", daemon=True)
+        self._thread.start()
+
+    def release(self, result: Optional[Dict[str, Any]]):
+        """Drop the lease, publishing result (None = nothing shareable) to current waiters."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        try:
+            if result is not None:
+                # Leave the outcome until waiters already polling have read it;
+                # purge_expired removes it afterwards
+                self.coalescer._write_lock(self.key, {
+                    "owner": self.coalescer.owner,
+                    "expires_at": time.time() + OUTCOME_POLLS * self.coalescer.poll_seconds,
+                    "outcome": result,
+                })
+            else:
+                self.coalescer.backend.delete(self.coalescer._lock_name(self.key))
+        except Exception as e:
+            logger.warning(f"⚠️ Không giải phóng được lock job: {e}")
+
+    def _renew(self):
+        self.coalescer._write_lock(self.key, {
+            "owner": self.coalescer.owner,
+            "expires_at": time.time() + self.coalescer.lease_seconds,
+        })
+
+    def _run(self):
+        while not self._stop.wait(self.coalescer.lease_seconds / 3):
+            try:
+                self._renew()
+            except Exception as e:
+                logger.warning(f"⚠️ Không gia hạn được lock job: {e}")
@@ -0,0 +1,167 @@
+"""
+Component Registry
+Process-wide, reference-counted sharing of model components between processors.
+
+ImageToVideo and MotionTransfer both run SVD, FaceSwap and face enhancement both
+need buffalo_l face analysis. Processors acquire components by key and get the
+instance already in memory if there is one.
+
+Released components are retained until collect(). The dispatcher unloads the
+previous processor, loads the next one and only then collects, so a component
+both need survives a job-type switch instead of being freed and reloaded.
+"""
+
+import gc
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Set
+
+from worker import model_snapshots
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Entry:
+    value: Any
+    owners: Set[int] = field(default_factory=set)
+    load_seconds: float = 0.0
+
+
+class ComponentRegistry:
+    """Shared model components keyed by identity (model id, dtype, device...)."""
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.RLock()
+
+    def acquire(self, owner: Any, key: str, loader: Callable[[], Any]) -> Any:
+        """Return the component for key, loading it with loader() if nobody holds it."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                logger.info(f"♻️ Dùng lại component đã tải: {key}")
+            else:
+                start = time.time()
+                entry = _Entry(value=loader())
+                entry.load_seconds = time.time() - start
+                self._entries[key] = entry
+                logger.info(f"📦 Đã tải component {key} ({entry.load_seconds:.1f}s)")
+            entry.owners.add(id(owner))
+            return entry.value
+
+    def release(self, owner: Any):
+        """Drop every reference owner holds. Components stay loaded until collect()."""
+        with self._lock:
+            for entry in self._entries.values():
+                entry.owners.discard(id(owner))
+
+    def collect(self) -> int:
+        """Free components nobody holds; returns how many were freed."""
+        with self._lock:
+            unused = [key for key, entry in self._entries.items() if not entry.owners]
+            for key in unused:
+                del self._entries[key]
+                logger.info(f"🗑️ Giải phóng component không dùng: {key}")
+        if unused:
+            gc.collect()
+            _empty_cuda_cache()
+        return len(unused)
+
+    def stats(self) -> Dict[str, int]:
+        """Reference count of every loaded component."""
+        with self._lock:
+            return {key: len(entry.owners) for key, entry in self._entries.items()}
+
+
+def _empty_cuda_cache():
+    try:
+        import torch
+    except ImportError:
+        return
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+        torch.cuda.ipc_collect()
+
+
+# Shared by every processor of this worker process
+registry = ComponentRegistry()
+
+
+def svd_pipeline(owner: Any, model_id: str, snapshot_root: Optional[str] = None, offload: bool = False):
+    """
+    A StableVideoDiffusionPipeline whose UNet, VAE and image encoder are shared.
+
+    Every caller gets its own pipeline object (own scheduler state and memoized
+    methods) around the same weights. Loads from the mmap-able snapshot under
+    snapshot_root when one was prepared.
+
+    Device placement, offload hooks, VAE slicing/tiling and the attention
+    processor live on the shared modules, so they are applied once at load and
+    are part of the key; callers must not change them.
+
+    Args:
+        offload: model CPU offload on the GPU (low VRAM), else everything on CPU
+    """
+    import torch
+    from diffusers import StableVideoDiffusionPipeline
+
+    def load():
+        source, source_kwargs = model_snapshots.pretrained_source(snapshot_root, model_id, variant="fp16")
+        pipe = StableVideoDiffusionPipeline.from_pretrained(
+            source,
+            torch_dtype=torch.float16,
+            low_cpu_mem_usage=True,  # Critical for 6GB RAM env
+            **source_kwargs
+        )
+        if not offload:
+            pipe.to("cpu")
+            return pipe.components
+
+        # Hooks sit on the modules, so every pipeline built around them offloads
+        pipe.enable_model_cpu_offload()
+        logger.info("✅ Model CPU offload enabled")
+        try:
+            pipe.enable_vae_slicing()
+            pipe.enable_vae_tiling()
+            logger.info("✅ VAE slicing & tiling enabled")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not enable VAE slicing/tiling: {e}")
+        try:
+            pipe.enable_xformers_memory_efficient_attention()
+            logger.info("✅ XFormers memory efficient attention enabled")
+        except Exception:
+            logger.info("ℹ️ XFormers not available, using default attention")
+        return pipe.components
+
+    placement = "offload" if offload else "cpu"
+    shared = registry.acquire(owner, f"svd:{model_id}:fp16:{placement}", load)
+    components = dict(shared)
+    # Schedulers keep per-run state (timesteps), never share the instance
+    components["scheduler"] = type(shared["scheduler"]).from_config(shared["scheduler"].config)
+    return StableVideoDiffusionPipeline(**components)
+
+
+def face_analysis(
+    owner: Any,
+    name: str,
+    det_size: tuple,
+    ctx_id: int,
+    providers: list,
+    snapshot_root: Optional[str] = None
+):
+    """A prepared insightface FaceAnalysis shared by every face-processing path."""
+    def load():
+        from insightface.app import FaceAnalysis
+
+        root = model_snapshots.insightface_root(snapshot_root, name)
+        if root:
+            app = FaceAnalysis(name=name, root=root, providers=providers)
+        else:
+            app = FaceAnalysis(name=name, providers=providers)
+        app.prepare(ctx_id=ctx_id, det_size=det_size)
+        return app
+
+    return registry.acquire(owner, f"face_analysis:{name}:{det_size[0]}x{det_size[1]}:ctx{ctx_id}", load)
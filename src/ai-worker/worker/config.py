@@ -18,6 +18,11 @@ class Settings(BaseSettings):
     rabbitmq_pass: str = "admin123"
     rabbitmq_vhost: str = "/"
     
+    # Storage backend: minio (object storage) or filesystem (local dir / shared volume)
+    storage_backend: str = "minio"
+    storage_root: str = "/data/trolikoc"          # filesystem backend root directory
+    storage_public_url: Optional[str] = None      # URL the API serves storage_root under (default: file://)
+    
     # MinIO
     minio_endpoint: str = "localhost:9000"
     minio_access_key: str = "minioadmin"
@@ -32,8 +37,59 @@ class Settings(BaseSettings):
     worker_concurrency: int = 1  # Number of concurrent jobs (limited by GPU memory)
     prefetch_count: int = 1      # Messages to prefetch from RabbitMQ
     
+    # Input Pre-flight
+    max_input_video_seconds: float = 600  # Reject longer videos before loading any model (0 = unlimited)
+    preflight_face_check: bool = True     # Cheap Haar-cascade face check on portrait/face inputs (logs a warning)
+    normalize_inputs: bool = True         # Downscale oversized images/videos at ingest (per-job-type caps)
+    
+    # Artifact Cache (shared by all workers under cache/ in the storage backend)
+    artifact_cache_enabled: bool = True
+    artifact_cache_ttl_hours: float = 168         # 7 days
+    artifact_cache_purge_minutes: float = 60      # 0 = never purge from this worker
+    
+    # Result Cache (identical request -> existing output, stored in the artifact cache)
+    result_cache_enabled: bool = True
+    result_cache_ttl_hours: float = 72
+    
+    # Request Coalescing (identical jobs in flight share one computation)
+    coalesce_enabled: bool = True
+    coalesce_lease_seconds: float = 300   # Cross-worker lock lifetime, renewed while the job runs
+    coalesce_poll_seconds: float = 2      # How often remote waiters check the lock for the outcome
+    
+    # Local Array Cache (face embeddings, detections, latents... reused across jobs)
+    cache_dir: str = os.path.join(os.path.expanduser("~"), ".trolikoc_cache")
+    cache_memory_items: int = 256  # Entries kept in RAM per cache kind
+    cache_disk_mb: float = 2048    # Disk budget per cache kind, least recently used files evicted (0 = unlimited)
+    svd_frame_cache_mb: float = 512  # Disk budget of generated ImageToVideo frames (tens of MB per generation)
+    
+    # Output Delivery
+    output_mode: str = "file"  # file: upload one MP4 after encoding, hls: upload fMP4 segments while encoding
+    hls_segment_seconds: int = 2
+    
+    # Model Preloading
+    warm_job_types: str = ""            # Comma-separated job types loaded before the worker reports ready
+    preload_memory_gb: float = 0        # Extra budget for preloading the most frequent recent job types
+    preload_idle_seconds: float = 120   # Idle time before missing warm-set models are loaded
+    readiness_file: str = "/tmp/ai-worker.ready"
+    
+    # Video Pipelines
+    frame_queue_size: int = 8  # Frames buffered between decode, inference and encode threads
+    face_detect_interval: int = 1      # FaceSwap: full detection every N frames, landmark tracking between (1 = every frame)
+    scene_cut_threshold: float = 30.0  # Thumbnail mean abs difference (0-255) that forces a detection
+    faceswap_segment_workers: int = 0          # FaceSwap: processes swapping keyframe-aligned segments in parallel (0/1 = off)
+    faceswap_segment_min_seconds: float = 30   # Shorter videos run in the single-process pipeline
+    faceswap_batch_size: int = 1               # FaceSwap: frames per batched detector / swapper ONNX run (1 = per frame)
+    
+    # Frame Interpolation (ImageToVideo; jobs may override with "interpolation")
+    interpolation_engine: str = "minterpolate"  # blend, flow, minterpolate or fast / balanced / quality
+    interpolation_workers: int = 0              # Threads of the flow engine (0 = one per core)
+    
+    # Shared Models
+    svd_model_id: str = "stabilityai/stable-video-diffusion-img2vid-xt-1-1"  # ImageToVideo + MotionTransfer
+    
     # Model Paths (optional, can use default HuggingFace cache)
     model_cache_dir: Optional[str] = None
+    model_snapshot_dir: Optional[str] = None  # mmap-able weight snapshots (default: <model_cache_dir>/snapshots)
     
     # GPU Settings
     device: str = "cuda"  # cuda or cpu
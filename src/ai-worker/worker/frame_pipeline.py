@@ -0,0 +1,158 @@
+"""
+Frame Pipeline
+Overlaps decoding, inference and encoding of a video frame by frame.
+
+    decoder thread --[queue]--> process() in the calling thread --[queue]--> writer thread
+
+Each stage hands frames to the next through a bounded queue, so a slow stage
+blocks the one before it (backpressure) and memory stays at a few frames
+whatever the video length. Inference runs in a single thread, so frames come
+out in order; run_batch_pipeline() hands it up to batch_size frames at a
+time. Decoding (OpenCV) and encoding (pipe writes to ffmpeg) release the GIL
+and run in parallel with the model.
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the stop flag while a queue is full / empty
+POLL_SECONDS = 0.1
+
+_END = object()
+
+
+def run_frame_pipeline(
+    frames: Iterable,
+    process: Callable[[int, Any], Any],
+    write: Callable[[Any], None],
+    queue_size: int = 8
+) -> int:
+    """
+    Run frames through process() and write() with decoding and writing in their own threads.
+
+    Args:
+        frames: source frames, iterated in the decoder thread (e.g. a cv2.VideoCapture reader)
+        process: (frame index, frame) -> output frame, called in the calling thread, in order
+        write: consumes output frames in order, called in the writer thread
+        queue_size: frames buffered between two stages
+
+    Returns:
+        Number of frames processed
+
+    Raises:
+        The first exception of any stage; the other stages stop early.
+    """
+    return run_batch_pipeline(
+        frames,
+        lambda indices, batch: [process(indices[0], batch[0])],
+        write,
+        batch_size=1,
+        queue_size=queue_size
+    )
+
+
+def run_batch_pipeline(
+    frames: Iterable,
+    process_batch: Callable[[List[int], List[Any]], Sequence[Any]],
+    write: Callable[[Any], None],
+    batch_size: int,
+    queue_size: int = 8
+) -> int:
+    """
+    Like run_frame_pipeline, with process_batch((frame indices), (frames)) -> output frames.
+
+    Batches hold up to batch_size consecutive frames (fewer at the end of the video).
+    The queues are at least one batch deep so the decoder never stalls a batch.
+    """
+    queue_size = max(queue_size, batch_size)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    decoded: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    processed: "queue.Queue" = queue.Queue(maxsize=queue_size)
+
+    def fail(error: BaseException):
+        errors.append(error)
+        stop.set()
+
+    def put(q: "queue.Queue", item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q: "queue.Queue"):
+        while True:
+            try:
+                return q.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                if stop.is_set():
+                    return _END
+
+    def decode():
+        try:
+            for item in enumerate(frames):
+                if not put(decoded, item):
+                    return
+        except BaseException as e:
+            fail(e)
+        finally:
+            put(decoded, _END)
+
+    def encode():
+        try:
+            while True:
+                frame = get(processed)
+                if frame is _END:
+                    return
+                write(frame)
+        except BaseException as e:
+            fail(e)
+
+    threads = [
+        threading.Thread(target=decode, name="frames-decode", daemon=True),
+        threading.Thread(target=encode, name="frames-encode", daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    started = time.monotonic()
+    count = 0
+    try:
+        ended = False
+        while not ended:
+            indices, batch = [], []
+            while len(batch) < batch_size:
+                item = get(decoded)
+                if item is _END:
+                    ended = True
+                    break
+                indices.append(item[0])
+                batch.append(item[1])
+            if not batch:
+                break
+            outputs = process_batch(indices, batch)
+            if not all(put(processed, output) for output in outputs):
+                break
+            count += len(outputs)
+    except BaseException as e:
+        fail(e)
+    finally:
+        put(processed, _END)
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    elapsed = time.monotonic() - started
+    logger.info(
+        f"⚡ Pipeline: {count} frames trong {elapsed:.1f}s ({count / max(elapsed, 1e-6):.1f} fps, batch {batch_size})"
+    )
+    return count
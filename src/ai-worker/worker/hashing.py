@@ -0,0 +1,29 @@
+"""
+Content Hashing
+Stable digests used as content-addressed cache keys.
+"""
+
+import hashlib
+import json
+from typing import Any
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file's content (hex)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stable_hash(*parts: Any) -> str:
+    """
+    SHA-256 of JSON-serialisable parts, independent of dict ordering.
+
+    Use for composite keys such as (content hash, model version, parameters).
+    """
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
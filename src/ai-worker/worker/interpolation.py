@@ -0,0 +1,143 @@
+"""
+Frame Interpolation
+Engines that raise a generated clip to a higher frame rate.
+
+    blend         cross-fade of the two neighbouring frames (vectorised NumPy, fastest)
+    flow          OpenCV DIS optical flow, both neighbours warped to the in-between
+                  time and blended (flows and warps run in a thread pool)
+    minterpolate  ffmpeg motion-compensated interpolation, applied as a
+                  PostProcessPlan step during the encode (best, single-threaded, slowest)
+
+Jobs pick an engine by name or by quality tier (fast / balanced / quality).
+scripts/benchmark_interpolation.py compares their speed and quality.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ("blend", "flow", "minterpolate")
+
+# Quality tiers accepted in place of an engine name
+TIERS = {
+    "fast": "blend",
+    "balanced": "flow",
+    "quality": "minterpolate",
+}
+
+# Engines that produce frames in Python (minterpolate runs inside ffmpeg)
+FRAME_ENGINES = ("blend", "flow")
+
+
+def resolve_engine(name: Optional[str], default: str = "minterpolate") -> str:
+    """Engine for an engine name or quality tier (default when empty or unknown)."""
+    key = (name or "").strip().lower()
+    engine = TIERS.get(key, key)
+    if engine in ENGINES:
+        return engine
+    if key:
+        logger.warning(f"⚠️ Không có engine nội suy '{name}', dùng {default}")
+    return TIERS.get(default, default)
+
+
+def source_positions(frame_count: int, src_fps: float, dst_fps: float) -> List[Tuple[int, float]]:
+    """
+    (index of the earlier source frame, 0..1 position towards the next one) of every output frame.
+
+    The output spans the same time as the input: (frame_count - 1) / src_fps seconds.
+    """
+    if frame_count < 2 or dst_fps <= src_fps:
+        return [(i, 0.0) for i in range(frame_count)]
+    total = int((frame_count - 1) * dst_fps / src_fps + 1e-6) + 1
+    positions = []
+    for i in range(total):
+        t = i * src_fps / dst_fps
+        index = min(int(t), frame_count - 2)
+        positions.append((index, t - index))
+    return positions
+
+
+def interpolate_frames(
+    frames: Sequence,
+    src_fps: float,
+    dst_fps: float,
+    engine: str,
+    workers: int = 0
+) -> Iterator:
+    """
+    Frames resampled to dst_fps (HxWx3 uint8 arrays, in order).
+
+    Args:
+        frames: source frames (arrays or PIL images)
+        engine: blend or flow
+        workers: threads of the flow engine (0 = one per core)
+    """
+    import numpy as np
+
+    arrays = [frame if isinstance(frame, np.ndarray) else np.asarray(frame.convert("RGB")) for frame in frames]
+    positions = source_positions(len(arrays), src_fps, dst_fps)
+    if engine == "blend":
+        return (_blend(arrays[index], arrays[index + 1], alpha) if alpha else arrays[index]
+                for index, alpha in positions)
+    if engine == "flow":
+        return _flow_frames(arrays, positions, workers or os.cpu_count() or 1)
+    raise ValueError(f"Engine {engine} does not produce frames")
+
+
+def _blend(a, b, alpha: float):
+    """(1 - alpha) * a + alpha * b in 8.8 fixed point."""
+    import numpy as np
+
+    weight = int(round(alpha * 256))
+    mixed = a.astype(np.uint16) * (256 - weight) + b.astype(np.uint16) * weight + 128
+    return (mixed >> 8).astype(np.uint8)
+
+
+def _flow_frames(arrays: list, positions: List[Tuple[int, float]], workers: int) -> Iterator:
+    """Optical-flow interpolation; flows per neighbouring pair, then one warp per output frame."""
+    import cv2
+    import numpy as np
+
+    local = threading.local()
+
+    def dis():
+        if not hasattr(local, "dis"):
+            local.dis = cv2.DISOpticalFlow_create(cv2.DISOPTICAL_FLOW_PRESET_MEDIUM)
+        return local.dis
+
+    gray = [cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY) for frame in arrays]
+    height, width = gray[0].shape
+    grid_x, grid_y = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+
+    needed = sorted({index for index, alpha in positions if alpha})
+
+    def pair_flows(index: int):
+        # OpenCV releases the GIL, so pairs run in parallel
+        forward = dis().calc(gray[index], gray[index + 1], None)
+        backward = dis().calc(gray[index + 1], gray[index], None)
+        return forward, backward
+
+    def warp(position: Tuple[int, float]):
+        index, alpha = position
+        if not alpha:
+            return arrays[index]
+        forward, backward = flows[index]
+        # Pixel y at time alpha came from y - alpha*F01 in frame 0 and y - (1-alpha)*F10 in frame 1
+        from_a = cv2.remap(
+            arrays[index], grid_x - alpha * forward[..., 0], grid_y - alpha * forward[..., 1],
+            cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE
+        )
+        from_b = cv2.remap(
+            arrays[index + 1], grid_x - (1 - alpha) * backward[..., 0], grid_y - (1 - alpha) * backward[..., 1],
+            cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE
+        )
+        return _blend(from_a, from_b, alpha)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="interp") as pool:
+        flows = dict(zip(needed, pool.map(pair_flows, needed)))
+        # map() keeps output order
+        yield from pool.map(warp, positions)
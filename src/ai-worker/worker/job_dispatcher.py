@@ -3,21 +3,29 @@ Job Dispatcher
 Routes incoming job requests to the appropriate AI processor.
 """
 
+import asyncio
 import logging
+import os
+import threading
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Set, Tuple
 
+from worker.coalescing import RequestCoalescer
+from worker.components import registry
 from worker.config import Settings
+from worker.media_probe import InputValidationError
+from worker.preloader import JobMixStats
 from worker.processors.base import BaseProcessor
-from worker.processors.talking_head import TalkingHeadProcessor
-from worker.processors.virtual_tryon import VirtualTryOnProcessor
-from worker.processors.image_to_video import ImageToVideoProcessor
-from worker.processors.motion_transfer import MotionTransferProcessor
-from worker.processors.face_swap import FaceSwapProcessor
+from worker.processors.registry import processor_class
+from worker.result_cache import ResultCache
 from worker.storage import StorageService
+from worker.streaming import HlsStreamUploader
 
 logger = logging.getLogger(__name__)
 
+# Job types whose output is a video and can therefore be streamed as HLS
+STREAMABLE_JOB_TYPES = {"TalkingHead", "ImageToVideo", "MotionTransfer", "FaceSwap"}
+
 
 class JobDispatcher:
     """Dispatches jobs to the appropriate AI processor."""
@@ -25,16 +33,44 @@ class JobDispatcher:
     def __init__(self, settings: Settings):
         self.settings = settings
         self.storage = StorageService(settings)
+        self.results = ResultCache(self.storage, settings)
+        self.coalescer = RequestCoalescer(self.storage, settings)
+        
+        # Processors share temp dirs and the loaded model, so jobs compute one at a
+        # time; duplicates waiting on a coalesced job don't hold this lock
+        self._compute_lock = asyncio.Lock()
         
         # Initialize processors (lazy loading)
         self._processors: Dict[str, BaseProcessor] = {}
+        self._processors_lock = threading.Lock()
         self._current_job_type = None
+        
+        # Job-type mix and the warm set the preloader keeps loaded
+        self.job_mix = JobMixStats(os.path.join(settings.cache_dir, "job_mix.json"))
+        self.resident_job_types: Set[str] = set()
+        self.last_job_at = 0.0
     
     def _get_processor(self, job_type: str) -> BaseProcessor:
-        """Get or create a processor for the given job type."""
+        """Get or create a processor for the given job type (no model is loaded)."""
+        with self._processors_lock:
+            if job_type not in self._processors:
+                logger.info(f"🔧 Đang khởi tạo processor cho {job_type}...")
+                # First use imports the processor module (torch, cv2...)
+                self._processors[job_type] = processor_class(job_type)(self.settings, self.storage)
+                logger.info(f"✅ Processor {job_type} sẵn sàng")
+            
+            return self._processors[job_type]
+    
+    def _activate(self, job_type: str):
+        """Make job_type the current processor, unloading the previous model if switching."""
         
         # Memory Management: Unload previous processor if switching job types
-        if self._current_job_type and self._current_job_type != job_type:
+        # (preloaded warm-set processors stay resident within the preload budget)
+        if (
+            self._current_job_type
+            and self._current_job_type != job_type
+            and self._current_job_type not in self.resident_job_types
+        ):
             logger.info(f"🔄 Đang chuyển từ {self._current_job_type} sang {job_type}. Giải phóng RAM...")
             prev_processor = self._processors.get(self._current_job_type)
             if prev_processor:
@@ -42,45 +78,107 @@ class JobDispatcher:
         
         self._current_job_type = job_type
         
-        if job_type not in self._processors:
-            logger.info(f"🔧 Đang khởi tạo processor cho {job_type}...")
-            
-            if job_type == "TalkingHead":
-                self._processors[job_type] = TalkingHeadProcessor(self.settings, self.storage)
-            elif job_type == "VirtualTryOn":
-                self._processors[job_type] = VirtualTryOnProcessor(self.settings, self.storage)
-            elif job_type == "ImageToVideo":
-                self._processors[job_type] = ImageToVideoProcessor(self.settings, self.storage)
-            elif job_type == "MotionTransfer":
-                self._processors[job_type] = MotionTransferProcessor(self.settings, self.storage)
-            elif job_type == "FaceSwap":
-                self._processors[job_type] = FaceSwapProcessor(self.settings, self.storage)
-            else:
-                raise ValueError(f"Unknown job type: {job_type}")
-            
-            logger.info(f"✅ Processor {job_type} sẵn sàng")
-        
-        return self._processors[job_type]
+        # Load before collecting: components shared with the previous processor
+        # (SVD weights, face analysis) are picked up instead of reloaded
+        self._processors[job_type].ensure_model_loaded()
+        registry.collect()
     
     async def dispatch(self, job_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         """
         Dispatch a job to the appropriate processor.
+        
+        Identical jobs in flight at the same time (here or on another worker) share
+        one computation when its output is one the result cache would reuse; each
+        caller still gets its own result dict.
         """
         start_time = time.time()
+        self.last_job_at = start_time
+        key = await self._coalesce_key(job_type, payload)
+        
+        async def compute() -> Tuple[Dict[str, Any], bool]:
+            async with self._compute_lock:
+                result = await self._run(job_type, payload, start_time)
+                # Same rule as the result cache: failures and placeholders are never
+                # handed to others, duplicates run the job themselves
+                processor = self._processors.get(job_type)
+                shareable = (
+                    result.get("status") == "COMPLETED"
+                    and processor is not None
+                    and processor.result_cacheable()
+                )
+                return result, shareable
+        
+        result = await self.coalescer.run(key, compute)
+        result["processing_time_ms"] = int((time.time() - start_time) * 1000)
+        self.last_job_at = time.time()
+        return result
+    
+    async def _coalesce_key(self, job_type: str, payload: Dict[str, Any]) -> Optional[str]:
+        """Coalescing key of a request, or None if its job type never reuses results."""
+        try:
+            # Off the event loop: the first job of a type imports its module
+            processor_cls = await asyncio.to_thread(processor_class, job_type)
+        except Exception:
+            # Unknown job type or failed import; _run reports it
+            return None
+        if processor_cls.RESULT_VARIANT is None:
+            return None
+        return self.coalescer.request_key(job_type, payload)
+    
+    async def _run(self, job_type: str, payload: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+        """Download, validate, process and upload one job."""
+        stream = None
+        processor = None
         
         try:
-            # Get processor (loading model if needed)
-            processor = self._get_processor(job_type)
+            # Off the event loop: the first job of a type imports its module
+            processor = await asyncio.to_thread(self._get_processor, job_type)
+            job_id = payload.get("jobId") or payload.get("JobId")
+            await asyncio.to_thread(self.job_mix.record, job_type)
+            
+            # Download and hash inputs; identical requests end here
+            inputs = await processor.fetch_inputs(payload)
+            result_key = self.results.key_for(job_type, processor, payload, inputs)
+            cached_url = await asyncio.to_thread(self.results.lookup, result_key)
+            if cached_url:
+                return {
+                    "status": "COMPLETED",
+                    "output_url": cached_url,
+                    "processing_time_ms": int((time.time() - start_time) * 1000)
+                }
+            
+            # Pre-flight: validate and normalise inputs before touching any model
+            await processor.preflight(inputs, payload)
+            
+            # Inputs are usable, now it's worth evicting/loading models
+            self._activate(job_type)
+            
+            # Stream segments to MinIO while the final encode runs
+            if self.settings.output_mode == "hls" and job_type in STREAMABLE_JOB_TYPES:
+                stream = HlsStreamUploader(
+                    self.storage,
+                    job_id,
+                    job_type,
+                    processor.temp_dir,
+                    segment_seconds=self.settings.hls_segment_seconds
+                )
+                stream.start()
+                processor.stream = stream
             
             # Process the job
-            output_path = await processor.process(payload)
+            output_path = await processor.process(payload, inputs)
             
-            # Upload to MinIO
-            job_id = payload.get("jobId") or payload.get("JobId")
-            output_url = await self.storage.upload_output(job_id, job_type, output_path)
+            if stream is not None and output_path == stream.playlist_path:
+                # Segments are already in MinIO, only the tail is left
+                output_url = await asyncio.to_thread(stream.finish)
+            else:
+                # Processor fell back to a plain file (placeholder, ffmpeg failure...)
+                if stream is not None:
+                    stream.cancel()
+                output_url = await self.storage.upload_output(job_id, job_type, output_path)
             
-            # Additional cleanup to free temp files immediately
-            processor.cleanup()
+            if processor.result_cacheable():
+                await asyncio.to_thread(self.results.store, result_key, job_id, output_url)
             
             # OPTIONAL: Aggressively unload model after EVERY job to run in very low RAM
             # Uncomment below if still experiencing OOM
@@ -94,6 +192,16 @@ class JobDispatcher:
                 "processing_time_ms": processing_time_ms
             }
             
+        except InputValidationError as e:
+            processing_time_ms = int((time.time() - start_time) * 1000)
+            logger.warning(f"⛔ Input không hợp lệ, bỏ qua trước khi tải model: {e}")
+            
+            return {
+                "status": "FAILED",
+                "error": str(e),
+                "processing_time_ms": processing_time_ms
+            }
+            
         except Exception as e:
             processing_time_ms = int((time.time() - start_time) * 1000)
             logger.error(f"Lỗi xử lý job: {e}", exc_info=True)
@@ -103,3 +211,12 @@ class JobDispatcher:
                 "error": str(e),
                 "processing_time_ms": processing_time_ms
             }
+        
+        finally:
+            if stream is not None:
+                stream.cancel()
+                processor.stream = None
+            
+            # Free temp files immediately, failed jobs included
+            if processor is not None:
+                processor.cleanup()
@@ -0,0 +1,143 @@
+"""
+Media Normalisation
+Caps the resolution (and video frame rate) of inputs right after download.
+
+Users upload 48-MP photos and 4K/60fps clips while every model works at or below
+1080p. Shrinking once at ingest avoids a full-resolution decode in every later
+stage (resize, per-frame detection, encoding). Caps never go below the
+resolution the job asked for in outputResolution.
+"""
+
+import logging
+import os
+import subprocess
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from worker.media_probe import MediaInfo, probe_media
+
+logger = logging.getLogger(__name__)
+
+# Short side of each outputResolution the API accepts
+RESOLUTION_SHORT_SIDE = {
+    "576p": 576,
+    "720p": 720,
+    "1080p": 1080,
+    "4K": 2160,
+}
+
+
+@dataclass(frozen=True)
+class IngestLimits:
+    """Per-job-type normalisation caps (0 = no cap)."""
+
+    image_max_side: int = 0      # longest side of images
+    video_short_side: int = 0    # short side of videos (portrait and landscape alike)
+    video_fps: float = 0         # frame rate of videos
+
+    def for_resolution(self, resolution: Optional[str]) -> "IngestLimits":
+        """Raise the caps so inputs are never shrunk below the requested output resolution."""
+        short_side = RESOLUTION_SHORT_SIDE.get(resolution or "")
+        if not short_side:
+            return self
+        long_side = short_side * 16 // 9
+        return IngestLimits(
+            image_max_side=max(self.image_max_side, long_side) if self.image_max_side else 0,
+            video_short_side=max(self.video_short_side, short_side) if self.video_short_side else 0,
+            video_fps=self.video_fps,
+        )
+
+
+def normalize_input(info: MediaInfo, limits: IngestLimits) -> MediaInfo:
+    """
+    Downscale an input in place of the original if it exceeds the limits.
+
+    Returns the probe result of the file to use from now on (the original info when
+    nothing had to change).
+    """
+    if info.kind == "image" and limits.image_max_side:
+        return _normalize_image(info, limits.image_max_side)
+    if info.kind == "video" and (limits.video_short_side or limits.video_fps):
+        return _normalize_video(info, limits.video_short_side, limits.video_fps)
+    return info
+
+
+def _normalize_image(info: MediaInfo, max_side: int) -> MediaInfo:
+    from PIL import Image
+
+    if max(info.width, info.height) <= max_side:
+        return info
+
+    with Image.open(info.path) as img:
+        exif = img.info.get("exif")
+        # JPEG draft mode decodes straight at 1/2, 1/4 or 1/8 scale (never below max_side)
+        img.draft("RGB", (max_side, max_side))
+        img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+        base = os.path.splitext(info.path)[0]
+        if img.mode == "RGBA":
+            out_path = f"{base}_norm.png"
+            img.save(out_path, optimize=False)
+        else:
+            out_path = f"{base}_norm.jpg"
+            # Keep EXIF so OpenCV applies the same orientation as for the original
+            img.save(out_path, quality=95, **({"exif": exif} if exif else {}))
+
+    logger.info(f"📐 Thu nhỏ ảnh {info.resolution} -> {img.width}x{img.height}")
+    os.remove(info.path)
+    return probe_media(out_path, "image")
+
+
+def _normalize_video(info: MediaInfo, max_short_side: int, max_fps: float) -> MediaInfo:
+    size = _capped_size(info.width, info.height, max_short_side)
+    # Allow a little slack so 30000/1001 is not "decimated" to 30
+    decimate = bool(max_fps) and info.fps > max_fps + 0.5
+    if size is None and not decimate:
+        return info
+
+    filters = []
+    if size is not None:
+        filters.append(f"scale={size[0]}:{size[1]}:flags=area")
+    if decimate:
+        filters.append(f"fps={max_fps:g}")
+
+    out_path = f"{os.path.splitext(info.path)[0]}_norm.mp4"
+    cmd = [
+        "ffmpeg", "-y",
+        "-i", info.path,
+        "-vf", ",".join(filters),
+        "-map", "0:v:0",
+        "-map", "0:a:0?",
+        "-c:v", "libx264",
+        "-preset", "veryfast",
+        "-crf", "18",
+        "-pix_fmt", "yuv420p",
+        "-c:a", "copy",
+        out_path
+    ]
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        # Normalisation is an optimisation, keep the original on failure
+        logger.warning(f"⚠️ Không chuẩn hoá được video: {result.stderr.decode(errors='replace')[-300:]}")
+        return info
+
+    normalized = probe_media(out_path, "video")
+    logger.info(
+        f"📐 Chuẩn hoá video {info.resolution}@{info.fps:.2f} -> "
+        f"{normalized.resolution}@{normalized.fps:.2f}"
+    )
+    os.remove(info.path)
+    return normalized
+
+
+def _capped_size(width: int, height: int, max_short_side: int) -> Optional[Tuple[int, int]]:
+    """Even-sized dimensions with the short side capped, or None if already within the cap."""
+    short_side = min(width, height)
+    if not max_short_side or short_side <= max_short_side:
+        return None
+    scale = max_short_side / short_side
+    return (
+        max(2, int(round(width * scale / 2)) * 2),
+        max(2, int(round(height * scale / 2)) * 2),
+    )
@@ -0,0 +1,128 @@
+"""
+Method Memoization
+Digest-keyed LRU memoization of methods on third-party model objects.
+
+Pipelines such as LivePortrait or SVD recompute per-image state (crops, keypoints,
+encoder features) on every call. MethodMemo wraps such a method on a live object
+so calls with the same array/tensor content return the earlier result. Results
+stay in process memory (they are often GPU tensors) and are dropped with the model.
+"""
+
+import functools
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def value_digest(value: Any) -> str:
+    """SHA-256 of array/tensor content (plus shape and dtype), or of repr() for other values."""
+    digest = hashlib.sha256()
+    _update(digest, value)
+    return digest.hexdigest()
+
+
+def _update(digest, value: Any):
+    import numpy as np
+
+    if hasattr(value, "detach") and hasattr(value, "cpu"):
+        # torch.Tensor (and subclasses); torch is not imported unless one is passed
+        digest.update(f"t{value.dtype}".encode())
+        value = value.detach().cpu()
+        if str(value.dtype) == "torch.bfloat16":
+            # bfloat16 has no NumPy dtype
+            value = value.float()
+        value = value.numpy()
+    if isinstance(value, np.ndarray):
+        digest.update(f"nd{value.shape}{value.dtype}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"seq{len(value)}".encode())
+        for item in value:
+            _update(digest, item)
+    elif isinstance(value, dict):
+        for key in sorted(value, key=str):
+            digest.update(str(key).encode())
+            _update(digest, value[key])
+    elif hasattr(value, "size") and hasattr(value, "tobytes") and hasattr(value, "mode"):
+        # PIL.Image
+        digest.update(f"pil{value.size}{value.mode}".encode())
+        digest.update(value.tobytes())
+    else:
+        digest.update(repr(value).encode())
+
+
+class MethodMemo:
+    """LRU memo installed on methods of live objects."""
+
+    def __init__(self, name: str, max_items: int = 8, copy_result: Optional[Callable[[Any], Any]] = None):
+        self.name = name
+        self.max_items = max_items
+        self.copy_result = copy_result
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._installed: List[Tuple[Any, str, Any]] = []
+
+    def install(
+        self,
+        obj: Any,
+        method_name: str,
+        key_extra: Optional[Callable[..., Any]] = None,
+        admit: Optional[Callable[..., bool]] = None
+    ) -> bool:
+        """
+        Memoize obj.method_name; returns False if obj has no such method.
+
+        key_extra(*args, **kwargs) may add state that changes the result but is not
+        an argument (e.g. a pipeline flag). admit(*args, **kwargs) limits caching to
+        some calls, e.g. source images but not the driving frames that share a method.
+        """
+        original = getattr(obj, method_name, None) if obj is not None else None
+        if original is None or not callable(original):
+            return False
+
+        @functools.wraps(original)
+        def memoized(*args, **kwargs):
+            if admit is not None and not admit(*args, **kwargs):
+                return original(*args, **kwargs)
+            extra = key_extra(*args, **kwargs) if key_extra else None
+            key = f"{method_name}:{value_digest((args, kwargs, extra))}"
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._copy(self._entries[key])
+            result = original(*args, **kwargs)
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = result
+                while len(self._entries) > self.max_items:
+                    self._entries.popitem(last=False)
+            return self._copy(result)
+
+        setattr(obj, method_name, memoized)
+        self._installed.append((obj, method_name, original))
+        return True
+
+    def clear(self):
+        """Forget cached results and restore the original methods."""
+        for obj, method_name, original in reversed(self._installed):
+            if getattr(original, "__self__", None) is obj:
+                # Bound method: deleting the instance attribute unshadows the class method
+                delattr(obj, method_name)
+            else:
+                setattr(obj, method_name, original)
+        self._installed.clear()
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _copy(self, result: Any) -> Any:
+        return self.copy_result(result) if self.copy_result else result
@@ -14,17 +14,13 @@ from datetime import datetime
 import uuid
 from worker.config import Settings, QUEUE_NAMES
 from worker.job_dispatcher import JobDispatcher
+from worker.preloader import ModelPreloader
+from worker.processors.registry import PROCESSORS, detect_job_type, job_type_for_message
 
 logger = logging.getLogger(__name__)
 
 # MassTransit routing keys (message type URN format)
-MASSTRANSIT_ROUTING_KEYS = {
-    "TalkingHead": "TroLiKOC.Modules.Jobs.Contracts.Messages:TalkingHeadRequest",
-    "VirtualTryOn": "TroLiKOC.Modules.Jobs.Contracts.Messages:VirtualTryOnRequest",
-    "ImageToVideo": "TroLiKOC.Modules.Jobs.Contracts.Messages:ImageToVideoRequest",
-    "MotionTransfer": "TroLiKOC.Modules.Jobs.Contracts.Messages:MotionTransferRequest",
-    "FaceSwap": "TroLiKOC.Modules.Jobs.Contracts.Messages:FaceSwapRequest",
-}
+MASSTRANSIT_ROUTING_KEYS = {job_type: entry.message_type for job_type, entry in PROCESSORS.items()}
 
 
 class MessageConsumer:
@@ -35,10 +31,41 @@ class MessageConsumer:
         self.connection: AbstractRobustConnection = None
         self.channel: AbstractChannel = None
         self.dispatcher = JobDispatcher(settings)
+        self.preloader = ModelPreloader(self.dispatcher, settings)
         self._running = False
+        # A readiness file left by a previous run must not make this one look warm
+        self.preloader.mark_not_ready()
     
     async def start(self):
         """Start consuming messages from job-requests exchange."""
+        # Independent startup I/O runs concurrently: broker setup, the storage
+        # bucket check and loading the warm set
+        unified_queue, _, _ = await asyncio.gather(
+            self._connect(),
+            asyncio.to_thread(self.dispatcher.storage.ensure_ready),
+            # Load the warm set before taking jobs, so a new node joins the pool warm
+            self.preloader.warm_up()
+        )
+        
+        await unified_queue.consume(self._on_unified_message)
+        logger.info("📥 Đang lắng nghe queue: ai-worker-jobs (wildcard binding)")
+        
+        self._running = True
+        self.preloader.mark_ready()
+        logger.info("✅ Worker sẵn sàng nhận công việc!")
+        
+        if self.preloader.configured or self.settings.preload_memory_gb > 0:
+            asyncio.create_task(self.preloader.run_idle_loop(lambda: self._running))
+        
+        if self.settings.artifact_cache_enabled and self.settings.artifact_cache_purge_minutes > 0:
+            asyncio.create_task(self._purge_artifacts_periodically())
+        
+        # Keep running
+        while self._running:
+            await asyncio.sleep(1)
+    
+    async def _connect(self):
+        """Connect to RabbitMQ, declare the exchanges and return the bound job queue."""
         # Connect to RabbitMQ
         connection_url = (
             f"amqp://{self.settings.rabbitmq_user}:{self.settings.rabbitmq_pass}"
@@ -73,19 +100,24 @@ class MessageConsumer:
         # with wildcard binding to catch all messages, then detect job type from message body
         unified_queue = await self.channel.declare_queue("ai-worker-jobs", durable=True)
         await unified_queue.bind(job_exchange, routing_key="#")  # Catch all
-        await unified_queue.consume(self._on_unified_message)
-        logger.info("📥 Đang lắng nghe queue: ai-worker-jobs (wildcard binding)")
-        
-        self._running = True
-        logger.info("✅ Worker sẵn sàng nhận công việc!")
-        
-        # Keep running
+        return unified_queue
+    
+    async def _purge_artifacts_periodically(self):
+        """Expire old entries of the shared artifact cache in the background."""
+        interval = self.settings.artifact_cache_purge_minutes * 60
+        artifacts = self.dispatcher.storage.artifacts
         while self._running:
-            await asyncio.sleep(1)
+            try:
+                await asyncio.to_thread(artifacts.purge_expired)
+                await asyncio.to_thread(self.dispatcher.coalescer.purge_expired)
+            except Exception as e:
+                logger.warning(f"⚠️ Artifact cache purge failed: {e}")
+            await asyncio.sleep(interval)
     
     async def stop(self):
         """Stop consuming and close connections."""
         self._running = False
+        self.preloader.mark_not_ready()
         if self.channel:
             await self.channel.close()
         if self.connection:
@@ -141,19 +173,7 @@ class MessageConsumer:
     
     def _detect_job_type_from_body(self, body: Dict[str, Any]) -> str:
         """Detect job type from MassTransit message body."""
-        msg_types = body.get("messageType", [])
-        for t in msg_types:
-            if "TalkingHead" in t:
-                return "TalkingHead"
-            elif "VirtualTryOn" in t:
-                return "VirtualTryOn"
-            elif "ImageToVideo" in t:
-                return "ImageToVideo"
-            elif "MotionTransfer" in t:
-                return "MotionTransfer"
-            elif "FaceSwap" in t:
-                return "FaceSwap"
-        return "Unknown"
+        return detect_job_type(body.get("messageType", [])) or "Unknown"
     
     async def _on_message(self, message: IncomingMessage, job_type: str):
         """Handle incoming job request (legacy - not used with unified queue)."""
@@ -209,35 +229,12 @@ class MessageConsumer:
     
     def _detect_job_type(self, routing_key: str, body: Dict[str, Any]) -> str:
         """Detect job type from routing key or message body."""
-        rk = routing_key or ""
-        
-        # Check routing key patterns
-        if "TalkingHead" in rk:
-            return "TalkingHead"
-        elif "VirtualTryOn" in rk:
-            return "VirtualTryOn"
-        elif "ImageToVideo" in rk:
-            return "ImageToVideo"
-        elif "MotionTransfer" in rk:
-            return "MotionTransfer"
-        elif "FaceSwap" in rk:
-            return "FaceSwap"
-        
-        # Fallback: check messageType in MassTransit envelope
-        msg_types = body.get("messageType", [])
-        for t in msg_types:
-            if "TalkingHead" in t:
-                return "TalkingHead"
-            elif "VirtualTryOn" in t:
-                return "VirtualTryOn"
-            elif "ImageToVideo" in t:
-                return "ImageToVideo"
-            elif "MotionTransfer" in t:
-                return "MotionTransfer"
-            elif "FaceSwap" in t:
-                return "FaceSwap"
-        
-        return "Unknown"
+        return (
+            job_type_for_message(routing_key)
+            # Fallback: check messageType in MassTransit envelope
+            or detect_job_type(body.get("messageType", []))
+            or "Unknown"
+        )
     
     async def _publish_completion(self, job_id: str, result: Dict[str, Any]):
         """Publish job completion event to RabbitMQ."""
@@ -0,0 +1,193 @@
+"""
+Model Snapshots
+Prepared local copies of model weights that load by memory-mapping.
+
+scripts/download_models.py --snapshot writes them under
+MODEL_SNAPSHOT_DIR (default <MODEL_CACHE_DIR>/snapshots):
+
+    diffusers/<org>--<model>/        save_pretrained() output, safetensors only
+    insightface/models/<pack>/       face-analysis ONNX models (FaceAnalysis root)
+    onnx/<name>/<name>.onnx          standalone ONNX models (inswapper...)
+
+ONNX models are rewritten with their initializers in a page-aligned
+<name>.onnx.data file next to the graph. Either way weights are read from
+files rather than deserialised from a downloaded archive, so a reload, or
+another worker process on the same node, is served from the OS page cache.
+
+A snapshot counts only once its snapshot.json manifest exists (it is written
+last); without one the processors fall back to the HuggingFace cache / model zoo.
+"""
+
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "snapshot.json"
+SNAPSHOT_FORMAT = 1
+
+# Alignment of external ONNX initializers (page / Windows allocation granularity)
+EXTERNAL_DATA_ALIGN = 65536
+# Smaller initializers stay inline in the graph
+EXTERNAL_DATA_MIN_BYTES = 1024
+
+
+def default_root(model_cache_dir: Optional[str] = None) -> str:
+    base = model_cache_dir or os.path.join(os.path.expanduser("~"), ".trolikoc_models")
+    return os.path.join(base, "snapshots")
+
+
+def snapshot_root(settings) -> str:
+    """Snapshot directory configured by the worker settings."""
+    return settings.model_snapshot_dir or default_root(settings.model_cache_dir)
+
+
+def diffusers_name(model_id: str) -> str:
+    return f"diffusers/{model_id.replace('/', '--')}"
+
+
+def find_snapshot(root: Optional[str], name: str) -> Optional[str]:
+    """Directory of a complete snapshot, or None."""
+    if not root:
+        return None
+    path = os.path.join(root, *name.split("/"))
+    try:
+        with open(os.path.join(path, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        logger.warning(f"⚠️ Snapshot {name} có format cũ, bỏ qua (chạy lại download_models.py --snapshot)")
+        return None
+    return path
+
+
+def pretrained_source(root: Optional[str], model_id: str, **hub_kwargs) -> Tuple[str, Dict[str, Any]]:
+    """
+    Where from_pretrained should load model_id from, and the kwargs for that source.
+
+    hub_kwargs (variant=...) apply to the Hub download only; a snapshot is
+    already in the stored dtype and safetensors-only.
+    """
+    path = find_snapshot(root, diffusers_name(model_id))
+    if path is None:
+        return model_id, hub_kwargs
+    logger.info(f"⚡ Dùng snapshot mmap: {path}")
+    return path, {"use_safetensors": True}
+
+
+def insightface_root(root: Optional[str], pack: str) -> Optional[str]:
+    """FaceAnalysis root= containing models/<pack>, or None."""
+    path = find_snapshot(root, f"insightface/models/{pack}")
+    if path is None:
+        return None
+    logger.info(f"⚡ Dùng snapshot mmap: {path}")
+    return os.path.join(root, "insightface")
+
+
+def onnx_model(root: Optional[str], name: str) -> Optional[str]:
+    """Path of the snapshot of a standalone ONNX model (e.g. inswapper_128), or None."""
+    path = find_snapshot(root, f"onnx/{name}")
+    return os.path.join(path, f"{name}.onnx") if path else None
+
+
+def onnx_session(path: str, providers: List[str], threads: int = 0):
+    """
+    ONNX Runtime session of a snapshot model.
+
+    Created from the path (never from bytes) so ONNX Runtime resolves the
+    external .data file itself and maps it instead of reading a copy.
+
+    Args:
+        threads: intra-op threads (0 = ONNX Runtime default, one per core)
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, sess_options=options, providers=providers)
+
+
+# --- Writing snapshots (scripts/download_models.py) ---
+
+def write_pretrained(root: str, model_id: str, pipe) -> str:
+    """Save a loaded diffusers pipeline as a safetensors-only snapshot."""
+    name = diffusers_name(model_id)
+
+    def build(staging: str) -> List[str]:
+        pipe.save_pretrained(staging, safe_serialization=True)
+        return _list_files(staging)
+
+    return _publish(root, name, model_id, build)
+
+
+def write_onnx_pack(root: str, pack: str, source_dir: str) -> str:
+    """Snapshot every ONNX model of an insightface pack directory."""
+    def build(staging: str) -> List[str]:
+        for filename in sorted(os.listdir(source_dir)):
+            if filename.endswith(".onnx"):
+                write_external_onnx(os.path.join(source_dir, filename), os.path.join(staging, filename))
+        return _list_files(staging)
+
+    return _publish(root, f"insightface/models/{pack}", source_dir, build)
+
+
+def write_onnx_model(root: str, name: str, source_path: str) -> str:
+    """Snapshot a standalone ONNX model."""
+    def build(staging: str) -> List[str]:
+        write_external_onnx(source_path, os.path.join(staging, f"{name}.onnx"))
+        return _list_files(staging)
+
+    return _publish(root, f"onnx/{name}", source_path, build)
+
+
+def write_external_onnx(source_path: str, target_path: str):
+    """Copy an ONNX model with its large initializers in an aligned <target>.data file."""
+    import onnx
+    from onnx.external_data_helper import set_external_data
+
+    model = onnx.load(source_path)
+    location = f"{os.path.basename(target_path)}.data"
+    with open(f"{target_path}.data", "wb") as f:
+        for tensor in model.graph.initializer:
+            if not tensor.HasField("raw_data") or len(tensor.raw_data) < EXTERNAL_DATA_MIN_BYTES:
+                continue
+            f.write(b"\0" * (-f.tell() % EXTERNAL_DATA_ALIGN))
+            offset = f.tell()
+            f.write(tensor.raw_data)
+            set_external_data(tensor, location, offset=offset, length=len(tensor.raw_data))
+            tensor.ClearField("raw_data")
+            tensor.data_location = onnx.TensorProto.EXTERNAL
+    onnx.save_model(model, target_path)
+
+
+def _publish(root: str, name: str, source: str, build) -> str:
+    """Build a snapshot in a staging directory, then swap it in and write its manifest."""
+    path = os.path.join(root, *name.split("/"))
+    staging = f"{path}.part"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    files = build(staging)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(staging, path)
+
+    manifest = {"format": SNAPSHOT_FORMAT, "name": name, "source": source, "created_at": time.time(), "files": files}
+    with open(os.path.join(path, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"✅ Snapshot {name} -> {path}")
+    return path
+
+
+def _list_files(directory: str) -> List[str]:
+    return sorted(
+        os.path.relpath(os.path.join(dirpath, filename), directory)
+        for dirpath, _, filenames in os.walk(directory)
+        for filename in filenames
+    )
@@ -0,0 +1,103 @@
+"""
+Pose Tracks
+Whole-body pose keypoints of sampled video frames, and pose maps rendered from them.
+
+Keypoints follow DWPose's 134-point layout: 18 OpenPose body points, 6 feet,
+68 face, 21 left hand, 21 right hand. Coordinates are normalised to [0, 1] so
+one cached sequence renders at any target resolution. Columnar layout, frame i
+owns people offsets[i]:offsets[i + 1]:
+
+    offsets     int32   (frames + 1,)
+    keypoints   float32 (people, 134, 2)
+    scores      float32 (people, 134)
+"""
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+Arrays = Dict[str, np.ndarray]
+
+# Keypoints below this confidence are not drawn (DWPose default)
+SCORE_THRESHOLD = 0.3
+
+BODY_POINTS = 18
+FACE_SLICE = slice(24, 92)
+HAND_SLICES = (slice(92, 113), slice(113, 134))
+
+# OpenPose body limbs (0-based) and their conventional colours
+BODY_LIMBS = [
+    (1, 2), (1, 5), (2, 3), (3, 4), (5, 6), (6, 7), (1, 8), (8, 9), (9, 10),
+    (1, 11), (11, 12), (12, 13), (1, 0), (0, 14), (14, 16), (0, 15), (15, 17),
+]
+BODY_COLORS = [
+    (255, 0, 0), (255, 85, 0), (255, 170, 0), (255, 255, 0), (170, 255, 0),
+    (85, 255, 0), (0, 255, 0), (0, 255, 85), (0, 255, 170), (0, 255, 255),
+    (0, 170, 255), (0, 85, 255), (0, 0, 255), (85, 0, 255), (170, 0, 255),
+    (255, 0, 255), (255, 0, 170), (255, 0, 85),
+]
+HAND_EDGES = [
+    (0, 1), (1, 2), (2, 3), (3, 4), (0, 5), (5, 6), (6, 7), (7, 8),
+    (0, 9), (9, 10), (10, 11), (11, 12), (0, 13), (13, 14), (14, 15), (15, 16),
+    (0, 17), (17, 18), (18, 19), (19, 20),
+]
+
+
+def pack_poses(frames: Sequence[tuple]) -> Arrays:
+    """Pack per-frame (keypoints (P, 134, 2), scores (P, 134)) into columnar arrays."""
+    counts = [len(keypoints) for keypoints, _ in frames]
+    offsets = np.zeros(len(frames) + 1, dtype=np.int32)
+    np.cumsum(counts, out=offsets[1:])
+    keypoints = [k for k, _ in frames if len(k)]
+    scores = [s for _, s in frames if len(s)]
+    return {
+        "offsets": offsets,
+        "keypoints": np.concatenate(keypoints).astype(np.float32) if keypoints else np.zeros((0, 134, 2), np.float32),
+        "scores": np.concatenate(scores).astype(np.float32) if scores else np.zeros((0, 134), np.float32),
+    }
+
+
+def render_pose_maps(poses: Arrays, width: int, height: int) -> List[np.ndarray]:
+    """Render every frame of a packed pose sequence as an RGB pose map of the given size."""
+    offsets = poses["offsets"]
+    return [
+        render_pose_map(
+            poses["keypoints"][offsets[i]:offsets[i + 1]],
+            poses["scores"][offsets[i]:offsets[i + 1]],
+            width,
+            height
+        )
+        for i in range(len(offsets) - 1)
+    ]
+
+
+def render_pose_map(keypoints: np.ndarray, scores: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Draw the people of one frame (normalised keypoints) on a black canvas."""
+    import cv2
+
+    canvas = np.zeros((height, width, 3), dtype=np.uint8)
+    scale = np.array([width, height], dtype=np.float32)
+    stick = max(2, int(round(4 * min(width, height) / 512)))
+
+    for points, conf in zip(keypoints, scores):
+        pixels = (points * scale).astype(np.int32)
+        visible = conf > SCORE_THRESHOLD
+
+        for (a, b), color in zip(BODY_LIMBS, BODY_COLORS):
+            if visible[a] and visible[b]:
+                cv2.line(canvas, tuple(pixels[a]), tuple(pixels[b]), color, stick, cv2.LINE_AA)
+        for i in range(BODY_POINTS):
+            if visible[i]:
+                cv2.circle(canvas, tuple(pixels[i]), stick, BODY_COLORS[i], -1, cv2.LINE_AA)
+
+        for hand in HAND_SLICES:
+            hand_pixels, hand_visible = pixels[hand], visible[hand]
+            for a, b in HAND_EDGES:
+                if hand_visible[a] and hand_visible[b]:
+                    cv2.line(canvas, tuple(hand_pixels[a]), tuple(hand_pixels[b]), (0, 0, 255), max(1, stick // 2))
+
+        for point, ok in zip(pixels[FACE_SLICE], visible[FACE_SLICE]):
+            if ok:
+                cv2.circle(canvas, tuple(point), max(1, stick // 2), (255, 255, 255), -1)
+
+    return canvas
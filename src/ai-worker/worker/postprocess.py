@@ -0,0 +1,208 @@
+"""
+Post-Processing Plan
+Everything done to a job's video after generation, compiled into one ffmpeg run.
+
+Processors declare their steps (scale, watermark, frame interpolation, audio mux,
+output format) on a PostProcessPlan instead of chaining one re-encode per step.
+The plan compiles to a single filter graph and one encode, either of raw frames
+(worker.video_writer.VideoWriter) or of an already generated file
+(worker.video_writer.transcode). Audio is stream-copied whenever its codec can go
+into the MP4 / fMP4 outputs unchanged, and re-encoded to AAC otherwise.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from worker.media_probe import InputValidationError, probe_media
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_TEXT = "Trợ Lý KOC"
+
+# Audio codecs MP4 and the fMP4 HLS segments carry as-is
+COPYABLE_AUDIO_CODECS = frozenset({"aac", "mp3"})
+
+# Motion-compensated interpolation (speed/quality balance):
+# mci = motion compensated, obmc = overlapped blocks (faster than aobmc),
+# bilat = bilateral estimation (faster than bidir)
+MINTERPOLATE = "minterpolate=mi_mode=mci:mc_mode=obmc:me_mode=bilat:fps={fps}"
+
+# yuv420p needs even dimensions
+EVEN_CROP = "crop=trunc(iw/2)*2:trunc(ih/2)*2"
+
+
+@dataclass
+class AudioSource:
+    """Where the output's audio comes from."""
+
+    path: Optional[str] = None   # None = the audio of the video input itself
+    codec: Optional[str] = None  # codec_name if known, probed on compile otherwise
+
+
+class PostProcessPlan:
+    """
+    Builder of the post-processing of one output.
+
+    Steps are declared with chained calls and applied in a fixed order
+    (interpolate, scale, watermark), whatever the order they were declared in:
+
+        plan = PostProcessPlan().watermark().audio()
+        path = transcode(generated_path, output_args, plan)
+    """
+
+    def __init__(self):
+        self.interpolate_fps: Optional[int] = None
+        self.scale_size: Optional[Tuple[int, int]] = None
+        self.watermark_text: Optional[str] = None
+        self.audio_source: Optional[AudioSource] = None
+        self.pixel_format = "yuv420p"
+        self.preset: Optional[str] = None
+        self.crf: Optional[int] = None
+        self.threads: Optional[int] = None
+        self.faststart = True
+        self.video_copy = False
+
+    # --- Steps ---
+
+    def interpolate(self, fps: int) -> "PostProcessPlan":
+        """Synthesize in-between frames up to fps."""
+        self.interpolate_fps = fps
+        return self
+
+    def scale(self, width: int = -2, height: int = -2) -> "PostProcessPlan":
+        """Resize (-2 keeps the aspect ratio with an even size)."""
+        self.scale_size = (width, height)
+        return self
+
+    def watermark(self, text: str = WATERMARK_TEXT) -> "PostProcessPlan":
+        """Draw the watermark text in the bottom-right corner."""
+        self.watermark_text = text
+        return self
+
+    def audio(self, path: Optional[str] = None, codec: Optional[str] = None) -> "PostProcessPlan":
+        """
+        Mux an audio track: the first audio stream of path, or of the video input
+        itself when path is None. Without this step the output has no audio.
+        """
+        self.audio_source = AudioSource(path, codec)
+        return self
+
+    def encode(
+        self,
+        preset: Optional[str] = None,
+        crf: Optional[int] = None,
+        pixel_format: str = "yuv420p",
+        faststart: bool = True,
+        threads: Optional[int] = None
+    ) -> "PostProcessPlan":
+        """libx264 settings of the single encode (ffmpeg defaults where None)."""
+        self.preset = preset
+        self.crf = crf
+        self.threads = threads
+        self.pixel_format = pixel_format
+        self.faststart = faststart
+        return self
+
+    def copy_video(self) -> "PostProcessPlan":
+        """Keep the encoded video stream as is (e.g. concatenating segments); excludes video steps."""
+        self.video_copy = True
+        return self
+
+    # --- Compilation ---
+
+    @property
+    def has_video_steps(self) -> bool:
+        """Whether the plan changes the picture (otherwise a generated file can be kept as is)."""
+        return any(step is not None for step in (self.interpolate_fps, self.scale_size, self.watermark_text))
+
+    def filter_graph(self, size: Optional[Tuple[int, int]] = None) -> str:
+        """
+        The -vf filter chain.
+
+        Args:
+            size: input frame size if known; the even-size crop is only added when needed
+        """
+        filters = []
+        if self.interpolate_fps:
+            filters.append(MINTERPOLATE.format(fps=self.interpolate_fps))
+        if self.scale_size:
+            width, height = self.scale_size
+            filters.append(f"scale={width}:{height}:flags=lanczos")
+        if self.scale_size or size is None or size[0] % 2 or size[1] % 2:
+            filters.append(EVEN_CROP)
+        if self.watermark_text:
+            text = self.watermark_text.replace("'", "").replace(":", "\\:")
+            filters.append(f"drawtext=text='{text}':fontsize=24:fontcolor=white@0.5:x=w-tw-10:y=h-th-10")
+        return ",".join(filters)
+
+    def command(
+        self,
+        input_args: List[str],
+        output_args: List[str],
+        size: Optional[Tuple[int, int]] = None
+    ) -> List[str]:
+        """
+        Full ffmpeg command.
+
+        Args:
+            input_args: arguments declaring input 0, the video (ending in "-i", <source>)
+            output_args: ffmpeg output arguments (a path, or HLS muxer arguments)
+            size: frame size of input 0, if known
+        """
+        cmd = ["ffmpeg", "-y", "-loglevel", "error", *input_args]
+        audio_map = None
+        if self.audio_source is not None:
+            if self.audio_source.path:
+                cmd += ["-i", self.audio_source.path]
+                audio_map = "1:a:0?"
+            else:
+                audio_map = "0:a:0?"
+
+        if self.video_copy and self.has_video_steps:
+            raise ValueError("copy_video() cannot be combined with scale / watermark / interpolate")
+        graph = "" if self.video_copy else self.filter_graph(size)
+        if graph:
+            cmd += ["-vf", graph]
+        cmd += ["-map", "0:v:0"]
+        if audio_map:
+            cmd += ["-map", audio_map, *self._audio_codec_args(input_args[-1])]
+            if self.audio_source.path:
+                cmd.append("-shortest")
+        else:
+            cmd.append("-an")
+
+        if self.video_copy:
+            cmd += ["-c:v", "copy"]
+        else:
+            cmd += ["-c:v", "libx264", "-pix_fmt", self.pixel_format]
+        if self.preset and not self.video_copy:
+            cmd += ["-preset", self.preset]
+        if self.crf is not None and not self.video_copy:
+            cmd += ["-crf", str(self.crf)]
+        if self.threads and not self.video_copy:
+            cmd += ["-threads", str(self.threads)]
+        if self.faststart and len(output_args) == 1:
+            # Plain MP4 file (HLS output arguments are longer): moov atom up front
+            cmd += ["-movflags", "+faststart"]
+        return cmd + output_args
+
+    def _audio_codec_args(self, video_source: str) -> List[str]:
+        codec = self.audio_source.codec
+        if codec is None:
+            codec = _probe_audio_codec(self.audio_source.path or video_source)
+        if codec in COPYABLE_AUDIO_CODECS:
+            return ["-c:a", "copy"]
+        if codec:
+            logger.info(f"🔊 Audio {codec} không copy được vào MP4, encode lại AAC")
+        return ["-c:a", "aac"]
+
+
+def _probe_audio_codec(path: str) -> str:
+    """codec_name of the first audio stream of a file ("" if none or unreadable)."""
+    if path == "pipe:0":
+        return ""
+    try:
+        return probe_media(path, "video").audio_codec
+    except (InputValidationError, OSError):
+        return ""
@@ -0,0 +1,167 @@
+"""
+Model Preloading
+Loads the models this worker is most likely to need before the jobs arrive.
+
+The dispatcher records every job type it runs (persisted across restarts in
+cache_dir). At startup the preloader loads the configured warm set
+(WARM_JOB_TYPES), then the most frequent recent job types that still fit in
+PRELOAD_MEMORY_GB. Only then does the worker start consuming and write its
+readiness file, so autoscaled nodes join the pool warm. When the worker sits
+idle the plan is recomputed and missing models are loaded.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from worker.components import registry
+from worker.config import Settings
+from worker.processors.registry import processor_entry
+
+if TYPE_CHECKING:
+    from worker.job_dispatcher import JobDispatcher
+
+logger = logging.getLogger(__name__)
+
+# Recent jobs kept in the mix statistics
+MIX_WINDOW = 500
+
+# A job this old weighs half as much as one that just ran
+MIX_HALF_LIFE_SECONDS = 24 * 3600
+
+
+class JobMixStats:
+    """Time-decayed frequency of recent job types, persisted as JSON."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._events: deque = deque(maxlen=MIX_WINDOW)
+        self._lock = threading.Lock()
+        self._load()
+
+    def record(self, job_type: str):
+        with self._lock:
+            self._events.append((job_type, time.time()))
+            events = list(self._events)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(events, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Không lưu được thống kê job: {e}")
+
+    def ranking(self) -> List[Tuple[str, float]]:
+        """Job types by decayed frequency, most likely first."""
+        now = time.time()
+        scores: Dict[str, float] = {}
+        with self._lock:
+            for job_type, timestamp in self._events:
+                weight = 0.5 ** (max(0.0, now - timestamp) / MIX_HALF_LIFE_SECONDS)
+                scores[job_type] = scores.get(job_type, 0.0) + weight
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._events.extend((job_type, float(ts)) for job_type, ts in json.load(f))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"⚠️ Thống kê job hỏng, bắt đầu lại: {e}")
+
+
+class ModelPreloader:
+    """Keeps the predicted warm set of processors loaded."""
+
+    def __init__(self, dispatcher: "JobDispatcher", settings: Settings):
+        self.dispatcher = dispatcher
+        self.settings = settings
+        self.configured = [t.strip() for t in settings.warm_job_types.split(",") if t.strip()]
+
+    def plan(self) -> List[str]:
+        """Configured warm set first, then the likeliest job types within the memory budget."""
+        warm = list(self.configured)
+        budget = self.settings.preload_memory_gb - sum(self._memory_gb(t) for t in warm)
+        for job_type, _ in self.dispatcher.job_mix.ranking():
+            if job_type in warm:
+                continue
+            try:
+                needed = self._memory_gb(job_type)
+            except ValueError:
+                continue
+            if needed <= budget:
+                warm.append(job_type)
+                budget -= needed
+        return warm
+
+    async def warm_up(self):
+        """Load the planned warm set (blocks until every configured type is loaded)."""
+        warm = self.plan()
+        self.dispatcher.resident_job_types = set(warm)
+        if not warm:
+            return
+        logger.info(f"🔥 Preload models: {', '.join(warm)}")
+        for job_type in warm:
+            await self._load(job_type)
+
+    def mark_ready(self):
+        """Write the readiness file the container health check looks for."""
+        path = self.settings.readiness_file
+        if not path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"ready_at": time.time(), "warm": sorted(self.dispatcher.resident_job_types)}))
+        logger.info(f"✅ Worker sẵn sàng (readiness: {path})")
+
+    def mark_not_ready(self):
+        path = self.settings.readiness_file
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    async def run_idle_loop(self, is_running):
+        """Re-plan and load missing models whenever the worker has been idle for a while."""
+        idle_seconds = self.settings.preload_idle_seconds
+        while is_running():
+            await asyncio.sleep(idle_seconds)
+            if time.time() - self.dispatcher.last_job_at < idle_seconds:
+                continue
+            warm = self.plan()
+            self.dispatcher.resident_job_types = set(warm)
+            await self._evict_outside(warm)
+            for job_type in warm:
+                processor = self.dispatcher._processors.get(job_type)
+                if processor is None or processor._model is None:
+                    logger.info(f"🔥 Worker rảnh, preload {job_type}")
+                    await self._load(job_type)
+
+    async def _evict_outside(self, warm: List[str]):
+        """Unload models that dropped out of the warm set (the current one excepted)."""
+        async with self.dispatcher._compute_lock:
+            for job_type, processor in list(self.dispatcher._processors.items()):
+                if job_type in warm or job_type == self.dispatcher._current_job_type:
+                    continue
+                if processor._model is not None:
+                    logger.info(f"🧊 {job_type} không còn trong warm set, giải phóng")
+                    processor.unload_model()
+            registry.collect()
+
+    async def _load(self, job_type: str):
+        processor = await asyncio.to_thread(self.dispatcher._get_processor, job_type)
+        # Never load while a job is using the GPU
+        async with self.dispatcher._compute_lock:
+            try:
+                await asyncio.to_thread(processor.ensure_model_loaded)
+            except Exception as e:
+                logger.error(f"❌ Preload {job_type} thất bại: {e}")
+
+    def _memory_gb(self, job_type: str) -> float:
+        # From the registry, so planning doesn't import processor modules
+        return processor_entry(job_type).memory_gb
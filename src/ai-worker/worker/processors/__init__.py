@@ -1,10 +1,7 @@
 # Processors package
+# Processor classes are imported on first access (see worker.processors.registry)
 from worker.processors.base import BaseProcessor
-from worker.processors.talking_head import TalkingHeadProcessor
-from worker.processors.virtual_tryon import VirtualTryOnProcessor
-from worker.processors.image_to_video import ImageToVideoProcessor
-from worker.processors.motion_transfer import MotionTransferProcessor
-from worker.processors.face_swap import FaceSwapProcessor
+from worker.processors.registry import PROCESSORS, processor_class
 
 __all__ = [
     "BaseProcessor",
@@ -13,4 +10,14 @@ __all__ = [
     "ImageToVideoProcessor",
     "MotionTransferProcessor",
     "FaceSwapProcessor",
+    "processor_class",
 ]
+
+_LAZY_CLASSES = {entry.target.split(":")[1]: entry for entry in PROCESSORS.values()}
+
+
+def __getattr__(name):
+    entry = _LAZY_CLASSES.get(name)
+    if entry is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return entry.load()
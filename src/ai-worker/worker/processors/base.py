@@ -3,35 +3,88 @@ Base Processor
 Abstract base class for all AI processors.
 """
 
+import asyncio
 import logging
 import os
 import tempfile
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
 
+from worker.array_cache import ArrayCache
+from worker.components import registry
 from worker.config import Settings
+from worker.hashing import file_sha256
+from worker.media_normalize import IngestLimits, normalize_input
+from worker.media_probe import InputValidationError, MediaInfo, has_face, probe_media, validate_media
+from worker.postprocess import PostProcessPlan
 from worker.storage import StorageService
+from worker.streaming import HlsStreamUploader
+from worker.video_writer import VideoWriter, transcode
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class InputSpec:
+    """Declares one input file a processor needs from the job payload."""
+    
+    url_field: str              # camelCase payload field holding the URL
+    kind: str                   # image, video or audio
+    require_face: bool = False  # image should contain a face (pre-checked, warning only)
+
+
+@dataclass
+class JobInputs:
+    """Downloaded and probed inputs of a job, keyed by input name."""
+    
+    paths: Dict[str, str] = field(default_factory=dict)
+    media: Dict[str, MediaInfo] = field(default_factory=dict)
+    hashes: Dict[str, str] = field(default_factory=dict)  # SHA-256 of the downloaded (raw) files
+    
+    def __getitem__(self, name: str) -> str:
+        return self.paths[name]
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self.paths
+    
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.paths.get(name, default)
+
+
 class BaseProcessor(ABC):
     """Abstract base class for AI processors."""
     
+    # Input files of this job type, downloaded and validated before the model loads
+    INPUTS: Dict[str, InputSpec] = {}
+    
+    # Resolution/fps caps applied to inputs at ingest (see worker.media_normalize)
+    INGEST_LIMITS = IngestLimits()
+    
+    # Identity of the primary model (and pipeline revision) in result cache keys.
+    # Bump the revision when a change alters outputs for the same inputs.
+    MODEL_VERSION = ""
+    # self._model value of the primary model; fallbacks/placeholders are never cached
+    RESULT_VARIANT = "loaded"
+    
     def __init__(self, settings: Settings, storage: StorageService):
         self.settings = settings
         self.storage = storage
         self.device = settings.device
         self.temp_dir = tempfile.mkdtemp(prefix="trolikoc_")
         self._model = None
+        
+        # Set by the dispatcher when the current job streams its output as HLS
+        self.stream: Optional[HlsStreamUploader] = None
     
     @abstractmethod
-    async def process(self, payload: Dict[str, Any]) -> str:
+    async def process(self, payload: Dict[str, Any], inputs: JobInputs) -> str:
         """
         Process a job and return the path to the output file.
         
         Args:
             payload: Job payload containing input URLs and parameters
+            inputs: Inputs already downloaded by fetch_inputs and probed by preflight
         
         Returns:
             Path to the local output file
@@ -60,22 +113,117 @@ class BaseProcessor(ABC):
         Returns:
             Dictionary mapping input names to local file paths
         """
-        local_paths = {}
-        for name, url in urls.items():
-            if url:
-                ext = os.path.splitext(url)[1] or ".tmp"
-                local_path = os.path.join(self.temp_dir, f"{name}{ext}")
-                await self.storage.download_input(url, local_path)
-                local_paths[name] = local_path
-                logger.info(f"📥 Đã tải: {name}")
-        return local_paths
+        os.makedirs(self.temp_dir, exist_ok=True)
+        
+        async def download(name: str, url: str) -> Tuple[str, str]:
+            ext = os.path.splitext(url)[1] or ".tmp"
+            local_path = os.path.join(self.temp_dir, f"{name}{ext}")
+            await self.storage.download_input(url, local_path)
+            logger.info(f"📥 Đã tải: {name}")
+            return name, local_path
+        
+        # Inputs are independent, fetch them concurrently
+        results = await asyncio.gather(*(
+            download(name, url) for name, url in urls.items() if url
+        ))
+        return dict(results)
     
+    async def fetch_inputs(self, payload: Dict[str, Any]) -> JobInputs:
+        """
+        Download every declared input and hash its content.
+        
+        Raises:
+            InputValidationError: if a required input URL is missing
+        """
+        urls = {}
+        for name, spec in self.INPUTS.items():
+            url = payload.get(spec.url_field) or payload.get(spec.url_field[0].upper() + spec.url_field[1:])
+            if not url:
+                raise InputValidationError(f"Thiếu input bắt buộc: {spec.url_field}")
+            urls[name] = url
+        
+        paths = await self.download_inputs(urls)
+        hashes = await asyncio.gather(*(asyncio.to_thread(file_sha256, path) for path in paths.values()))
+        return JobInputs(paths=paths, hashes=dict(zip(paths.keys(), hashes)))
+    
+    async def preflight(self, inputs: JobInputs, payload: Dict[str, Any]):
+        """
+        Probe, validate and normalise downloaded inputs (fills inputs.media).
+        
+        Needs no model, so the dispatcher runs it before loading or evicting one.
+        
+        Raises:
+            InputValidationError: if an input is corrupt or unusable
+        """
+        resolution = payload.get("outputResolution") or payload.get("OutputResolution")
+        limits = self.INGEST_LIMITS.for_resolution(resolution)
+        
+        def check(name: str, spec: InputSpec) -> MediaInfo:
+            info = probe_media(inputs.paths[name], spec.kind)
+            validate_media(name, info, max_video_seconds=self.settings.max_input_video_seconds)
+            if self.settings.normalize_inputs:
+                info = normalize_input(info, limits)
+            if spec.require_face and self.settings.preflight_face_check and not has_face(info.path):
+                # Haar misses tilted, occluded, stylised and small faces the processor's
+                # detector finds; only that detector may reject the input
+                logger.warning(f"⚠️ Haar cascade không thấy khuôn mặt trong ảnh '{name}', để model kiểm tra")
+            return info
+        
+        for name, spec in self.INPUTS.items():
+            info = await asyncio.to_thread(check, name, spec)
+            inputs.paths[name] = info.path
+            inputs.media[name] = info
+            logger.info(
+                f"🔎 {name}: {info.kind} {info.container}/{info.codec} {info.resolution} "
+                f"{info.duration:.2f}s {info.frame_count} frames audio={info.has_audio}"
+            )
+    
+    def result_cacheable(self) -> bool:
+        """Whether the last output came from the primary model and may be reused for identical requests."""
+        return self.RESULT_VARIANT is not None and self._model == self.RESULT_VARIANT
+    
+    def output_target(self, output_path: str) -> Tuple[List[str], str]:
+        """
+        ffmpeg output arguments for the final encode of a job.
+        
+        Returns the arguments to append to the ffmpeg command and the path the
+        processor should return. When the job is streaming, ffmpeg writes HLS
+        segments that are uploaded while encoding instead of a single MP4.
+        """
+        if self.stream is not None:
+            return self.stream.ffmpeg_output_args(), self.stream.playlist_path
+        return [output_path], output_path
+    
+    def video_writer(self, output_path: str, fps: float, **kwargs) -> VideoWriter:
+        """A VideoWriter encoding this job's final output (see output_target)."""
+        output_args, final_path = self.output_target(output_path)
+        return VideoWriter(output_args, fps, path=final_path, **kwargs)
+    
+    def write_video(self, frames, output_path: str, fps: float, **kwargs) -> str:
+        """Encode frames (arrays or PIL images) as this job's final output; returns its path."""
+        with self.video_writer(output_path, fps, **kwargs) as writer:
+            for frame in frames:
+                writer.write(frame)
+        return writer.path
+    
+    async def postprocess(self, plan: PostProcessPlan, video_path: str, output_path: str) -> str:
+        """
+        Apply a plan to a video the model wrote itself, as this job's final output.
+        
+        Raises:
+            VideoWriterError: if ffmpeg fails (video_path is left untouched)
+        """
+        output_args, final_path = self.output_target(output_path)
+        return await asyncio.to_thread(transcode, video_path, output_args, plan, final_path)
     
     def unload_model(self):
         """Unload the model to free up memory."""
         import gc
         import torch
         
+        # Shared components stay loaded until the dispatcher collects them
+        registry.release(self)
+        
         if self._model is not None:
             logger.info(f"🗑️ Đang giải phóng model {self.__class__.__name__}...")
             self._model = None
@@ -93,6 +241,18 @@ class BaseProcessor(ABC):
             
             logger.info(f"✅ Đã giải phóng bộ nhớ {self.__class__.__name__}")
 
+    def array_cache(self, kind: str, max_items: Optional[int] = None, max_disk_mb: Optional[float] = None) -> ArrayCache:
+        """Local cache of NumPy intermediates, backed by the shared artifact cache."""
+        if max_disk_mb is None:
+            max_disk_mb = self.settings.cache_disk_mb
+        return ArrayCache(
+            kind,
+            self.settings.cache_dir,
+            max_items=max_items or self.settings.cache_memory_items,
+            artifacts=self.storage.artifacts,
+            max_disk_bytes=int(max_disk_mb * 1024 * 1024)
+        )
+    
     def cleanup(self):
         """Clean up temporary files."""
         import shutil
@@ -14,30 +14,87 @@ Requirements:
 - numpy
 """
 
+import asyncio
 import logging
+import multiprocessing
 import os
-import subprocess
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
 from typing import Dict, Any, Optional, Tuple, List
 
 import cv2
 import numpy as np
 from PIL import Image
 
-from worker.processors.base import BaseProcessor
+from worker.processors.base import BaseProcessor, InputSpec, JobInputs
+from worker.components import face_analysis
 from worker.config import Settings
+from worker.face_tracks import FaceTrackRecorder, FaceTracks, concat_tracks
+from worker.batched_faces import batcher_for
+from worker.frame_pipeline import run_batch_pipeline, run_frame_pipeline
+from worker.hashing import file_sha256, stable_hash
+from worker.keyframe_tracker import KeyframeFaceTracker
+from worker.media_normalize import IngestLimits
+from worker.media_probe import MediaInfo
+from worker.model_snapshots import insightface_root, onnx_model, onnx_session, snapshot_root
+from worker.postprocess import PostProcessPlan
 from worker.storage import StorageService
+from worker.video_segments import concat_segments, count_frames, split_at_keyframes
+from worker.video_writer import VideoWriter, VideoWriterError
 
 logger = logging.getLogger(__name__)
 
+# Face analyzer pack and detector input size (part of every face cache key)
+FACE_ANALYZER_NAME = "buffalo_l"
+FACE_DET_SIZE = (640, 640)
+SWAPPER_MODEL_NAME = "inswapper_128"
+
+# Segment mode: segments per worker process (load balancing) and shortest segment
+SEGMENTS_PER_WORKER = 2
+MIN_SEGMENT_SECONDS = 4.0
+
+
+@dataclass(frozen=True)
+class SwapOptions:
+    """Per-job settings of the frame loop (picklable for segment workers)."""
+    
+    swap_all_faces: bool = False
+    detect_interval: int = 1
+    cut_threshold: float = 30.0
+    queue_size: int = 8
+    batch_size: int = 1
+
 
 class FaceSwapProcessor(BaseProcessor):
     """Processor for Face Swap (FaceFusion/InsightFace) jobs."""
     
+    INPUTS = {
+        "video": InputSpec("sourceVideoUrl", "video"),
+        "face": InputSpec("targetFaceUrl", "image", require_face=True),
+    }
+    INGEST_LIMITS = IngestLimits(image_max_side=1536, video_short_side=1080, video_fps=30)
+    MODEL_VERSION = "inswapper_128+buffalo_l/r1"
+    RESULT_VARIANT = "insightface"
+    
     def __init__(self, settings: Settings, storage: StorageService):
         super().__init__(settings, storage)
         self.model_name = "FaceSwap"
+        # Tracked (not detected) landmarks between keyframes change the output
+        if settings.face_detect_interval > 1:
+            self.MODEL_VERSION = f"{FaceSwapProcessor.MODEL_VERSION}/track{settings.face_detect_interval}"
+        # Batched paste-back crops every face from the decoded frame (overlapping faces differ)
+        if settings.faceswap_batch_size > 1:
+            self.MODEL_VERSION = f"{self.MODEL_VERSION}/batched"
         self._face_analyzer = None
         self._face_swapper = None
+        self._swapper_path: Optional[str] = None
+        # Segment-parallel mode: worker processes with their own ONNX sessions
+        self._segment_pool: Optional[ProcessPoolExecutor] = None
+        self._face_cache = self.array_cache("face_embedding")
+        # Whole-video detections are large; keep only a few in RAM
+        self._track_cache = self.array_cache("face_tracks", max_items=4)
     
     def load_model(self):
         """Load face swap models."""
@@ -45,23 +102,19 @@ class FaceSwapProcessor(BaseProcessor):
             logger.info(f"🔄 Đang tải {self.model_name}...")
             
             try:
-                import insightface
-                from insightface.app import FaceAnalysis
-                
-                # Initialize face analyzer
-                self._face_analyzer = FaceAnalysis(
-                    name='buffalo_l',
-                    providers=['CUDAExecutionProvider', 'CPUExecutionProvider']
+                # Initialize face analyzer (shared with other face-processing paths)
+                self._face_analyzer = face_analysis(
+                    self,
+                    FACE_ANALYZER_NAME,
+                    FACE_DET_SIZE,
+                    ctx_id=0 if self.device == "cuda" else -1,
+                    providers=['CUDAExecutionProvider', 'CPUExecutionProvider'],
+                    snapshot_root=snapshot_root(self.settings)
                 )
-                self._face_analyzer.prepare(ctx_id=0 if self.device == "cuda" else -1)
                 
                 # Load face swapper model
-                model_path = self._get_swapper_model_path()
-                if model_path and os.path.exists(model_path):
-                    self._face_swapper = insightface.model_zoo.get_model(
-                        model_path,
-                        providers=['CUDAExecutionProvider', 'CPUExecutionProvider']
-                    )
+                self._face_swapper = self._load_swapper()
+                if self._face_swapper is not None:
                     self._model = "insightface"
                     logger.info(f"✅ InsightFace đã sẵn sàng")
                 else:
@@ -80,6 +133,32 @@ class FaceSwapProcessor(BaseProcessor):
             logger.error(f"❌ Lỗi tải model: {e}")
             self._model = "placeholder"
     
+    def unload_model(self):
+        """Unload analyzer and swapper."""
+        self._face_analyzer = None
+        self._face_swapper = None
+        self._shutdown_segment_pool()
+        super().unload_model()
+    
+    def _load_swapper(self):
+        """inswapper from its mmap-able snapshot if prepared, else from the first model path found."""
+        import insightface
+        
+        providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
+        snapshot_path = onnx_model(snapshot_root(self.settings), SWAPPER_MODEL_NAME)
+        if snapshot_path:
+            from insightface.model_zoo.inswapper import INSwapper
+            
+            logger.info(f"⚡ Dùng snapshot mmap: {snapshot_path}")
+            self._swapper_path = snapshot_path
+            return INSwapper(model_file=snapshot_path, session=onnx_session(snapshot_path, providers))
+        
+        model_path = self._get_swapper_model_path()
+        if model_path and os.path.exists(model_path):
+            self._swapper_path = model_path
+            return insightface.model_zoo.get_model(model_path, providers=providers)
+        return None
+    
     def _get_swapper_model_path(self) -> Optional[str]:
         """Get path to the inswapper model."""
         # Check common locations
@@ -110,7 +189,7 @@ class FaceSwapProcessor(BaseProcessor):
                 logger.info(f"   - {p}")
         return None
     
-    async def process(self, payload: Dict[str, Any]) -> str:
+    async def process(self, payload: Dict[str, Any], inputs: JobInputs) -> str:
         """
         Process a Face Swap job.
         
@@ -133,24 +212,18 @@ class FaceSwapProcessor(BaseProcessor):
         logger.info(f"   - Khuôn mặt mới: {target_face_url}")
         logger.info(f"   - Swap tất cả: {swap_all_faces}")
         
-        # Download inputs
-        inputs = await self.download_inputs({
-            "video": source_video_url,
-            "face": target_face_url
-        })
-        
         # Output path
         output_path = os.path.join(self.temp_dir, f"{job_id}_faceswap.mp4")
         
         # Process
         if self._model == "placeholder":
-            import shutil
             shutil.copy(inputs["video"], output_path)
         else:
-            await self._process_faceswap(
+            output_path = await self._process_faceswap(
                 inputs["video"],
                 inputs["face"],
                 output_path,
+                video_info=inputs.media["video"],
                 swap_all_faces=swap_all_faces,
                 enhance=enhance_face
             )
@@ -163,102 +236,224 @@ class FaceSwapProcessor(BaseProcessor):
         video_path: str,
         face_path: str,
         output_path: str,
+        video_info: MediaInfo,
         swap_all_faces: bool = False,
         enhance: bool = True
-    ):
-        """Process video with face swapping."""
+    ) -> str:
+        """Process video with face swapping and return the final output path."""
         logger.info("🎭 Processing face swap...")
         
-        # Load target face
-        target_image = cv2.imread(face_path)
-        target_faces = self._face_analyzer.get(target_image)
+        target_face = self._analyze_target_face(face_path)
+        logger.info(f"✅ Detected target face with score: {target_face.det_score:.2f}")
         
-        if not target_faces:
-            raise ValueError("Không tìm thấy khuôn mặt trong ảnh target")
+        # Detections of earlier jobs on the same video (stock/template clips)
+        key_parts = [file_sha256(video_path), FACE_ANALYZER_NAME, FACE_DET_SIZE]
+        if self.settings.face_detect_interval > 1:
+            key_parts.append(("track", self.settings.face_detect_interval, self.settings.scene_cut_threshold))
+        tracks_key = stable_hash(*key_parts)
+        cached_tracks = self._track_cache.get(tracks_key)
+        tracks = FaceTracks(cached_tracks) if cached_tracks is not None else None
+        if tracks is not None:
+            logger.info(f"♻️ Dùng face tracks đã cache ({tracks.frame_count} frames), bỏ qua detection")
         
-        target_face = target_faces[0]
-        logger.info(f"✅ Detected target face with score: {target_face.det_score:.2f}")
+        options = SwapOptions(
+            swap_all_faces=swap_all_faces,
+            detect_interval=self.settings.face_detect_interval,
+            cut_threshold=self.settings.scene_cut_threshold,
+            queue_size=self.settings.frame_queue_size,
+            batch_size=self.settings.faceswap_batch_size
+        )
+        
+        final_path, recorded = None, None
+        if self._use_segments(video_info):
+            try:
+                final_path, recorded, frame_count = await asyncio.to_thread(
+                    self._swap_segments, video_path, output_path, video_info, target_face, tracks, options
+                )
+            except (VideoWriterError, BrokenProcessPool) as e:
+                logger.error(f"❌ FaceSwap theo segment lỗi, chạy lại tuần tự: {e}")
+                if isinstance(e, BrokenProcessPool):
+                    self._shutdown_segment_pool()
+        if final_path is None:
+            final_path, frame_count, recorder = await asyncio.to_thread(
+                self._swap_video, video_path, output_path, video_info, target_face, tracks, options
+            )
+            recorded = recorder.to_arrays() if recorder.frame_count else None
         
-        # Open video
+        # Only complete runs are cached, so replayed tracks always cover the video
+        if tracks is None and recorded is not None and len(recorded["offsets"]) - 1 == frame_count > 0:
+            self._track_cache.put(tracks_key, recorded)
+        
+        # Apply face enhancement if requested
+        if enhance:
+            await self._enhance_faces(final_path)
+        
+        return final_path
+    
+    def _swap_video(
+        self,
+        video_path: str,
+        output_path: str,
+        video_info: MediaInfo,
+        target_face,
+        tracks: Optional[FaceTracks],
+        options: SwapOptions
+    ) -> Tuple[str, int, FaceTrackRecorder]:
+        """
+        Decode, swap and encode the video in a frame pipeline (see worker.frame_pipeline).
+        
+        Returns the final output path, the number of frames processed and the detections.
+        """
+        # Open video (stream properties come from the pre-flight probe)
         cap = cv2.VideoCapture(video_path)
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = video_info.fps or cap.get(cv2.CAP_PROP_FPS)
         
-        # Setup output video
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path + ".temp.mp4", fourcc, fps, (width, height))
+        # Frames go straight into the final encode, original audio muxed in the same pass
+        plan = PostProcessPlan().audio(video_path, codec=video_info.audio_codec)
+        try:
+            with self.video_writer(output_path, fps, pixel_format="bgr24", plan=plan) as out:
+                frame_count, recorder = swap_frames(
+                    self._face_analyzer, self._face_swapper, cap, out, target_face, tracks, options,
+                    total_frames=video_info.frame_count
+                )
+        finally:
+            cap.release()
+        return out.path, frame_count, recorder
+    
+    # --- Segment-parallel mode ---
+    
+    def _use_segments(self, video_info: MediaInfo) -> bool:
+        return (
+            self.settings.faceswap_segment_workers > 1
+            and self._swapper_path is not None
+            and video_info.duration >= self.settings.faceswap_segment_min_seconds
+        )
+    
+    def _swap_segments(
+        self,
+        video_path: str,
+        output_path: str,
+        video_info: MediaInfo,
+        target_face,
+        tracks: Optional[FaceTracks],
+        options: SwapOptions
+    ) -> Tuple[str, Optional[Dict[str, np.ndarray]], int]:
+        """
+        Swap keyframe-aligned segments in parallel worker processes and join them losslessly.
         
-        frame_idx = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Detect faces in frame
-            source_faces = self._face_analyzer.get(frame)
-            
-            if source_faces:
-                # Swap faces
-                if swap_all_faces:
-                    for face in source_faces:
-                        frame = self._face_swapper.get(
-                            frame,
-                            face,
-                            target_face,
-                            paste_back=True
-                        )
-                else:
-                    # Only swap the largest/most prominent face
-                    source_face = max(source_faces, key=lambda x: x.bbox[2] * x.bbox[3])
-                    frame = self._face_swapper.get(
-                        frame,
-                        source_face,
-                        target_face,
-                        paste_back=True
-                    )
-            
-            out.write(frame)
-            frame_idx += 1
-            
-            if frame_idx % 30 == 0:
-                logger.info(f"   Progress: {frame_idx}/{total_frames} frames")
+        The joined video is a plain MP4 (an HLS stream of the job is cancelled).
+        Returns the output path, the detections (None if replayed) and the frame count.
+        """
+        workers = self.settings.faceswap_segment_workers
+        work_dir = os.path.join(self.temp_dir, "segments")
+        shutil.rmtree(work_dir, ignore_errors=True)
+        segment_seconds = max(video_info.duration / (workers * SEGMENTS_PER_WORKER), MIN_SEGMENT_SECONDS)
+        sources = split_at_keyframes(video_path, work_dir, segment_seconds)
+        counts = [count_frames(path) for path in sources]
+        logger.info(f"🧩 FaceSwap {len(sources)} segments trên {workers} processes ({sum(counts)} frames)")
         
-        cap.release()
-        out.release()
+        fps = video_info.fps
+        if not fps:
+            cap = cv2.VideoCapture(video_path)
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            cap.release()
+        face = {key: target_face[key] for key in ("bbox", "kps", "det_score", "embedding")}
+        track_arrays = None
+        if tracks is not None:
+            track_arrays = {"offsets": tracks.offsets, "bbox": tracks.bbox, "kps": tracks.kps, "det_score": tracks.det_score}
         
-        # Copy audio from original video
-        await self._copy_audio(video_path, output_path + ".temp.mp4", output_path)
+        pool = self._get_segment_pool()
+        futures = {}
+        start = 0
+        for index, (source, count) in enumerate(zip(sources, counts)):
+            task = {
+                "source": source,
+                "output": os.path.join(work_dir, f"out_{index:04d}.mp4"),
+                "fps": fps,
+                "start": start,
+                "target_face": face,
+                "tracks": track_arrays,
+                "options": options,
+            }
+            futures[pool.submit(swap_segment, task)] = index
+            start += count
         
-        # Clean up temp file
-        if os.path.exists(output_path + ".temp.mp4"):
-            os.remove(output_path + ".temp.mp4")
+        results: List[Optional[Dict[str, Any]]] = [None] * len(sources)
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            done = sum(result is not None for result in results)
+            logger.info(f"   Segment {index + 1}/{len(sources)} xong ({done}/{len(sources)})")
         
-        # Apply face enhancement if requested
-        if enhance:
-            await self._enhance_faces(output_path)
+        for result, count in zip(results, counts):
+            if result["frames"] != count:
+                raise VideoWriterError(f"Segment {result['path']}: {result['frames']}/{count} frames")
+        
+        plan = PostProcessPlan().audio(video_path, codec=video_info.audio_codec)
+        final_path = concat_segments([result["path"] for result in results], [output_path], plan)
+        recorded = concat_tracks([result["tracks"] for result in results]) if tracks is None else None
+        return final_path, recorded, sum(counts)
     
-    async def _copy_audio(self, source_video: str, processed_video: str, output_path: str):
-        """Copy audio from source video to processed video."""
-        cmd = [
-            "ffmpeg", "-y",
-            "-i", processed_video,
-            "-i", source_video,
-            "-c:v", "libx264",
-            "-c:a", "aac",
-            "-map", "0:v:0",
-            "-map", "1:a:0?",
-            "-shortest",
-            output_path
-        ]
+    def _get_segment_pool(self) -> ProcessPoolExecutor:
+        if self._segment_pool is None:
+            workers = self.settings.faceswap_segment_workers
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] if self.device == "cuda" else ['CPUExecutionProvider']
+            # spawn: children must not inherit the parent's ONNX Runtime / CUDA state
+            self._segment_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_segment_worker,
+                initargs=(
+                    snapshot_root(self.settings),
+                    self._swapper_path,
+                    providers,
+                    0 if self.device == "cuda" else -1,
+                    threads
+                )
+            )
+            logger.info(f"🚀 Khởi động {workers} FaceSwap processes ({threads} threads/process)")
+        return self._segment_pool
+    
+    def _shutdown_segment_pool(self):
+        if self._segment_pool is not None:
+            self._segment_pool.shutdown(wait=False, cancel_futures=True)
+            self._segment_pool = None
+    
+    def _analyze_target_face(self, face_path: str):
+        """
+        Detect and embed the face to swap in, reusing earlier analyses of the same image.
         
-        try:
-            subprocess.run(cmd, check=True, capture_output=True)
-        except subprocess.CalledProcessError:
-            # If audio copy fails, just use video without audio
-            import shutil
-            shutil.copy(processed_video, output_path)
+        Only what the swapper reads is cached (bbox, kps, det_score, embedding); the
+        key is the content of the analysed (normalised) file plus detector settings.
+        """
+        from insightface.app.common import Face
+        
+        key = stable_hash(file_sha256(face_path), FACE_ANALYZER_NAME, FACE_DET_SIZE)
+        cached = self._face_cache.get(key)
+        if cached is not None:
+            logger.info("♻️ Dùng embedding khuôn mặt đã cache")
+            return Face(
+                bbox=cached["bbox"],
+                kps=cached["kps"],
+                det_score=float(cached["det_score"]),
+                embedding=cached["embedding"]
+            )
+        
+        target_image = cv2.imread(face_path)
+        target_faces = self._face_analyzer.get(target_image)
+        
+        if not target_faces:
+            raise ValueError("Không tìm thấy khuôn mặt trong ảnh target")
+        
+        target_face = target_faces[0]
+        self._face_cache.put(key, {
+            "bbox": np.asarray(target_face.bbox, dtype=np.float32),
+            "kps": np.asarray(target_face.kps, dtype=np.float32),
+            "det_score": np.float32(target_face.det_score),
+            "embedding": np.asarray(target_face.embedding, dtype=np.float32),
+        })
+        return target_face
     
     async def _enhance_faces(self, video_path: str):
         """Apply GFPGAN face enhancement to video."""
@@ -268,3 +463,145 @@ class FaceSwapProcessor(BaseProcessor):
             logger.info("ℹ️ Face enhancement skipped (GFPGAN not integrated)")
         except Exception as e:
             logger.warning(f"⚠️ Face enhancement failed: {e}")
+
+
+def swap_frames(
+    analyzer,
+    swapper,
+    cap,
+    out: VideoWriter,
+    target_face,
+    tracks: Optional[FaceTracks],
+    options: SwapOptions,
+    first_frame: int = 0,
+    total_frames: int = 0
+) -> Tuple[int, FaceTrackRecorder]:
+    """
+    Swap every frame of an opened capture into a writer.
+    
+    Args:
+        first_frame: index of the capture's first frame in the whole video (segments)
+        tracks: cached detections of the whole video, replayed instead of detecting
+    
+    Returns the number of frames written and the detections made (empty if replayed).
+    """
+    recorder = FaceTrackRecorder()
+    # Several frames per detector / swapper run (FACESWAP_BATCH_SIZE)
+    batcher = batcher_for(analyzer, swapper) if options.batch_size > 1 else None
+    detect = (lambda frame: batcher.detect([frame])[0]) if batcher is not None else analyzer.get
+    # Detection on keyframes, landmark tracking in between (FACE_DETECT_INTERVAL)
+    tracker = KeyframeFaceTracker(detect, options.detect_interval, cut_threshold=options.cut_threshold)
+    
+    def read_frames():
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame
+    
+    def faces_to_swap(source_faces: list) -> list:
+        if options.swap_all_faces or not source_faces:
+            return source_faces
+        # Only swap the largest/most prominent face
+        return [max(source_faces, key=lambda x: x.bbox[2] * x.bbox[3])]
+    
+    def swap(frame_idx: int, frame):
+        # Detect/track faces in frame (or replay the cached detections)
+        source_faces = tracks.faces_at(first_frame + frame_idx) if tracks is not None else None
+        if source_faces is None:
+            source_faces = tracker.faces(frame_idx, frame)
+            recorder.add_frame(source_faces)
+        
+        # Swap faces
+        for face in faces_to_swap(source_faces):
+            frame = swapper.get(
+                frame,
+                face,
+                target_face,
+                paste_back=True
+            )
+        
+        if total_frames and (frame_idx + 1) % 30 == 0:
+            logger.info(f"   Progress: {frame_idx + 1}/{total_frames} frames")
+        return frame
+    
+    def swap_batch(indices: List[int], frames: List[np.ndarray]) -> List[np.ndarray]:
+        source_faces = [tracks.faces_at(first_frame + i) if tracks is not None else None for i in indices]
+        missing = [n for n, faces in enumerate(source_faces) if faces is None]
+        if missing:
+            if tracker.interval > 1:
+                # Tracking needs the previous frame's faces, so keyframes are detected one at a time
+                detected = [tracker.faces(indices[n], frames[n]) for n in missing]
+            else:
+                detected = batcher.detect([frames[n] for n in missing])
+            for n, faces in zip(missing, detected):
+                source_faces[n] = faces
+                recorder.add_frame(faces)
+        
+        batcher.swap(frames, [faces_to_swap(faces) for faces in source_faces], target_face)
+        
+        if total_frames and (indices[-1] + 1) // 30 > indices[0] // 30:
+            logger.info(f"   Progress: {indices[-1] + 1}/{total_frames} frames")
+        return frames
+    
+    if batcher is not None:
+        frame_count = run_batch_pipeline(
+            read_frames(), swap_batch, out.write, options.batch_size, queue_size=options.queue_size
+        )
+    else:
+        frame_count = run_frame_pipeline(read_frames(), swap, out.write, queue_size=options.queue_size)
+    if tracker.interval > 1 and tracker.stats.frames:
+        logger.info(f"🎯 Face analysis: {tracker.stats.summary()}")
+    return frame_count, recorder
+
+
+# --- Segment worker processes ---
+
+# Models of this worker process (set by init_segment_worker)
+_segment_models: Dict[str, Any] = {}
+
+
+def init_segment_worker(snapshot_dir: Optional[str], swapper_path: str, providers: List[str], ctx_id: int, threads: int):
+    """Load the analyzer and swapper of a segment worker, each ONNX session bounded to threads."""
+    from insightface.app import FaceAnalysis
+    from insightface.model_zoo.inswapper import INSwapper
+    
+    cv2.setNumThreads(1)
+    root = insightface_root(snapshot_dir, FACE_ANALYZER_NAME)
+    if root:
+        analyzer = FaceAnalysis(name=FACE_ANALYZER_NAME, root=root, providers=providers)
+    else:
+        analyzer = FaceAnalysis(name=FACE_ANALYZER_NAME, providers=providers)
+    analyzer.prepare(ctx_id=ctx_id, det_size=FACE_DET_SIZE)
+    # FaceAnalysis takes no session options; swap in equivalent sessions of the same files
+    for model in analyzer.models.values():
+        model.session = onnx_session(model.model_file, providers, threads)
+    
+    _segment_models["analyzer"] = analyzer
+    _segment_models["swapper"] = INSwapper(model_file=swapper_path, session=onnx_session(swapper_path, providers, threads))
+    _segment_models["threads"] = threads
+
+
+def swap_segment(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Swap one source segment into an MP4 segment (runs in a worker process)."""
+    from insightface.app.common import Face
+    
+    target_face = Face(**task["target_face"])
+    tracks = FaceTracks(task["tracks"]) if task["tracks"] is not None else None
+    # Same encoder settings in every segment, so they concatenate without re-encoding
+    plan = PostProcessPlan().encode(threads=_segment_models["threads"])
+    
+    cap = cv2.VideoCapture(task["source"])
+    try:
+        with VideoWriter([task["output"]], task["fps"], pixel_format="bgr24", plan=plan) as out:
+            frame_count, recorder = swap_frames(
+                _segment_models["analyzer"], _segment_models["swapper"], cap, out,
+                target_face, tracks, task["options"], first_frame=task["start"]
+            )
+    finally:
+        cap.release()
+    return {
+        "path": out.path,
+        "frames": frame_count,
+        "tracks": recorder.to_arrays() if tracks is None else None,
+    }
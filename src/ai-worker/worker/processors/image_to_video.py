@@ -13,80 +13,87 @@ Requirements:
 - accelerate
 """
 
+import asyncio
 import logging
 import os
+import time
 from typing import Dict, Any, Optional
 
+import numpy as np
 import torch
 from PIL import Image
 
-from worker.processors.base import BaseProcessor
+from worker.processors.base import BaseProcessor, InputSpec, JobInputs
+from worker.components import svd_pipeline
 from worker.config import Settings
+from worker.hashing import file_sha256, stable_hash
+from worker.interpolation import FRAME_ENGINES, interpolate_frames, resolve_engine
+from worker.media_normalize import IngestLimits
+from worker.model_snapshots import snapshot_root
+from worker.memo import MethodMemo
+from worker.postprocess import PostProcessPlan
 from worker.storage import StorageService
+from worker.video_writer import VideoWriter, VideoWriterError
 
 logger = logging.getLogger(__name__)
 
+# Seed of every generation (part of the raw frame cache key)
+SVD_SEED = 42
+
+# Generated frames are interpolated to this rate for smoothness
+INTERPOLATION_FPS = 24
+
 
 class ImageToVideoProcessor(BaseProcessor):
     """Processor for Image-to-Video (SVD-XT) jobs."""
     
+    INPUTS = {
+        "source": InputSpec("sourceImageUrl", "image"),
+    }
+    INGEST_LIMITS = IngestLimits(image_max_side=2048)
+    
     def __init__(self, settings: Settings, storage: StorageService):
         super().__init__(settings, storage)
         self.model_name = "SVD-XT"
+        self.MODEL_VERSION = f"{settings.svd_model_id}/r1"
         self._pipeline = None
+        # CLIP image embeddings and VAE latents of conditioning images
+        self._conditioning_memo = MethodMemo("svd_conditioning", max_items=8)
+        # Generated frames (~45 MB each raw): a couple in RAM, the most recent on
+        # local disk within their own budget
+        self._frame_cache = self.array_cache(
+            "svd_frames", max_items=2, max_disk_mb=settings.svd_frame_cache_mb
+        )
     
     def load_model(self):
         """Load Stable Video Diffusion XT model."""
         try:
-            from diffusers import StableVideoDiffusionPipeline
             from diffusers.utils import export_to_video
             
-            logger.info(f"🔄 Đang tải {self.model_name} từ HuggingFace...")
-            
             # Load pipeline with fp16 for memory efficiency
-            # Using SVD-XT 1.1 (25 frames) for better quality and movement
-            model_id = "stabilityai/stable-video-diffusion-img2vid-xt-1-1"
+            # Default SVD-XT 1.1 (25 frames) for better quality and movement
+            model_id = self.settings.svd_model_id
             
             logger.info(f"🔄 Đang tải {self.model_name} ({model_id})...")
             
-            self._pipeline = StableVideoDiffusionPipeline.from_pretrained(
-                model_id,
-                torch_dtype=torch.float16,
-                variant="fp16",
-                low_cpu_mem_usage=True  # Critical for 6GB RAM env
-            )
-            
-            # Move to GPU
-            if self.device == "cuda" and torch.cuda.is_available():
+            use_gpu = self.device == "cuda" and torch.cuda.is_available()
+            if use_gpu:
                 logger.info(f"🚀 GPU detected: {torch.cuda.get_device_name(0)}")
                 vram = torch.cuda.get_device_properties(0).total_memory / 1024**3
                 logger.info(f"   VRAM: {vram:.2f} GB")
-
-                # self._pipeline.to("cuda")  <-- REMOVE THIS. enable_model_cpu_offload handles device placement.
-                
-                # Enable memory optimizations
-                # enable_model_cpu_offload() runs model on GPU but offloads parts to CPU when not used
-                self._pipeline.enable_model_cpu_offload()
-                logger.info("✅ Model CPU offload enabled")
-                
-                # Further memory optimizations for low VRAM
-                try:
-                    self._pipeline.enable_vae_slicing()
-                    self._pipeline.enable_vae_tiling()
-                    logger.info("✅ VAE slicing & tiling enabled")
-                except Exception as e:
-                    logger.warning(f"⚠️ Could not enable VAE slicing/tiling: {e}")
-                
-                # Use xformers if available
-                try:
-                    self._pipeline.enable_xformers_memory_efficient_attention()
-                    logger.info("✅ XFormers memory efficient attention enabled")
-                except Exception:
-                    logger.info("ℹ️ XFormers not available, using default attention")
             else:
-                self._pipeline.to("cpu")
                 logger.warning("⚠️ Running on CPU - this will be slow!")
             
+            # Weights are shared with MotionTransfer through the component registry;
+            # model CPU offload, VAE slicing/tiling and xformers are applied there once
+            self._pipeline = svd_pipeline(self, model_id, snapshot_root(self.settings), offload=use_gpu)
+            
+            # Re-runs of the same image skip straight to denoising. Arguments are the
+            # resized image and the noise-augmented tensor, so their content digest
+            # covers image, size, noise_aug_strength and seed.
+            self._conditioning_memo.install(self._pipeline, "_encode_image")
+            self._conditioning_memo.install(self._pipeline, "_encode_vae_image")
+            
             self._model = "loaded"
             logger.info(f"✅ {self.model_name} đã sẵn sàng")
             
@@ -101,10 +108,11 @@ class ImageToVideoProcessor(BaseProcessor):
     
     def unload_model(self):
         """Unload SVD pipeline."""
+        self._conditioning_memo.clear()
         self._pipeline = None
         super().unload_model()
     
-    async def process(self, payload: Dict[str, Any]) -> str:
+    async def process(self, payload: Dict[str, Any], inputs: JobInputs) -> str:
         """
         Process an Image-to-Video job.
         
@@ -115,6 +123,8 @@ class ImageToVideoProcessor(BaseProcessor):
         - fps: Frames per second (default: 6)
         - motionBucketId: Motion intensity (1-255, default: 127)
         - noiseAugStrength: Noise augmentation (0-1, default: 0.02)
+        - interpolation: blend, flow, minterpolate or a tier (fast, balanced, quality)
+          (default: INTERPOLATION_ENGINE)
         """
         self.ensure_model_loaded()
         
@@ -122,6 +132,15 @@ class ImageToVideoProcessor(BaseProcessor):
         source_image_url = payload.get("sourceImageUrl") or payload.get("SourceImageUrl")
         resolution = payload.get("outputResolution") or payload.get("OutputResolution") or "576p"
         num_inference_steps = int(payload.get("numInferenceSteps") or payload.get("NumInferenceSteps") or 15)
+        num_frames = int(payload.get("numFrames") or payload.get("NumFrames") or 25)
+        fps = int(payload.get("fps") or payload.get("Fps") or 6)
+        motion_bucket_id = int(payload.get("motionBucketId") or payload.get("MotionBucketId") or 127)
+        noise_aug_strength = payload.get("noiseAugStrength", payload.get("NoiseAugStrength"))
+        noise_aug_strength = 0.02 if noise_aug_strength is None else float(noise_aug_strength)  # 0 is valid
+        interpolation = resolve_engine(
+            payload.get("interpolation") or payload.get("Interpolation"),
+            default=self.settings.interpolation_engine
+        )
         
         logger.info(f"🎥 Xử lý ImageToVideo: {job_id}")
         logger.info(f"   - Ảnh nguồn: {source_image_url}")
@@ -130,11 +149,7 @@ class ImageToVideoProcessor(BaseProcessor):
         logger.info(f"   - FPS: {fps}")
         logger.info(f"   - Steps: {num_inference_steps}")
         logger.info(f"   - Motion bucket: {motion_bucket_id}")
-        
-        # Download inputs
-        inputs = await self.download_inputs({
-            "source": source_image_url
-        })
+        logger.info(f"   - Nội suy: {interpolation}")
         
         # Output path
         output_path = os.path.join(self.temp_dir, f"{job_id}_video.mp4")
@@ -145,7 +160,7 @@ class ImageToVideoProcessor(BaseProcessor):
             await self._create_placeholder_video(inputs["source"], output_path, fps)
         else:
             # Production: use SVD
-            await self._generate_video(
+            output_path = await self._generate_video(
                 inputs["source"],
                 output_path,
                 resolution=resolution,
@@ -153,7 +168,8 @@ class ImageToVideoProcessor(BaseProcessor):
                 fps=fps,
                 num_inference_steps=num_inference_steps,
                 motion_bucket_id=motion_bucket_id,
-                noise_aug_strength=noise_aug_strength
+                noise_aug_strength=noise_aug_strength,
+                interpolation=interpolation
             )
         
         logger.info(f"✅ ImageToVideo hoàn thành: {output_path}")
@@ -168,11 +184,10 @@ class ImageToVideoProcessor(BaseProcessor):
         fps: int = 6,
         num_inference_steps: int = 15,
         motion_bucket_id: int = 127,
-        noise_aug_strength: float = 0.02
-    ):
-        """Generate video using SVD-XT pipeline."""
-        from diffusers.utils import export_to_video
-        
+        noise_aug_strength: float = 0.02,
+        interpolation: str = "minterpolate"
+    ) -> str:
+        """Generate video using SVD-XT pipeline and return the final output path."""
         # Load and resize image
         image = Image.open(image_path).convert("RGB")
         target_size = (1024, 576)
@@ -184,8 +199,18 @@ class ImageToVideoProcessor(BaseProcessor):
         
         logger.info(f"🎬 Generating {num_frames} frames at {target_size} using SVD-XT ({num_inference_steps} steps)...")
         
+        # Same image and generation parameters: only the fps/encode step differs
+        frames_key = stable_hash(
+            file_sha256(image_path), self.MODEL_VERSION, target_size, num_frames,
+            num_inference_steps, motion_bucket_id, noise_aug_strength, SVD_SEED
+        )
+        cached = self._frame_cache.get(frames_key)
+        if cached is not None:
+            logger.info("♻️ Dùng frames SVD đã cache, chỉ encode lại")
+            return await self._encode_frames(list(cached["frames"]), output_path, fps, interpolation)
+        
         # Set random seed
-        generator = torch.manual_seed(42)
+        generator = torch.manual_seed(SVD_SEED)
         
         def progress_callback(pipe, step: int, timestep: int, callback_kwargs: Dict[str, Any]):
             logger.info(f"⏳ Generating: Step {step}/{num_inference_steps} (Timestep {timestep})")
@@ -205,58 +230,48 @@ class ImageToVideoProcessor(BaseProcessor):
             ).frames[0]
         
         logger.info(f"✅ Generated {len(frames)} frames")
+        if self._conditioning_memo.hits:
+            logger.info(f"♻️ Conditioning cache: {self._conditioning_memo.stats()}")
         
-        # Intermediate raw export
-        raw_path = output_path.replace(".mp4", "_raw.mp4")
-        export_to_video(frames, raw_path, fps=fps)
-        
-        # Interpolate to smooth 24fps
-        await self._interpolate_video(raw_path, output_path)
+        # Local only: too large to be worth shipping through shared storage
+        self._frame_cache.put(
+            frames_key,
+            {"frames": np.stack([np.asarray(frame.convert("RGB")) for frame in frames])},
+            share=False
+        )
+        return await self._encode_frames(frames, output_path, fps, interpolation)
     
-    async def _interpolate_video(self, input_path: str, output_path: str):
-        """Use FFmpeg minterpolate to smooth video to 24fps."""
-        import subprocess
-        import asyncio
-        logger.info("🌊 Interpolating video to 24fps for smoothness...")
+    async def _encode_frames(self, frames: list, output_path: str, fps: int, engine: str) -> str:
+        """Encode generated frames interpolated to INTERPOLATION_FPS (see worker.interpolation)."""
+        logger.info(f"🌊 Encoding + interpolating video to {INTERPOLATION_FPS}fps ({engine}) for smoothness...")
+        plan = PostProcessPlan().encode(preset="veryfast")
         
-        # motion interpolation (optimized for speed/quality balance)
-        # mi_mode=mci: Motion Compensated Interpolation
-        # mc_mode=obmc: Overlapped Block Motion Compensation (Faster than aobmc)
-        # me_mode=bilat: Bilateral motion estimation (Faster than bidir)
+        def encode() -> str:
+            if engine in FRAME_ENGINES:
+                interpolated = interpolate_frames(
+                    frames, fps, INTERPOLATION_FPS, engine, workers=self.settings.interpolation_workers
+                )
+                return self.write_video(interpolated, output_path, INTERPOLATION_FPS, plan=plan)
+            # minterpolate runs inside the encode
+            return self.write_video(frames, output_path, fps, plan=plan.interpolate(INTERPOLATION_FPS))
         
-        cmd = [
-            "ffmpeg", "-y",
-            "-i", input_path,
-            "-filter:v", "minterpolate='mi_mode=mci:mc_mode=obmc:me_mode=bilat:fps=24'",
-            "-c:v", "libx264",
-            "-pix_fmt", "yuv420p",
-            "-preset", "veryfast",  # Faster encoding
-            output_path
-        ]
-        
-        # Execute in thread to avoid blocking event loop too much (though subprocess.run blocks)
         try:
-             # Run ffmpeg
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await process.communicate()
-            
-            if process.returncode != 0:
-                logger.error(f"FFmpeg interpolation failed: {stderr.decode()}")
-                # Fallback to copy raw
-                import shutil
-                shutil.copy(input_path, output_path)
-            else:
-                logger.info("✅ Interpolation complete")
-                
-        except Exception as e:
-            logger.error(f"Interpolation error: {e}")
-            import shutil
-            shutil.copy(input_path, output_path)
-
+            started = time.monotonic()
+            final_path = await asyncio.to_thread(encode)
+            logger.info(f"✅ Interpolation complete ({engine}, {time.monotonic() - started:.1f}s)")
+            return final_path
+        except VideoWriterError as e:
+            logger.error(f"FFmpeg interpolation failed: {e}")
+        
+        # Fallback: plain encode at the generated fps, as a single file
+        def encode_plain() -> str:
+            with VideoWriter([output_path], fps, plan=PostProcessPlan().encode(preset="veryfast")) as writer:
+                for frame in frames:
+                    writer.write(frame)
+            return writer.path
+        
+        return await asyncio.to_thread(encode_plain)
+    
     def _resize_image(self, image: Image.Image, target_size: tuple) -> Image.Image:
         """Resize image to target size maintaining aspect ratio."""
         target_w, target_h = target_size
@@ -13,6 +13,7 @@ Requirements:
 - decord (for video reading)
 """
 
+import asyncio
 import logging
 import os
 from typing import Dict, Any, List, Optional
@@ -21,21 +22,43 @@ import torch
 import numpy as np
 from PIL import Image
 
-from worker.processors.base import BaseProcessor
+from worker.processors.base import BaseProcessor, InputSpec, JobInputs
+from worker.components import svd_pipeline
 from worker.config import Settings
+from worker.hashing import file_sha256, stable_hash
+from worker.media_normalize import IngestLimits
+from worker.model_snapshots import snapshot_root
+from worker.pose_tracks import pack_poses, render_pose_maps
 from worker.storage import StorageService
 
 logger = logging.getLogger(__name__)
 
+# Pose detector identity and input size (part of every pose cache key)
+POSE_DETECTOR_VERSION = "controlnet_aux.DWposeDetector/wholebody/bgr"
+POSE_DETECT_RESOLUTION = 512
+
+# Working size of the SVD pipeline
+GENERATION_SIZE = (1024, 576)
+
 
 class MotionTransferProcessor(BaseProcessor):
     """Processor for Motion Transfer (MimicMotion) jobs."""
     
+    INPUTS = {
+        "source": InputSpec("sourceImageUrl", "image"),
+        "skeleton": InputSpec("skeletonVideoUrl", "video"),
+    }
+    INGEST_LIMITS = IngestLimits(image_max_side=2048, video_short_side=720, video_fps=30)
+    RESULT_VARIANT = "mimicmotion_svd"
+    
     def __init__(self, settings: Settings, storage: StorageService):
         super().__init__(settings, storage)
         self.model_name = "MimicMotion"
+        self.MODEL_VERSION = f"{settings.svd_model_id}/r1"
         self._pipe = None
         self._pose_detector = None
+        # Keypoints of driving videos (dance catalog clips are reused constantly)
+        self._pose_cache = self.array_cache("pose_keypoints", max_items=16)
     
     def load_model(self):
         """Load MimicMotion model components."""
@@ -44,20 +67,16 @@ class MotionTransferProcessor(BaseProcessor):
             
             # MimicMotion uses SVD with ControlNet for pose guidance
             try:
-                from diffusers import StableVideoDiffusionPipeline
                 from controlnet_aux import DWposeDetector
                 
-                # Load SVD pipeline
-                self._pipe = StableVideoDiffusionPipeline.from_pretrained(
-                    "stabilityai/stable-video-diffusion-img2vid-xt",
-                    torch_dtype=torch.float16,
-                    variant="fp16"
+                # Load SVD pipeline (weights, offload and attention settings shared with ImageToVideo)
+                self._pipe = svd_pipeline(
+                    self,
+                    self.settings.svd_model_id,
+                    snapshot_root(self.settings),
+                    offload=self.device == "cuda" and torch.cuda.is_available()
                 )
                 
-                if self.device == "cuda" and torch.cuda.is_available():
-                    self._pipe.to("cuda")
-                    self._pipe.enable_model_cpu_offload()
-                
                 # Load pose detector
                 self._pose_detector = DWposeDetector()
                 
@@ -74,6 +93,12 @@ class MotionTransferProcessor(BaseProcessor):
             logger.error(f"❌ Lỗi tải model: {e}")
             self._model = "placeholder"
     
+    def unload_model(self):
+        """Unload pipeline and pose detector."""
+        self._pipe = None
+        self._pose_detector = None
+        super().unload_model()
+    
     def _try_load_animatediff(self):
         """Try loading AnimateDiff as an alternative."""
         try:
@@ -103,7 +128,7 @@ class MotionTransferProcessor(BaseProcessor):
             logger.warning(f"⚠️ AnimateDiff không khả dụng: {e}")
             self._model = "placeholder"
     
-    async def process(self, payload: Dict[str, Any]) -> str:
+    async def process(self, payload: Dict[str, Any], inputs: JobInputs) -> str:
         """
         Process a Motion Transfer job.
         
@@ -126,12 +151,6 @@ class MotionTransferProcessor(BaseProcessor):
         logger.info(f"   - Video chuyển động: {skeleton_video_url}")
         logger.info(f"   - Số frame: {num_frames}")
         
-        # Download inputs
-        inputs = await self.download_inputs({
-            "source": source_image_url,
-            "skeleton": skeleton_video_url
-        })
-        
         # Output path
         output_path = os.path.join(self.temp_dir, f"{job_id}_motion.mp4")
         
@@ -140,31 +159,29 @@ class MotionTransferProcessor(BaseProcessor):
             import shutil
             shutil.copy(inputs["skeleton"], output_path)
         elif self._model == "animatediff":
-            await self._process_animatediff(inputs, output_path, num_frames, fps)
+            output_path = await self._process_animatediff(inputs, output_path, num_frames, fps)
         else:
-            await self._process_mimicmotion(inputs, output_path, num_frames, fps)
+            output_path = await self._process_mimicmotion(inputs, output_path, num_frames, fps)
         
         logger.info(f"✅ MotionTransfer hoàn thành: {output_path}")
         return output_path
     
     async def _process_mimicmotion(
         self,
-        inputs: Dict[str, str],
+        inputs: JobInputs,
         output_path: str,
         num_frames: int,
         fps: int
-    ):
-        """Process using MimicMotion-style pipeline."""
-        from diffusers.utils import export_to_video
-        
+    ) -> str:
+        """Process using MimicMotion-style pipeline and return the final output path."""
         logger.info("💃 Processing with MimicMotion variant...")
         
         # Load source image
         source_image = Image.open(inputs["source"]).convert("RGB")
-        source_image = source_image.resize((1024, 576), Image.Resampling.LANCZOS)
+        source_image = source_image.resize(GENERATION_SIZE, Image.Resampling.LANCZOS)
         
         # Extract poses from driving video
-        poses = await self._extract_poses(inputs["skeleton"], num_frames)
+        poses = await self._extract_poses(inputs["skeleton"], num_frames, GENERATION_SIZE)
         
         # Generate frames guided by poses
         # In production, use ControlNet with pose conditioning
@@ -178,19 +195,17 @@ class MotionTransferProcessor(BaseProcessor):
             generator=generator
         ).frames[0]
         
-        # Export to video
-        export_to_video(frames, output_path, fps=fps)
+        # Frames go straight into the final encode
+        return await asyncio.to_thread(self.write_video, frames, output_path, fps)
     
     async def _process_animatediff(
         self,
-        inputs: Dict[str, str],
+        inputs: JobInputs,
         output_path: str,
         num_frames: int,
         fps: int
-    ):
-        """Process using AnimateDiff."""
-        from diffusers.utils import export_to_gif
-        
+    ) -> str:
+        """Process using AnimateDiff and return the final output path."""
         logger.info("💃 Processing with AnimateDiff...")
         
         # Load and describe source image
@@ -210,55 +225,71 @@ class MotionTransferProcessor(BaseProcessor):
         frames = output.frames[0]
         
         # Convert to video
-        self._frames_to_video(frames, output_path, fps)
+        return await asyncio.to_thread(self.write_video, frames, output_path, fps)
     
-    async def _extract_poses(self, video_path: str, num_frames: int) -> List[Any]:
-        """Extract pose keypoints from driving video."""
-        try:
-            import decord
-            from decord import VideoReader
-            
-            vr = VideoReader(video_path)
-            total_frames = len(vr)
-            
-            # Sample frames evenly
-            indices = np.linspace(0, total_frames - 1, num_frames, dtype=int)
-            frames = vr.get_batch(indices).asnumpy()
-            
-            # Extract poses
-            poses = []
-            for frame in frames:
-                frame_pil = Image.fromarray(frame)
-                if self._pose_detector:
-                    pose = self._pose_detector(frame_pil)
-                    poses.append(pose)
-                else:
-                    poses.append(None)
-            
-            return poses
-            
-        except Exception as e:
-            logger.warning(f"⚠️ Pose extraction failed: {e}")
+    async def _extract_poses(self, video_path: str, num_frames: int, size: tuple) -> List[Any]:
+        """
+        Pose maps of num_frames evenly sampled frames of the driving video, rendered at size.
+        
+        Keypoints (not rendered images) are cached per video content, sampling and
+        detector, so a known clip skips decoding and detection entirely.
+        """
+        if self._pose_detector is None:
             return [None] * num_frames
+        if not hasattr(self._pose_detector, "pose_estimation"):
+            # Detector without keypoint access: render through it, uncached
+            return self._detect_pose_images(video_path, num_frames)
+        
+        key = stable_hash(file_sha256(video_path), "linspace", num_frames, POSE_DETECTOR_VERSION, POSE_DETECT_RESOLUTION)
+        poses = self._pose_cache.get(key)
+        if poses is not None:
+            logger.info(f"♻️ Dùng pose keypoints đã cache ({num_frames} frames)")
+        else:
+            try:
+                frames = self._sample_frames(video_path, num_frames)
+                poses = pack_poses([self._detect_keypoints(frame) for frame in frames])
+            except Exception as e:
+                logger.warning(f"⚠️ Pose extraction failed: {e}")
+                return [None] * num_frames
+            self._pose_cache.put(key, poses)
+        
+        return [Image.fromarray(pose_map) for pose_map in render_pose_maps(poses, *size)]
     
-    def _frames_to_video(self, frames: List[Image.Image], output_path: str, fps: int):
-        """Convert PIL frames to video file."""
-        import subprocess
-        import tempfile
+    def _sample_frames(self, video_path: str, num_frames: int) -> np.ndarray:
+        """Decode num_frames evenly spaced frames (RGB)."""
+        from decord import VideoReader
         
-        # Save frames as images
-        frame_pattern = os.path.join(self.temp_dir, "frame_%04d.png")
-        for i, frame in enumerate(frames):
-            frame.save(frame_pattern % i)
+        vr = VideoReader(video_path)
+        total_frames = len(vr)
         
-        # Use ffmpeg to create video
-        cmd = [
-            "ffmpeg", "-y",
-            "-framerate", str(fps),
-            "-i", frame_pattern,
-            "-c:v", "libx264",
-            "-pix_fmt", "yuv420p",
-            output_path
-        ]
+        # Sample frames evenly
+        indices = np.linspace(0, total_frames - 1, num_frames, dtype=int)
+        return vr.get_batch(indices).asnumpy()
+    
+    def _detect_keypoints(self, frame: np.ndarray) -> tuple:
+        """Whole-body keypoints of one RGB frame, normalised to [0, 1]."""
+        import cv2
+        
+        height, width = frame.shape[:2]
+        scale = POSE_DETECT_RESOLUTION / min(height, width)
+        if scale != 1:
+            frame = cv2.resize(
+                frame, None, fx=scale, fy=scale,
+                interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+            )
         
-        subprocess.run(cmd, check=True, capture_output=True)
+        # Wholebody expects BGR, as DWposeDetector.__call__ converts before calling it
+        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        with torch.no_grad():
+            candidate, subset = self._pose_detector.pose_estimation(frame)
+        keypoints = np.asarray(candidate, dtype=np.float32).reshape(-1, 134, 2)
+        keypoints /= np.array([frame.shape[1], frame.shape[0]], dtype=np.float32)
+        return keypoints, np.asarray(subset, dtype=np.float32).reshape(-1, 134)
+    
+    def _detect_pose_images(self, video_path: str, num_frames: int) -> List[Any]:
+        """Pose images straight from the detector (no keypoint cache)."""
+        try:
+            return [self._pose_detector(Image.fromarray(frame)) for frame in self._sample_frames(video_path, num_frames)]
+        except Exception as e:
+            logger.warning(f"⚠️ Pose extraction failed: {e}")
+            return [None] * num_frames
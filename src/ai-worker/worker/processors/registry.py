@@ -0,0 +1,86 @@
+"""
+Processor Registry
+Job types, the MassTransit messages that carry them and the processor classes
+that run them.
+
+Processor modules import torch, diffusers, cv2 or insightface at module level,
+so they are imported on first use instead of at startup: a worker only ever
+pays for the job types it actually receives.
+"""
+
+import importlib
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Type
+
+# Namespace of the backend's job request contracts
+MESSAGE_NAMESPACE = "TroLiKOC.Modules.Jobs.Contracts.Messages"
+MESSAGE_URN_PREFIX = "urn:message:"
+
+
+@dataclass(frozen=True)
+class ProcessorEntry:
+    job_type: str
+    target: str        # "module:Class", imported on first use
+    memory_gb: float   # approximate resident memory of the loaded models, for the preload budget
+
+    @property
+    def message_type(self) -> str:
+        """MassTransit message type (Namespace:Class) of this job's request."""
+        return f"{MESSAGE_NAMESPACE}:{self.job_type}Request"
+
+    def load(self) -> Type:
+        module_name, class_name = self.target.split(":")
+        return getattr(importlib.import_module(module_name), class_name)
+
+
+PROCESSORS: Dict[str, ProcessorEntry] = {
+    entry.job_type: entry
+    for entry in [
+        ProcessorEntry("TalkingHead", "worker.processors.talking_head:TalkingHeadProcessor", 3),
+        ProcessorEntry("VirtualTryOn", "worker.processors.virtual_tryon:VirtualTryOnProcessor", 12),
+        ProcessorEntry("ImageToVideo", "worker.processors.image_to_video:ImageToVideoProcessor", 10),
+        ProcessorEntry("MotionTransfer", "worker.processors.motion_transfer:MotionTransferProcessor", 11),
+        ProcessorEntry("FaceSwap", "worker.processors.face_swap:FaceSwapProcessor", 2),
+    ]
+}
+
+# Message type (with and without the urn:message: prefix) -> job type
+MESSAGE_TYPES: Dict[str, str] = {}
+for _entry in PROCESSORS.values():
+    MESSAGE_TYPES[_entry.message_type] = _entry.job_type
+    MESSAGE_TYPES[MESSAGE_URN_PREFIX + _entry.message_type] = _entry.job_type
+
+
+def processor_entry(job_type: str) -> ProcessorEntry:
+    entry = PROCESSORS.get(job_type)
+    if entry is None:
+        raise ValueError(f"Unknown job type: {job_type}")
+    return entry
+
+
+def processor_class(job_type: str) -> Type:
+    """The processor class of job_type (imports its module on first call)."""
+    return processor_entry(job_type).load()
+
+
+def job_type_for_message(message_type: str) -> Optional[str]:
+    """Job type of one MassTransit message type / routing key, or None."""
+    if not message_type:
+        return None
+    job_type = MESSAGE_TYPES.get(message_type)
+    if job_type is not None:
+        return job_type
+    # Same contract from another namespace, or a bare job type: match on the class name
+    name = message_type.rsplit(":", 1)[-1]
+    if name.endswith("Request"):
+        name = name[:-len("Request")]
+    return name if name in PROCESSORS else None
+
+
+def detect_job_type(message_types: Iterable[str]) -> Optional[str]:
+    """Job type of the first recognised entry of a MassTransit messageType list."""
+    for message_type in message_types:
+        job_type = job_type_for_message(message_type)
+        if job_type is not None:
+            return job_type
+    return None
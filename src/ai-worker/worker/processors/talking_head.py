@@ -22,24 +22,48 @@ import torch
 import numpy as np
 from PIL import Image
 
-from worker.processors.base import BaseProcessor
+from worker.processors.base import BaseProcessor, InputSpec, JobInputs
 from worker.config import Settings
+from worker.hashing import file_sha256, stable_hash
+from worker.media_normalize import IngestLimits
+from worker.memo import MethodMemo
+from worker.postprocess import PostProcessPlan
 from worker.storage import StorageService
+from worker.video_writer import VideoWriterError
 
 logger = logging.getLogger(__name__)
 
+# Source portraits whose preprocessing is kept in memory
+SOURCE_CACHE_ITEMS = 8
+
+# Parts of SadTalker's crop_info: ((width, height), crop box, quad); the last two
+# are None in resize mode
+CROP_INFO_PARTS = ("crop_size", "crop_box", "crop_quad")
+
 
 class TalkingHeadProcessor(BaseProcessor):
     """Processor for Talking Head (LivePortrait) jobs."""
     
+    INPUTS = {
+        "source": InputSpec("sourceImageUrl", "image", require_face=True),
+        "audio": InputSpec("audioUrl", "audio"),
+    }
+    INGEST_LIMITS = IngestLimits(image_max_side=1536)
+    MODEL_VERSION = "LivePortrait/r1"
+    
     def __init__(self, settings: Settings, storage: StorageService):
         super().__init__(settings, storage)
         self.model_name = "LivePortrait"
         self._inference_cfg = None
         self._pipeline = None
+        # Per-source-image state (crop, keypoints, appearance features), reused across jobs
+        self._source_memo = MethodMemo("talking_head_source", max_items=SOURCE_CACHE_ITEMS, copy_result=_shallow_copy)
+        # SadTalker's preprocessed source files (3DMM coefficients + crop), keyed by image content
+        self._sadtalker_cache = self.array_cache("sadtalker_source", max_items=SOURCE_CACHE_ITEMS)
     
     def unload_model(self):
         """Unload pipeline."""
+        self._source_memo.clear()
         self._pipeline = None
         self._inference_cfg = None
         super().unload_model()
@@ -71,6 +95,7 @@ class TalkingHeadProcessor(BaseProcessor):
                 self._pipeline = LivePortraitPipeline(
                     inference_cfg=self._inference_cfg
                 )
+                self._cache_liveportrait_source()
                 
                 self._model = "loaded"
                 logger.info(f"✅ {self.model_name} đã sẵn sàng")
@@ -105,6 +130,7 @@ class TalkingHeadProcessor(BaseProcessor):
                     device=self.device,
                     checkpoint_dir=os.path.join(sadtalker_path, "checkpoints")
                 )
+                self._cache_sadtalker_source()
                 self._model = "sadtalker"
                 logger.info("✅ SadTalker đã sẵn sàng")
             else:
@@ -114,7 +140,84 @@ class TalkingHeadProcessor(BaseProcessor):
             logger.warning(f"⚠️ SadTalker không khả dụng: {e}")
             self._model = "placeholder"
     
-    async def process(self, payload: Dict[str, Any]) -> str:
+    def _cache_liveportrait_source(self):
+        """
+        Memoize the source-image stages of LivePortrait.
+        
+        crop_source_image (face detection + landmarks + crop) and prepare_source are
+        keyed by image content. get_kp_info / extract_feature_3d also run on every
+        driving frame, so only tensors produced by prepare_source are cached there.
+        """
+        cropper = getattr(self._pipeline, "cropper", None)
+        wrapper = getattr(self._pipeline, "live_portrait_wrapper", None)
+        memo = self._source_memo
+        
+        installed = [
+            memo.install(cropper, "crop_source_image"),
+            self._install_prepare_source(wrapper),
+            memo.install(wrapper, "get_kp_info", admit=_is_source_tensor),
+            memo.install(wrapper, "extract_feature_3d", admit=_is_source_tensor),
+        ]
+        if not all(installed):
+            logger.info("ℹ️ LivePortrait thiếu một số hàm tiền xử lý, cache ảnh nguồn chỉ bật một phần")
+    
+    def _install_prepare_source(self, wrapper) -> bool:
+        """Memoize prepare_source and tag its outputs as source tensors."""
+        original = getattr(wrapper, "prepare_source", None)
+        if original is None:
+            return False
+        
+        def tagged(*args, **kwargs):
+            tensor = original(*args, **kwargs)
+            tensor._trolikoc_source = True
+            return tensor
+        
+        wrapper.prepare_source = tagged
+        return self._source_memo.install(wrapper, "prepare_source")
+    
+    def _cache_sadtalker_source(self):
+        """
+        Memoize SadTalker's source preprocessing (crop + 3DMM coefficient extraction).
+        
+        generate() writes its results into a per-run directory, so the produced files
+        are stored as bytes in the array cache (memory + byte-budgeted disk) and
+        written into the directory each new run asks for.
+        """
+        preprocess = getattr(self._pipeline, "preprocess_model", None)
+        original = getattr(preprocess, "generate", None)
+        if original is None:
+            logger.info("ℹ️ SadTalker không có preprocess_model.generate, bỏ qua cache ảnh nguồn")
+            return
+        
+        def generate(input_path, save_dir, *args, **kwargs):
+            key = stable_hash(file_sha256(input_path), args, kwargs)
+            cached = self._sadtalker_cache.get(key)
+            if cached is not None:
+                logger.info("♻️ Dùng tiền xử lý SadTalker đã cache cho ảnh nguồn")
+                os.makedirs(save_dir, exist_ok=True)
+                paths = []
+                for name, data in zip(cached["names"].tolist(), (cached["coeff"], cached["crop_image"])):
+                    target = os.path.join(save_dir, name)
+                    with open(target, "wb") as f:
+                        f.write(data.tobytes())
+                    paths.append(target)
+                return (*paths, _crop_info_from_arrays(cached))
+            
+            coeff_path, crop_path, crop_info = original(input_path, save_dir, *args, **kwargs)
+            if coeff_path is None:
+                return coeff_path, crop_path, crop_info
+            
+            arrays = _crop_info_arrays(crop_info)
+            arrays["names"] = np.array([os.path.basename(coeff_path), os.path.basename(crop_path)])
+            for name, path in (("coeff", coeff_path), ("crop_image", crop_path)):
+                with open(path, "rb") as f:
+                    arrays[name] = np.frombuffer(f.read(), dtype=np.uint8)
+            self._sadtalker_cache.put(key, arrays)
+            return coeff_path, crop_path, crop_info
+        
+        preprocess.generate = generate
+    
+    async def process(self, payload: Dict[str, Any], inputs: JobInputs) -> str:
         """
         Process a Talking Head job.
         
@@ -142,12 +245,6 @@ class TalkingHeadProcessor(BaseProcessor):
         logger.info(f"   - Độ phân giải: {resolution}")
         logger.info(f"   - Expression scale: {expression_scale}")
         
-        # Download inputs
-        inputs = await self.download_inputs({
-            "source": source_image_url,
-            "audio": audio_url
-        })
-        
         # Output path
         output_path = os.path.join(self.temp_dir, f"{job_id}_output.mp4")
         
@@ -159,20 +256,18 @@ class TalkingHeadProcessor(BaseProcessor):
         else:
             await self._process_liveportrait(inputs, output_path, resolution, expression_scale)
         
-        # Add watermark if required
-        if add_watermark and self._model != "placeholder":
-            output_path = await self._add_watermark(output_path)
-        
-        # Enhance face if requested
-        if enhance_face and self._model != "placeholder":
-            output_path = await self._enhance_face(output_path)
+        if self._model != "placeholder":
+            # Enhancement works on frames, before the single post-processing encode
+            if enhance_face:
+                output_path = await self._enhance_face(output_path)
+            output_path = await self._postprocess(output_path, add_watermark)
         
         logger.info(f"✅ TalkingHead hoàn thành: {output_path}")
         return output_path
     
     async def _process_liveportrait(
         self,
-        inputs: Dict[str, str],
+        inputs: JobInputs,
         output_path: str,
         resolution: str,
         expression_scale: float
@@ -183,7 +278,8 @@ class TalkingHeadProcessor(BaseProcessor):
         
         logger.info("🎭 Generating with LivePortrait...")
         
-        # Run inference
+        # Run inference (source crop/keypoints/features come from the memo when known)
+        hits = self._source_memo.hits
         self._pipeline.execute(
             source_image_path=inputs["source"],
             driving_audio_path=inputs["audio"],
@@ -193,10 +289,12 @@ class TalkingHeadProcessor(BaseProcessor):
             flag_do_crop=True,
             flag_pasteback=True,
         )
+        if self._source_memo.hits > hits:
+            logger.info(f"♻️ Dùng lại tiền xử lý ảnh nguồn ({self._source_memo.hits - hits} bước đã cache)")
     
     async def _process_sadtalker(
         self,
-        inputs: Dict[str, str],
+        inputs: JobInputs,
         output_path: str,
         resolution: str,
         expression_scale: float
@@ -223,7 +321,7 @@ class TalkingHeadProcessor(BaseProcessor):
     
     async def _create_placeholder_video(
         self,
-        inputs: Dict[str, str],
+        inputs: JobInputs,
         output_path: str,
         resolution: str
     ):
@@ -253,24 +351,20 @@ class TalkingHeadProcessor(BaseProcessor):
             logger.error(f"FFmpeg error: {e.stderr.decode()}")
             raise
     
-    async def _add_watermark(self, video_path: str) -> str:
-        """Add a watermark to the video."""
-        # Create watermark text
-        watermark_path = video_path.replace(".mp4", "_watermarked.mp4")
-        
-        cmd = [
-            "ffmpeg", "-y",
-            "-i", video_path,
-            "-vf", "drawtext=text='Trợ Lý KOC':fontsize=24:fontcolor=white@0.5:x=w-tw-10:y=h-th-10",
-            "-c:a", "copy",
-            watermark_path
-        ]
+    async def _postprocess(self, video_path: str, add_watermark: bool) -> str:
+        """Watermark (and mux the generated audio) in one ffmpeg run."""
+        plan = PostProcessPlan().audio()
+        if add_watermark:
+            plan.watermark()
+        if not plan.has_video_steps:
+            return video_path
         
+        root, ext = os.path.splitext(video_path)
         try:
-            subprocess.run(cmd, check=True, capture_output=True)
-            return watermark_path
-        except subprocess.CalledProcessError:
-            # If watermarking fails, return original
+            return await self.postprocess(plan, video_path, f"{root}_final{ext}")
+        except VideoWriterError as e:
+            # If post-processing fails, return original
+            logger.error(f"FFmpeg post-processing failed: {e}")
             return video_path
     
     async def _enhance_face(self, video_path: str) -> str:
@@ -279,3 +373,20 @@ class TalkingHeadProcessor(BaseProcessor):
         # For now, return the original video
         logger.info("⚠️ Face enhancement not implemented yet")
         return video_path
+
+
+def _is_source_tensor(tensor, *args, **kwargs) -> bool:
+    return getattr(tensor, "_trolikoc_source", False)
+
+
+def _shallow_copy(result: Any) -> Any:
+    """Cached dicts (crop info, keypoint info) are copied so callers can add keys."""
+    return dict(result) if isinstance(result, dict) else result
+
+
+def _crop_info_arrays(crop_info) -> Dict[str, np.ndarray]:
+    return {name: np.asarray(part) for name, part in zip(CROP_INFO_PARTS, crop_info) if part is not None}
+
+
+def _crop_info_from_arrays(arrays: Dict[str, np.ndarray]) -> tuple:
+    return tuple(tuple(arrays[name].tolist()) if name in arrays else None for name in CROP_INFO_PARTS)
@@ -14,6 +14,7 @@ Requirements:
 - segment-anything (for segmentation)
 """
 
+import inspect
 import logging
 import os
 from typing import Dict, Any, Optional, Tuple
@@ -22,22 +23,45 @@ import torch
 import numpy as np
 from PIL import Image
 
-from worker.processors.base import BaseProcessor
+from worker.processors.base import BaseProcessor, InputSpec, JobInputs
 from worker.config import Settings
+from worker.hashing import file_sha256, stable_hash
+from worker.media_normalize import IngestLimits
+from worker.model_snapshots import pretrained_source, snapshot_root
 from worker.storage import StorageService
 
 logger = logging.getLogger(__name__)
 
+# Working sizes of the two pipelines (part of every preprocessing cache key)
+IDM_VTON_SIZE = (768, 1024)
+INPAINT_SIZE = (512, 768)
+INPAINT_MODEL_ID = "runwayml/stable-diffusion-inpainting"
+IDM_VTON_MODEL_ID = "yisol/IDM-VTON"
+
+# Bump when mask generation changes (e.g. a human parser replaces the heuristics)
+MASK_VERSION = "rect/r1"
+
 
 class VirtualTryOnProcessor(BaseProcessor):
     """Processor for Virtual Try-On (IDM-VTON) jobs."""
     
+    INPUTS = {
+        "model": InputSpec("modelImageUrl", "image"),
+        "garment": InputSpec("garmentImageUrl", "image"),
+    }
+    INGEST_LIMITS = IngestLimits(image_max_side=2048)
+    MODEL_VERSION = "yisol/IDM-VTON/r1"
+    # Sampling is unseeded, identical requests legitimately differ: never reuse results
+    RESULT_VARIANT = None
+    
     def __init__(self, settings: Settings, storage: StorageService):
         super().__init__(settings, storage)
         self.model_name = "IDM-VTON"
         self._pipe = None
         self._pose_estimator = None
         self._human_parser = None
+        # Resized images, masks and VAE latents, keyed by image content
+        self._prep_cache = self.array_cache("tryon_prep")
     
     def load_model(self):
         """Load IDM-VTON model components."""
@@ -51,10 +75,11 @@ class VirtualTryOnProcessor(BaseProcessor):
                 
                 # Load the IDM-VTON pipeline from HuggingFace
                 # Note: The actual model might be hosted differently
+                source, source_kwargs = pretrained_source(snapshot_root(self.settings), IDM_VTON_MODEL_ID, variant="fp16")
                 self._pipe = AutoPipelineForInpainting.from_pretrained(
-                    "yisol/IDM-VTON",
+                    source,
                     torch_dtype=torch.float16,
-                    variant="fp16"
+                    **source_kwargs
                 ).to(self.device if torch.cuda.is_available() else "cpu")
                 
                 # Enable memory optimizations
@@ -82,9 +107,11 @@ class VirtualTryOnProcessor(BaseProcessor):
             from diffusers import StableDiffusionInpaintPipeline
             
             # OOTDiffusion or similar SD-based try-on
+            source, source_kwargs = pretrained_source(snapshot_root(self.settings), INPAINT_MODEL_ID)
             self._pipe = StableDiffusionInpaintPipeline.from_pretrained(
-                "runwayml/stable-diffusion-inpainting",
-                torch_dtype=torch.float16
+                source,
+                torch_dtype=torch.float16,
+                **source_kwargs
             ).to(self.device if torch.cuda.is_available() else "cpu")
             
             self._model = "ootd_fallback"
@@ -94,7 +121,7 @@ class VirtualTryOnProcessor(BaseProcessor):
             logger.warning(f"⚠️ Fallback cũng không khả dụng: {e}")
             self._model = "placeholder"
     
-    async def process(self, payload: Dict[str, Any]) -> str:
+    async def process(self, payload: Dict[str, Any], inputs: JobInputs) -> str:
         """
         Process a Virtual Try-On job.
         
@@ -119,12 +146,6 @@ class VirtualTryOnProcessor(BaseProcessor):
         logger.info(f"   - Ảnh quần áo: {garment_image_url}")
         logger.info(f"   - Loại: {garment_category}")
         
-        # Download inputs
-        inputs = await self.download_inputs({
-            "model": model_image_url,
-            "garment": garment_image_url
-        })
-        
         # Output path
         output_path = os.path.join(self.temp_dir, f"{job_id}_tryon.png")
         
@@ -142,24 +163,20 @@ class VirtualTryOnProcessor(BaseProcessor):
     
     async def _process_idm_vton(
         self,
-        inputs: Dict[str, str],
+        inputs: JobInputs,
         output_path: str,
         garment_category: str
     ):
         """Process using IDM-VTON pipeline."""
         logger.info("🎭 Processing with IDM-VTON...")
         
-        # Load images
-        model_image = Image.open(inputs["model"]).convert("RGB")
-        garment_image = Image.open(inputs["garment"]).convert("RGB")
-        
-        # Resize to model's expected size
-        target_size = (768, 1024)  # IDM-VTON default
-        model_image = model_image.resize(target_size, Image.Resampling.LANCZOS)
-        garment_image = garment_image.resize(target_size, Image.Resampling.LANCZOS)
+        # Load images resized to the model's expected size (cached per image)
+        model_hash = file_sha256(inputs["model"])
+        model_image = self._load_resized(inputs["model"], model_hash, IDM_VTON_SIZE)
+        garment_image = self._load_resized(inputs["garment"], file_sha256(inputs["garment"]), IDM_VTON_SIZE)
         
         # Create mask for garment area
-        mask = self._create_garment_mask(model_image, garment_category)
+        mask = self._garment_mask(model_image, model_hash, garment_category)
         
         # Run inference
         result = self._pipe(
@@ -175,38 +192,87 @@ class VirtualTryOnProcessor(BaseProcessor):
     
     async def _process_with_inpainting(
         self,
-        inputs: Dict[str, str],
+        inputs: JobInputs,
         output_path: str,
         garment_category: str
     ):
         """Process using SD inpainting as fallback."""
         logger.info("🎭 Processing with SD Inpainting (fallback)...")
         
-        # Load images
-        model_image = Image.open(inputs["model"]).convert("RGB")
-        garment_image = Image.open(inputs["garment"]).convert("RGB")
-        
-        # Resize
-        target_size = (512, 768)
-        model_image = model_image.resize(target_size, Image.Resampling.LANCZOS)
-        garment_image = garment_image.resize(target_size, Image.Resampling.LANCZOS)
+        # Load images (cached per image)
+        model_hash = file_sha256(inputs["model"])
+        model_image = self._load_resized(inputs["model"], model_hash, INPAINT_SIZE)
+        garment_image = self._load_resized(inputs["garment"], file_sha256(inputs["garment"]), INPAINT_SIZE)
         
         # Create simple mask for upper body
-        mask = self._create_simple_mask(model_image.size, garment_category)
+        mask = self._garment_mask(model_image, model_hash, garment_category)
         
         # Inpaint with garment description
         prompt = f"person wearing {self._describe_garment(garment_image)}, high quality photo"
         
+        extra_args = {}
+        if "masked_image_latents" in inspect.signature(self._pipe.__call__).parameters:
+            # Same person + category: the masked person's VAE encoding is reused
+            extra_args["masked_image_latents"] = self._masked_image_latents(
+                model_image, mask, stable_hash(model_hash, INPAINT_MODEL_ID, INPAINT_SIZE, garment_category, MASK_VERSION)
+            )
+        
         result = self._pipe(
             prompt=prompt,
             image=model_image,
             mask_image=mask,
             num_inference_steps=25,
-            guidance_scale=7.5
+            guidance_scale=7.5,
+            **extra_args
         ).images[0]
         
         result.save(output_path)
     
+    def _load_resized(self, path: str, content_hash: str, size: Tuple[int, int]) -> Image.Image:
+        """Decode and LANCZOS-resize an input, reusing the result for the same image content."""
+        key = stable_hash(content_hash, size, "lanczos")
+        cached = self._prep_cache.get(key)
+        if cached is not None:
+            return Image.fromarray(cached["rgb"])
+        
+        image = Image.open(path).convert("RGB").resize(size, Image.Resampling.LANCZOS)
+        self._prep_cache.put(key, {"rgb": np.asarray(image)})
+        return image
+    
+    def _garment_mask(self, image: Image.Image, content_hash: str, category: str) -> Image.Image:
+        """Garment-area mask of a person image, cached per person and category."""
+        key = stable_hash(content_hash, image.size, category, MASK_VERSION)
+        cached = self._prep_cache.get(key)
+        if cached is not None:
+            return Image.fromarray(cached["mask"])
+        
+        mask = self._create_garment_mask(image, category)
+        self._prep_cache.put(key, {"mask": np.asarray(mask)})
+        return mask
+    
+    def _masked_image_latents(self, image: Image.Image, mask: Image.Image, key: str) -> torch.Tensor:
+        """
+        VAE latents of the person with the garment area blanked, as the inpainting
+        UNet expects them. Uses the latent mean so the result is reusable.
+        """
+        device = self._pipe.vae.device
+        dtype = self._pipe.vae.dtype
+        
+        cached = self._prep_cache.get(key)
+        if cached is not None:
+            logger.info("♻️ Dùng VAE latents đã cache cho ảnh người mẫu")
+            return torch.from_numpy(cached["latents"]).to(device=device, dtype=dtype)
+        
+        image_tensor = self._pipe.image_processor.preprocess(image)
+        mask_tensor = self._pipe.mask_processor.preprocess(mask)
+        masked_image = (image_tensor * (mask_tensor < 0.5)).to(device=device, dtype=dtype)
+        with torch.no_grad():
+            latents = self._pipe.vae.encode(masked_image).latent_dist.mode()
+        latents = latents * self._pipe.vae.config.scaling_factor
+        
+        self._prep_cache.put(key, {"latents": latents.cpu().numpy()})
+        return latents
+    
     def _create_garment_mask(self, image: Image.Image, category: str) -> Image.Image:
         """Create a mask for the garment area using segmentation."""
         # In production, use a human parser model
@@ -239,7 +305,7 @@ class VirtualTryOnProcessor(BaseProcessor):
         # For now, return generic description
         return "stylish clothing, fashion item"
     
-    async def _create_placeholder(self, inputs: Dict[str, str], output_path: str):
+    async def _create_placeholder(self, inputs: JobInputs, output_path: str):
         """Create a placeholder by simple blending."""
         model_image = Image.open(inputs["model"]).convert("RGB")
         garment_image = Image.open(inputs["garment"]).convert("RGB")
@@ -0,0 +1,124 @@
+"""
+Result Cache
+Returns the existing output for a request identical to one already completed.
+
+Every primary generation path is deterministic (fixed seeds, deterministic face
+swap), so identical input content plus identical parameters on the same model
+version yields the same output. Entries live in the shared artifact cache and only
+point at the output object already in storage; nothing is copied.
+"""
+
+import logging
+from typing import Any, Dict, Optional
+
+from worker.artifact_cache import ArtifactCache
+from worker.config import Settings
+from worker.hashing import stable_hash
+from worker.processors.base import BaseProcessor, JobInputs
+from worker.storage import StorageService
+
+logger = logging.getLogger(__name__)
+
+RESULT_KIND = "result"
+
+# Payload fields that identify a job, not what it computes
+VOLATILE_FIELDS = {
+    "jobid",
+    "userid",
+    "priority",
+    "createdat",
+    "requestedat",
+    "correlationid",
+    "callbackurl",
+}
+
+
+def normalize_params(payload: Dict[str, Any], url_fields: set) -> Dict[str, Any]:
+    """
+    Canonical view of the parameters that influence the output.
+
+    Keys are case-folded (MassTransit sends camelCase, older clients PascalCase),
+    input URLs are dropped (inputs are keyed by content hash instead), nulls are
+    dropped and numbers are compared by value ("25" == 25 == 25.0).
+    """
+    params = {}
+    for key, value in payload.items():
+        folded = key.lower()
+        if folded in VOLATILE_FIELDS or folded in url_fields or value is None:
+            continue
+        params[folded] = _normalize_value(value)
+    return params
+
+
+def _normalize_value(value: Any) -> Any:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return value.strip()
+    return value
+
+
+class ResultCache:
+    """Request-level output cache on top of the artifact cache."""
+
+    def __init__(self, storage: StorageService, settings: Settings):
+        self.storage = storage
+        self.artifacts: ArtifactCache = storage.artifacts
+        self.settings = settings
+        self.enabled = settings.result_cache_enabled and self.artifacts.enabled
+
+    def key_for(self, job_type: str, processor: BaseProcessor, payload: Dict[str, Any], inputs: JobInputs) -> str:
+        """Cache key: processor, model version, input contents, parameters and output settings."""
+        url_fields = {spec.url_field.lower() for spec in processor.INPUTS.values()}
+        return stable_hash(
+            job_type,
+            type(processor).__name__,
+            processor.MODEL_VERSION,
+            inputs.hashes,
+            normalize_params(payload, url_fields),
+            # Ingest normalisation and delivery format also shape the output
+            self.settings.normalize_inputs,
+            repr(processor.INGEST_LIMITS),
+            self.settings.output_mode,
+        )
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Output URL of an identical completed request, if it is still in storage."""
+        if not self.enabled:
+            return None
+        entry = self.artifacts.lookup(RESULT_KIND, key)
+        if entry is None:
+            return None
+
+        object_name = entry.metadata.get("object_name")
+        try:
+            if object_name and not self.storage.backend.exists(object_name):
+                logger.info(f"🗑️ Output của result cache đã bị xoá: {object_name}")
+                self.artifacts.invalidate(RESULT_KIND, key)
+                return None
+        except Exception as e:
+            logger.warning(f"⚠️ Không kiểm tra được output cache: {e}")
+            return None
+
+        logger.info(f"♻️ Result cache hit (job gốc {entry.metadata.get('job_id')})")
+        return entry.metadata.get("output_url")
+
+    def store(self, key: str, job_id: str, output_url: str):
+        """Remember the output of a completed request."""
+        if not self.enabled:
+            return
+        self.artifacts.publish(
+            RESULT_KIND,
+            key,
+            metadata={
+                "job_id": str(job_id),
+                "output_url": output_url,
+                "object_name": self.storage.object_name_for_url(output_url),
+            },
+            ttl_seconds=self.settings.result_cache_ttl_hours * 3600
+        )
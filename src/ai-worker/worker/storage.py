@@ -1,83 +1,50 @@
 """
 Storage Service
-Handles file uploads to MinIO object storage.
+Handles input downloads and output uploads through the configured storage backend
+(MinIO object storage or a local/shared-volume directory).
 """
 
 import logging
 import os
-import uuid
 from datetime import datetime
-from minio import Minio
-from minio.error import S3Error
+from typing import Optional
 
+from worker.artifact_cache import ArtifactCache
+from worker.backends import StorageBackend, create_backend
 from worker.config import Settings
 
 logger = logging.getLogger(__name__)
 
 
 class StorageService:
-    """Handles file storage operations with MinIO."""
+    """Handles file storage operations through a pluggable backend."""
     
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, backend: Optional[StorageBackend] = None):
         self.settings = settings
-        self.client = Minio(
-            settings.minio_endpoint,
-            access_key=settings.minio_access_key,
-            secret_key=settings.minio_secret_key,
-            secure=settings.minio_secure
-        )
-        self.bucket = settings.minio_bucket
+        self.backend = backend or create_backend(settings)
         
-        # Ensure bucket exists
-        self._ensure_bucket_exists()
+        # Cluster-wide cache of intermediates/results, in the same backend
+        self.artifacts = ArtifactCache(self.backend, settings)
     
-    def _ensure_bucket_exists(self):
-        """Create the bucket if it doesn't exist."""
-        try:
-            if not self.client.bucket_exists(self.bucket):
-                self.client.make_bucket(self.bucket)
-                logger.info(f"📦 Đã tạo bucket: {self.bucket}")
-        except S3Error as e:
-            logger.error(f"Lỗi tạo bucket: {e}")
+    def ensure_ready(self):
+        """Prepare the backend (bucket / root directory) ahead of the first write."""
+        self.backend.ensure_ready()
     
     async def download_input(self, url: str, local_path: str) -> str:
         """
         Download input file from URL to local path.
-        Supports both MinIO URLs and external URLs.
+        Supports both storage backend URLs and external URLs.
         """
         import aiohttp
         import aiofiles
         
-        # Try to detect if it's an internal MinIO URL that requires authentication
-        is_internal_minio = False
-        minio_bucket = None
-        minio_object = None
-        
+        # Internal URLs go through the backend (authenticated SDK / hard link)
         try:
-            from urllib.parse import urlparse, unquote
-            parsed = urlparse(url)
-            
-            # Check if host matches MinIO endpoint (e.g. minio:9000)
-            if self.settings.minio_endpoint in parsed.netloc:
-                # Path usually starts with /bucket/object/key...
-                path_parts = parsed.path.strip("/").split("/", 1)
-                if len(path_parts) == 2:
-                    minio_bucket = path_parts[0]
-                    minio_object = unquote(path_parts[1])
-                    is_internal_minio = True
-                    logger.info(f"🔍 Detected internal MinIO URL: bucket={minio_bucket}, object={minio_object}")
-        except Exception as e:
-            logger.warning(f"⚠️ Failed to parse URL for MinIO detection: {e}")
-
-        if is_internal_minio:
-            try:
-                # Use MinIO SDK (authenticated)
-                self.client.fget_object(minio_bucket, minio_object, local_path)
-                logger.info(f"📥 Đã tải xuống (via SDK): {url}")
+            if self.backend.download_url(url, local_path):
+                logger.info(f"📥 Đã tải xuống (via {self.backend.name}): {url}")
                 return local_path
-            except Exception as e:
-                logger.warning(f"⚠️ SDK download failed, falling back to HTTP: {e}")
-                # Fallback to HTTP if SDK fails
+        except Exception as e:
+            logger.warning(f"⚠️ {self.backend.name} download failed, falling back to HTTP: {e}")
         
         # Download from URL (works for both external, internal, and public URLs via HTTP)
         async with aiohttp.ClientSession() as session:
@@ -100,7 +67,7 @@ class StorageService:
     
     async def upload_output(self, job_id: str, job_type: str, local_path: str) -> str:
         """
-        Upload output file to MinIO and return the URL.
+        Upload output file to storage and return the URL.
         
         Args:
             job_id: Job ID for organizing outputs
@@ -110,27 +77,44 @@ class StorageService:
         Returns:
             Public URL to the uploaded file
         """
-        # Generate object name
         ext = os.path.splitext(local_path)[1]
-        date_path = datetime.now().strftime("%Y/%m/%d")
-        object_name = f"outputs/{job_type.lower()}/{date_path}/{job_id}{ext}"
+        object_name = f"{self.output_prefix(job_id, job_type)}{ext}"
+        url = self.upload_file(object_name, local_path, move=True)
         
-        # Determine content type
-        content_type = self._get_content_type(ext)
+        logger.info(f"📤 Đã upload: {object_name}")
+        return url
+    
+    def output_prefix(self, job_id: str, job_type: str) -> str:
+        """Object name prefix (without extension) for a job's output."""
+        date_path = datetime.now().strftime("%Y/%m/%d")
+        return f"outputs/{job_type.lower()}/{date_path}/{job_id}"
+    
+    def upload_file(self, object_name: str, local_path: str, move: bool = False) -> str:
+        """
+        Upload a local file under the given object name and return its URL.
         
-        # Upload to MinIO
-        self.client.fput_object(
-            self.bucket,
+        With move=True the caller hands the file over (it is about to be cleaned up),
+        which lets the filesystem backend rename instead of link or copy.
+        """
+        ext = os.path.splitext(local_path)[1]
+        self.backend.put_file(
             object_name,
             local_path,
-            content_type=content_type
+            content_type=self._get_content_type(ext),
+            move=move
         )
-        
-        # Generate URL
-        url = f"http://{self.settings.minio_endpoint}/{self.bucket}/{object_name}"
-        
-        logger.info(f"📤 Đã upload: {object_name}")
-        return url
+        return self.object_url(object_name)
+    
+    def object_url(self, object_name: str) -> str:
+        """Build the URL the backend uses to reach an object."""
+        return self.backend.url_for(object_name)
+    
+    def object_name_for_url(self, url: str) -> Optional[str]:
+        """Inverse of object_url for URLs this service produced."""
+        prefix = self.backend.url_for("")
+        if url.startswith(prefix):
+            return url[len(prefix):]
+        return None
     
     def _get_content_type(self, ext: str) -> str:
         """Get content type based on file extension."""
@@ -141,5 +125,8 @@ class StorageService:
             ".jpg": "image/jpeg",
             ".jpeg": "image/jpeg",
             ".gif": "image/gif",
+            ".m3u8": "application/vnd.apple.mpegurl",
+            ".m4s": "video/iso.segment",
+            ".ts": "video/mp2t",
         }
         return content_types.get(ext.lower(), "application/octet-stream")
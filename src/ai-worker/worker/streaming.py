@@ -0,0 +1,170 @@
+"""
+Streaming Output Upload
+Uploads HLS (fragmented MP4) segments to object storage while ffmpeg is still encoding.
+
+The final ffmpeg pass of a job writes an EVENT playlist plus fMP4 segments into a
+local directory. A background thread watches the playlist and uploads every segment
+as soon as ffmpeg lists it (ffmpeg only lists a segment once it is complete), then
+re-uploads the playlist so players can start before the job has finished.
+"""
+
+import logging
+import os
+import re
+import threading
+from typing import List, Optional, Set
+
+from worker.storage import StorageService
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_NAME = "index.m3u8"
+PLAYLIST_CONTENT_TYPE = "application/vnd.apple.mpegurl"
+INIT_SEGMENT_NAME = "init.mp4"
+
+_MAP_URI_PATTERN = re.compile(r'#EXT-X-MAP:URI="([^"]+)"')
+
+
+class HlsStreamUploader:
+    """Uploads an HLS output progressively while it is being encoded."""
+
+    def __init__(
+        self,
+        storage: StorageService,
+        job_id: str,
+        job_type: str,
+        work_dir: str,
+        segment_seconds: int = 2,
+        poll_interval: float = 0.25
+    ):
+        self.storage = storage
+        self.job_id = job_id
+        self.segment_seconds = segment_seconds
+        self.poll_interval = poll_interval
+
+        self.local_dir = os.path.join(work_dir, f"{job_id}_hls")
+        self.object_prefix = storage.output_prefix(job_id, job_type)
+
+        self._uploaded: Set[str] = set()
+        self._playlist_mtime: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[Exception] = None
+
+    @property
+    def playlist_path(self) -> str:
+        """Local path of the playlist ffmpeg writes."""
+        return os.path.join(self.local_dir, PLAYLIST_NAME)
+
+    @property
+    def playlist_url(self) -> str:
+        """URL of the playlist once it has been uploaded."""
+        return self.storage.object_url(f"{self.object_prefix}/{PLAYLIST_NAME}")
+
+    def ffmpeg_output_args(self) -> List[str]:
+        """
+        ffmpeg output arguments that replace the plain output file.
+
+        Keyframes are forced on segment boundaries so every segment is independently
+        decodable and cut at a predictable duration.
+        """
+        return [
+            "-force_key_frames", f"expr:gte(t,n_forced*{self.segment_seconds})",
+            "-f", "hls",
+            "-hls_time", str(self.segment_seconds),
+            "-hls_playlist_type", "event",
+            "-hls_segment_type", "fmp4",
+            "-hls_fmp4_init_filename", INIT_SEGMENT_NAME,
+            "-hls_flags", "independent_segments+temp_file",
+            "-hls_segment_filename", os.path.join(self.local_dir, "seg_%05d.m4s"),
+            self.playlist_path,
+        ]
+
+    def start(self):
+        """Start the background upload thread."""
+        os.makedirs(self.local_dir, exist_ok=True)
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"hls-upload-{self.job_id}",
+            daemon=True
+        )
+        self._thread.start()
+        logger.info(f"📡 Streaming upload bật cho job {self.job_id}: {self.playlist_url}")
+
+    def finish(self) -> str:
+        """
+        Stop watching, upload anything left and return the playlist URL.
+
+        Raises if the output was never produced or an upload failed.
+        """
+        self._stop_thread()
+        if self._error:
+            raise self._error
+        if not os.path.exists(self.playlist_path):
+            raise FileNotFoundError(f"HLS playlist was not produced: {self.playlist_path}")
+
+        # Final sweep picks up the last segment and the ENDLIST playlist
+        self._playlist_mtime = None
+        self._sync()
+        logger.info(f"📤 Đã upload HLS: {len(self._uploaded)} segments")
+        return self.playlist_url
+
+    def cancel(self):
+        """Stop watching without a final sweep (job failed or did not stream)."""
+        self._stop_thread()
+
+    def _stop_thread(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self._sync()
+            except Exception as e:
+                logger.error(f"❌ Lỗi upload segment: {e}")
+                self._error = e
+                return
+
+    def _sync(self):
+        """Upload newly completed segments, then the playlist that references them."""
+        try:
+            mtime = os.path.getmtime(self.playlist_path)
+        except FileNotFoundError:
+            return
+        if mtime == self._playlist_mtime:
+            return
+
+        with open(self.playlist_path, "r", encoding="utf-8") as f:
+            playlist = f.read()
+
+        for name in self._referenced_files(playlist):
+            if name in self._uploaded:
+                continue
+            self.storage.upload_file(
+                f"{self.object_prefix}/{name}",
+                os.path.join(self.local_dir, name)
+            )
+            self._uploaded.add(name)
+
+        # Upload the snapshot we parsed, never a newer one listing segments not yet uploaded.
+        # Published from memory: a local snapshot file would be hard-linked into a
+        # filesystem backend and rewriting it would truncate the published playlist.
+        self.storage.backend.put_bytes(
+            f"{self.object_prefix}/{PLAYLIST_NAME}",
+            playlist.encode("utf-8"),
+            PLAYLIST_CONTENT_TYPE
+        )
+        self._playlist_mtime = mtime
+
+    @staticmethod
+    def _referenced_files(playlist: str) -> List[str]:
+        """Init segment and media segments listed in a playlist, in order."""
+        names = _MAP_URI_PATTERN.findall(playlist)
+        for line in playlist.splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                names.append(line)
+        return names
@@ -0,0 +1,95 @@
+"""
+Video Segments
+Lossless split of a video at keyframes and concatenation of processed segments.
+
+split_at_keyframes() stream-copies the video track into segments; the segment
+muxer can only cut a copied stream on a keyframe, so every segment starts with
+one and decodes independently. Processed segments (all encoded with the same
+settings) are joined with the concat demuxer without re-encoding, the original
+audio muxed in the same run.
+"""
+
+import glob
+import logging
+import os
+import subprocess
+from typing import List, Optional
+
+from worker.postprocess import PostProcessPlan
+from worker.video_writer import STDERR_TAIL_LINES, VideoWriterError
+
+logger = logging.getLogger(__name__)
+
+
+def split_at_keyframes(video_path: str, out_dir: str, segment_seconds: float) -> List[str]:
+    """
+    Video track of video_path as segments of at least segment_seconds (cut at the next keyframe).
+
+    Segments are Matroska: no edit lists, so a decoder sees exactly the copied frames.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    _run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-i", video_path,
+        "-map", "0:v:0", "-c", "copy",
+        "-f", "segment",
+        "-segment_time", f"{segment_seconds:.3f}",
+        "-reset_timestamps", "1",
+        os.path.join(out_dir, "src_%04d.mkv"),
+    ])
+    return sorted(glob.glob(os.path.join(out_dir, "src_*.mkv")))
+
+
+def count_frames(path: str) -> int:
+    """Video frames of a file, counted from packets (no decode)."""
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-select_streams", "v:0",
+            "-count_packets",
+            "-show_entries", "stream=nb_read_packets",
+            "-of", "csv=p=0",
+            path,
+        ],
+        capture_output=True,
+        text=True
+    )
+    try:
+        return int(result.stdout.strip().split(",")[0])
+    except ValueError:
+        raise VideoWriterError(f"ffprobe could not count frames of {path}: {result.stderr.strip()}")
+
+
+def concat_segments(
+    segment_paths: List[str],
+    output_args: List[str],
+    plan: Optional[PostProcessPlan] = None,
+    path: Optional[str] = None
+) -> str:
+    """
+    Join encoded segments without re-encoding.
+
+    Args:
+        segment_paths: segments in order, all with identical encoder settings
+        output_args: ffmpeg output arguments
+        plan: audio mux / format of the joined output (its video is always stream-copied)
+        path: what the output is called once written (defaults to the last output argument)
+    """
+    plan = (plan or PostProcessPlan()).copy_video()
+    list_path = os.path.join(os.path.dirname(segment_paths[0]), "segments.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for segment in segment_paths:
+            escaped = os.path.abspath(segment).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    _run(plan.command(["-f", "concat", "-safe", "0", "-i", list_path], output_args))
+    path = path or output_args[-1]
+    logger.info(f"🧩 Đã ghép {len(segment_paths)} segments -> {path}")
+    return path
+
+
+def _run(cmd: List[str]):
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        tail = result.stderr.decode("utf-8", errors="replace").strip().splitlines()[-STDERR_TAIL_LINES:]
+        raise VideoWriterError(f"ffmpeg failed ({result.returncode}): {' | '.join(tail) or 'no output'}")
@@ -0,0 +1,169 @@
+"""
+Video Writer
+Encodes frames by piping them raw into a single ffmpeg process.
+
+The post-processing plan (interpolation, watermark, audio mux...) is applied in
+that same process, so an output is encoded exactly once and no intermediate
+images or videos are written. The ffmpeg process starts on the first frame,
+which also fixes the frame size.
+
+transcode() applies a plan to an already generated file, for models that write
+their own video.
+"""
+
+import collections
+import logging
+import subprocess
+import threading
+from typing import Deque, List, Optional
+
+from worker.postprocess import PostProcessPlan
+
+logger = logging.getLogger(__name__)
+
+# Lines of ffmpeg's stderr kept for error messages
+STDERR_TAIL_LINES = 20
+
+
+class VideoWriterError(RuntimeError):
+    """ffmpeg failed while encoding."""
+
+
+class VideoWriter:
+    """
+    Streams frames into ffmpeg.
+
+    Use as a context manager: a clean exit finishes the encode (and raises
+    VideoWriterError if ffmpeg failed), an exception kills ffmpeg.
+    """
+
+    def __init__(
+        self,
+        output_args: List[str],
+        fps: float,
+        path: Optional[str] = None,
+        pixel_format: str = "rgb24",
+        plan: Optional[PostProcessPlan] = None
+    ):
+        """
+        Args:
+            output_args: ffmpeg output arguments (a path, or HLS muxer arguments)
+            fps: frame rate of the frames written
+            path: what the output is called once written (defaults to the last output argument)
+            pixel_format: layout of the written frames (rgb24 for PIL/diffusers, bgr24 for OpenCV)
+            plan: post-processing applied in the same pass (plain encode if None)
+        """
+        self.output_args = output_args
+        self.fps = fps
+        self.path = path or output_args[-1]
+        self.pixel_format = pixel_format
+        self.plan = plan or PostProcessPlan()
+        self.frame_count = 0
+        self._process: Optional[subprocess.Popen] = None
+        self._stderr: Deque[str] = collections.deque(maxlen=STDERR_TAIL_LINES)
+        self._stderr_thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "VideoWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, frame):
+        """Append one frame (HxWx3 uint8 array in pixel_format, or a PIL image)."""
+        import numpy as np
+
+        if not isinstance(frame, np.ndarray):
+            frame = np.asarray(frame.convert("RGB"))
+        if self._process is None:
+            self._start(frame.shape[1], frame.shape[0])
+        try:
+            self._process.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+        except (BrokenPipeError, OSError):
+            self._process.wait()
+            raise VideoWriterError(f"ffmpeg exited while encoding: {self._stderr_text()}")
+        self.frame_count += 1
+
+    def close(self) -> str:
+        """Finish the encode and return the output path."""
+        if self._process is None:
+            raise VideoWriterError("No frames written")
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        returncode = self._process.wait()
+        self._stderr_thread.join()
+        if returncode != 0:
+            raise VideoWriterError(f"ffmpeg failed ({returncode}): {self._stderr_text()}")
+        logger.info(f"🎞️ Đã encode {self.frame_count} frames -> {self.path}")
+        return self.path
+
+    def abort(self):
+        """Stop ffmpeg without finishing the output."""
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+    def command(self, width: int, height: int) -> List[str]:
+        """The ffmpeg command for frames of the given size."""
+        input_args = [
+            "-f", "rawvideo",
+            "-pix_fmt", self.pixel_format,
+            "-s", f"{width}x{height}",
+            "-r", str(self.fps),
+            "-i", "pipe:0",
+        ]
+        return self.plan.command(input_args, self.output_args, size=(width, height))
+
+    def _start(self, width: int, height: int):
+        self._process = subprocess.Popen(
+            self.command(width, height),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+        # Drained continuously so a chatty ffmpeg never blocks on a full pipe
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_thread.start()
+
+    def _drain_stderr(self):
+        for line in self._process.stderr:
+            self._stderr.append(line.decode("utf-8", errors="replace").rstrip())
+
+    def _stderr_text(self) -> str:
+        return " | ".join(self._stderr) or "no output"
+
+
+def transcode(
+    input_path: str,
+    output_args: List[str],
+    plan: PostProcessPlan,
+    path: Optional[str] = None
+) -> str:
+    """
+    Apply a plan to a video file in one ffmpeg run.
+
+    Args:
+        input_path: generated video
+        output_args: ffmpeg output arguments (a path, or HLS muxer arguments)
+        plan: post-processing steps
+        path: what the output is called once written (defaults to the last output argument)
+
+    Raises:
+        VideoWriterError: if ffmpeg fails
+    """
+    result = subprocess.run(
+        plan.command(["-i", input_path], output_args),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+    if result.returncode != 0:
+        tail = result.stderr.decode("utf-8", errors="replace").strip().splitlines()[-STDERR_TAIL_LINES:]
+        raise VideoWriterError(f"ffmpeg failed ({result.returncode}): {' | '.join(tail) or 'no output'}")
+    path = path or output_args[-1]
+    logger.info(f"🎞️ Đã hậu xử lý {input_path} -> {path}")
+    return path